@@ -0,0 +1,4 @@
+"""Benchmarks for the paths Sandman runs on every tick.
+
+Run them from the repository root with `python -m benchmarks`.
+"""
@@ -0,0 +1,125 @@
+"""Run the benchmarks and compare them against a baseline.
+
+Exits with a non-zero status if any benchmark is slower than the baseline by
+more than the threshold. Timings depend on the machine, so the baseline should
+be recorded on the same kind of machine the benchmarks are compared on.
+"""
+
+import argparse
+import fnmatch
+import os
+import sys
+
+from . import (
+    bench_commands,  # noqa: F401
+    bench_controls,  # noqa: F401
+    bench_gpio,  # noqa: F401
+    bench_reports,  # noqa: F401
+    bench_routines,  # noqa: F401
+    harness,
+)
+
+_DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def _format_ns(ns: float) -> str:
+    """Format a duration for the results table."""
+    if ns >= 1000000:
+        return f"{ns / 1000000:.2f} ms"
+
+    if ns >= 1000:
+        return f"{ns / 1000:.2f} us"
+
+    return f"{ns:.0f} ns"
+
+
+def main() -> int:
+    """Run the benchmarks, returning the exit status."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__
+    )
+    parser.add_argument(
+        "--filter",
+        default="*",
+        help="Only run benchmarks whose names match this pattern.",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=5,
+        help="How many times each benchmark is timed.",
+    )
+    parser.add_argument("--output", help="Save the results to a JSON file.")
+    parser.add_argument(
+        "--baseline",
+        default=_DEFAULT_BASELINE,
+        help="The results to compare against.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="How much slower than the baseline counts as a regression, "
+        + "such as 0.25 for 25 percent.",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the new baseline instead of comparing.",
+    )
+    arguments = parser.parse_args()
+
+    results: list[harness.BenchmarkResult] = []
+
+    for bench in harness.get_benchmarks():
+        for size in bench.sizes:
+            name = bench.get_name_for_size(size)
+
+            if fnmatch.fnmatchcase(name, arguments.filter) == False:
+                continue
+
+            result = harness.run_benchmark(bench, size, arguments.rounds)
+            results.append(result)
+            print(
+                f"{name:<40} {_format_ns(result.ns_per_op):>10}/op "
+                + f"{result.ops_per_sec:>14,.0f} ops/s"
+            )
+
+    if arguments.output is not None:
+        harness.save_results(results, arguments.output)
+
+    if arguments.save_baseline == True:
+        harness.save_results(results, arguments.baseline)
+        print(f"Saved the baseline to '{arguments.baseline}'.")
+        return 0
+
+    if os.path.exists(arguments.baseline) == False:
+        print(f"There is no baseline at '{arguments.baseline}'.")
+        return 0
+
+    comparisons = harness.compare(
+        results, harness.load_baseline(arguments.baseline)
+    )
+    regressions = [
+        comparison
+        for comparison in comparisons
+        if comparison.is_regression(arguments.threshold) == True
+    ]
+
+    print()
+
+    for comparison in comparisons:
+        print(
+            f"{comparison.name:<40} {comparison.ratio:>6.2f}x baseline"
+            + (" REGRESSED" if comparison in regressions else "")
+        )
+
+    if len(regressions) > 0:
+        print(f"{len(regressions)} benchmarks regressed.")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Benchmarks parsing intents into commands."""
+
+import collections.abc
+import typing
+
+import sandman_main.commands
+
+from . import harness
+
+# A mix of the intents Sandman receives, valid ones only, so that parsing
+# doesn't log warnings.
+_INTENT_SLOTS: list[tuple[str, dict[str, str]]] = [
+    ("MovePart", {"name": "back", "direction": "up"}),
+    ("MovePart", {"name": "legs", "direction": "down"}),
+    ("MovePart", {"name": "elevation", "direction": "up"}),
+    ("LockControl", {"name": "back", "action": "lock"}),
+    ("ControlRoutine", {"name": "sleep", "action": "start"}),
+    ("ControlRoutine", {"name": "sleep", "action": "stop"}),
+    ("GetStatus", {}),
+]
+
+
+def _make_intent(
+    intent_name: str, slots: dict[str, str]
+) -> dict[str, typing.Any]:
+    """Make an intent with string slots."""
+    return {
+        "intent": {"intentName": intent_name},
+        "slots": [
+            {"slotName": name, "value": {"value": value}}
+            for name, value in slots.items()
+        ],
+    }
+
+
+@harness.benchmark("commands.parse_from_intent", sizes=[60])
+def bench_parse_from_intent(
+    size: int,
+) -> collections.abc.Iterator[harness.Workload]:
+    """Parse a batch of mixed intents."""
+    intents = [
+        _make_intent(*_INTENT_SLOTS[index % len(_INTENT_SLOTS)])
+        for index in range(size)
+    ]
+
+    def run() -> None:
+        for intent in intents:
+            sandman_main.commands.parse_from_intent(intent)
+
+    yield run, size
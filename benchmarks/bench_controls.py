@@ -0,0 +1,62 @@
+"""Benchmarks processing controls."""
+
+import collections.abc
+import pathlib
+
+import sandman_main.commands
+import sandman_main.controls
+
+from . import environment, harness
+
+
+@harness.benchmark("controls.process_controls", sizes=[1, 8, 64])
+def bench_process_controls(
+    size: int,
+) -> collections.abc.Iterator[harness.Workload]:
+    """Process a number of moving controls.
+
+    There's no scheduler, so every control is processed every time, which is
+    the most a tick can cost.
+    """
+    with environment.create_environment() as bench_environment:
+        controls_path = pathlib.Path(bench_environment.base_dir + "controls/")
+        controls_path.mkdir()
+
+        for index in range(size):
+            config = sandman_main.controls.ControlConfig()
+            config.name = f"control{index}"
+            config.up_gpio_line = index * 2
+            config.down_gpio_line = (index * 2) + 1
+            # Long enough that the controls keep moving.
+            config.moving_duration_ms = 1000000000
+            config.save_to_file(str(controls_path / f"control{index}.ctl"))
+
+        manager = sandman_main.controls.ControlManager(
+            bench_environment.timer,
+            bench_environment.gpio_manager,
+            bench_environment.report_manager,
+        )
+        manager.initialize(bench_environment.base_dir)
+
+        notifications: list[str] = []
+
+        for name in manager.get_names():
+            manager.process_command(
+                notifications,
+                sandman_main.commands.ControlCommand(
+                    name,
+                    sandman_main.commands.ControlCommand.Action.MOVE_UP,
+                    "voice",
+                ),
+            )
+
+        manager.process_controls(notifications)
+
+        def run() -> None:
+            manager.process_controls(notifications)
+
+        try:
+            yield run, 1
+
+        finally:
+            manager.uninitialize()
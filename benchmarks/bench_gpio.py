@@ -0,0 +1,54 @@
+"""Benchmarks setting GPIO lines, without a GPIO chip."""
+
+import collections.abc
+
+import sandman_main.gpio
+
+from . import harness
+
+
+@harness.benchmark("gpio.set_line_values", sizes=[2])
+def bench_set_line_values(
+    size: int,
+) -> collections.abc.Iterator[harness.Workload]:
+    """Toggle lines, so that every write is issued."""
+    manager = sandman_main.gpio.GPIOManager(is_live_mode=False)
+    manager.initialize()
+    lines = list(range(size))
+    manager.acquire_output_lines(lines)
+
+    active_values = {line: True for line in lines}
+    inactive_values = {line: False for line in lines}
+
+    def run() -> None:
+        manager.set_line_values(active_values)
+        manager.set_line_values(inactive_values)
+
+    try:
+        yield run, 2
+
+    finally:
+        manager.uninitialize()
+
+
+@harness.benchmark("gpio.set_line_values_unchanged", sizes=[2])
+def bench_set_line_values_unchanged(
+    size: int,
+) -> collections.abc.Iterator[harness.Workload]:
+    """Set lines to the values they already have, so every write is elided."""
+    manager = sandman_main.gpio.GPIOManager(is_live_mode=False)
+    manager.initialize()
+    lines = list(range(size))
+    manager.acquire_output_lines(lines)
+
+    values = {line: True for line in lines}
+    manager.set_line_values(values)
+
+    def run() -> None:
+        manager.set_line_values(values)
+
+    try:
+        yield run, 1
+
+    finally:
+        manager.uninitialize()
@@ -0,0 +1,29 @@
+"""Benchmarks writing events to reports."""
+
+import collections.abc
+
+from . import environment, harness
+
+
+@harness.benchmark("reports.process", sizes=[1, 100])
+def bench_process(size: int) -> collections.abc.Iterator[harness.Workload]:
+    """Add a batch of control events and write them to the report.
+
+    Writes are buffered the way Sandman configures them, so most batches
+    don't flush.
+    """
+    with environment.create_environment(
+        flush_interval_ms=5000, flush_size=4096
+    ) as bench_environment:
+        report_manager = bench_environment.report_manager
+
+        # Create the report file up front.
+        report_manager.process()
+
+        def run() -> None:
+            for _ in range(size):
+                report_manager.add_control_event("back", "move up", "voice")
+
+            report_manager.process()
+
+        yield run, size
@@ -0,0 +1,74 @@
+"""Benchmarks processing running routines."""
+
+import collections.abc
+import json
+import pathlib
+
+import sandman_main.commands
+import sandman_main.routines
+
+from . import environment, harness
+
+# How far the clock moves between ticks.
+_TICK_MS = 10
+
+
+@harness.benchmark("routines.process_routines", sizes=[1, 8, 64])
+def bench_process_routines(
+    size: int,
+) -> collections.abc.Iterator[harness.Workload]:
+    """Process a number of running routines as time passes.
+
+    There's no scheduler, so every routine is processed every time. A step is
+    due every tenth tick, so most ticks only check the time, like on the bed.
+    """
+    with environment.create_environment() as bench_environment:
+        routines_path = pathlib.Path(bench_environment.base_dir + "routines/")
+        routines_path.mkdir()
+
+        for index in range(size):
+            routine_json = {
+                "name": f"routine{index}",
+                "isLooping": True,
+                "steps": [
+                    {
+                        "delayMS": _TICK_MS * 10,
+                        "controlName": f"control{index}",
+                        "moveDirection": direction,
+                    }
+                    for direction in ("up", "down")
+                ],
+            }
+
+            with open(routines_path / f"routine{index}.rtn", "w") as file:
+                json.dump(routine_json, file)
+
+        manager = sandman_main.routines.RoutineManager(
+            bench_environment.timer, bench_environment.report_manager
+        )
+        manager.initialize(bench_environment.base_dir)
+
+        for name in manager.get_names():
+            manager.process_command(
+                sandman_main.commands.RoutineCommand(
+                    name, sandman_main.commands.RoutineCommand.Action.START
+                )
+            )
+
+        command_list: list[
+            sandman_main.commands.StatusCommand
+            | sandman_main.commands.ControlCommand
+            | sandman_main.commands.RoutineCommand
+        ] = []
+        notifications: list[str] = []
+
+        def run() -> None:
+            bench_environment.clock.advance_ns(_TICK_MS * 1000000)
+            manager.process_routines(command_list, notifications)
+            command_list.clear()
+
+        try:
+            yield run, 1
+
+        finally:
+            manager.uninitialize()
@@ -0,0 +1,71 @@
+"""Sets up what the managers need, without the rest of Sandman."""
+
+import collections.abc
+import contextlib
+import dataclasses
+import tempfile
+
+import whenever
+
+import sandman_main.gpio
+import sandman_main.reports
+import sandman_main.time_util
+
+# A time that is well away from when reports roll over.
+_START_TIME = whenever.ZonedDateTime(
+    year=2025, month=9, day=28, hour=12, tz="America/Chicago"
+)
+
+
+@dataclasses.dataclass
+class Environment:
+    """A simulated clock, GPIO, and reports in a temporary directory."""
+
+    base_dir: str
+    clock: sandman_main.time_util.SimulatedClock
+    timer: sandman_main.time_util.SimulatedTimer
+    time_source: sandman_main.time_util.SimulatedTimeSource
+    gpio_manager: sandman_main.gpio.GPIOManager
+    report_manager: sandman_main.reports.ReportManager
+
+
+@contextlib.contextmanager
+def create_environment(
+    flush_interval_ms: int = 0, flush_size: int = 0
+) -> collections.abc.Iterator[Environment]:
+    """Create an environment that is cleaned up afterward.
+
+    flush_interval_ms - How often the report manager flushes.
+    flush_size - How much text makes the report manager flush early.
+    """
+    with tempfile.TemporaryDirectory(prefix="sandman_bench_") as temp_dir:
+        base_dir = temp_dir + "/"
+        sandman_main.reports.bootstrap_reports(base_dir)
+
+        clock = sandman_main.time_util.SimulatedClock(_START_TIME.to_instant())
+        time_source = sandman_main.time_util.SimulatedTimeSource(clock)
+        time_source.set_time_zone_name(_START_TIME.tz)
+
+        gpio_manager = sandman_main.gpio.GPIOManager(is_live_mode=False)
+        gpio_manager.initialize()
+
+        report_manager = sandman_main.reports.ReportManager(
+            time_source,
+            base_dir,
+            flush_interval_ms=flush_interval_ms,
+            flush_size=flush_size,
+        )
+
+        try:
+            yield Environment(
+                base_dir,
+                clock,
+                sandman_main.time_util.SimulatedTimer(clock),
+                time_source,
+                gpio_manager,
+                report_manager,
+            )
+
+        finally:
+            report_manager.close()
+            gpio_manager.uninitialize()
@@ -0,0 +1,223 @@
+"""Times benchmarks and compares the results against a baseline.
+
+A benchmark is a setup function that yields a workload: a function that does
+some operations, and how many operations it does each time it's called. The
+workload is run enough times to take a measurable amount of time, over several
+rounds, and the median time per operation is the result.
+"""
+
+import collections.abc
+import contextlib
+import dataclasses
+import gc
+import json
+import platform
+import statistics
+import time
+import typing
+
+# A function to run, and how many operations it does each time it's called.
+type Workload = tuple[collections.abc.Callable[[], None], int]
+type SetupFunction = collections.abc.Callable[
+    [int], collections.abc.Iterator[Workload]
+]
+
+RESULTS_VERSION = 1
+
+
+@dataclasses.dataclass(frozen=True)
+class Benchmark:
+    """A workload to time at one or more sizes."""
+
+    name: str
+    setup: collections.abc.Callable[
+        [int], contextlib.AbstractContextManager[Workload]
+    ]
+    sizes: tuple[int, ...]
+
+    def get_name_for_size(self, size: int) -> str:
+        """Get the name of the benchmark at a size."""
+        return f"{self.name}[{size}]"
+
+
+_BENCHMARKS: list[Benchmark] = []
+
+
+def benchmark(
+    name: str, sizes: collections.abc.Sequence[int]
+) -> collections.abc.Callable[[SetupFunction], SetupFunction]:
+    """Register a setup function as a benchmark.
+
+    sizes - Each size is passed to the setup function to make a workload,
+        such as the number of controls or the number of events.
+    """
+
+    def register(setup: SetupFunction) -> SetupFunction:
+        _BENCHMARKS.append(
+            Benchmark(name, contextlib.contextmanager(setup), tuple(sizes))
+        )
+        return setup
+
+    return register
+
+
+def get_benchmarks() -> list[Benchmark]:
+    """Get the registered benchmarks, in the order they were registered."""
+    return list(_BENCHMARKS)
+
+
+@dataclasses.dataclass(frozen=True)
+class BenchmarkResult:
+    """How long each operation of a benchmark took."""
+
+    name: str
+    # The median over the rounds.
+    ns_per_op: float
+    # The fastest round.
+    min_ns_per_op: float
+    ops_per_round: int
+
+    @property
+    def ops_per_sec(self) -> float:
+        """Get how many operations can be done in a second."""
+        if self.ns_per_op == 0:
+            return 0
+
+        return 1000000000 / self.ns_per_op
+
+
+def run_benchmark(
+    bench: Benchmark,
+    size: int,
+    num_rounds: int = 5,
+    min_round_ns: int = 20000000,
+) -> BenchmarkResult:
+    """Time a benchmark at a size.
+
+    num_rounds - How many times the workload is timed.
+    min_round_ns - The workload is run enough times in each round to take at
+        least this long.
+    """
+    with bench.setup(size) as (run, num_ops):
+        # Warm up, then find how many runs make a round long enough to time.
+        run()
+        num_runs = 1
+
+        while True:
+            elapsed_ns = _time_runs(run, num_runs)
+
+            if elapsed_ns >= min_round_ns:
+                break
+
+            num_runs *= 2
+
+        round_ns_per_op: list[float] = []
+
+        for _ in range(num_rounds):
+            gc.collect()
+            elapsed_ns = _time_runs(run, num_runs)
+            round_ns_per_op.append(elapsed_ns / (num_runs * num_ops))
+
+    return BenchmarkResult(
+        bench.get_name_for_size(size),
+        statistics.median(round_ns_per_op),
+        min(round_ns_per_op),
+        num_runs * num_ops,
+    )
+
+
+def _time_runs(run: collections.abc.Callable[[], None], num_runs: int) -> int:
+    """Get how long it takes to run a workload a number of times."""
+    start_time = time.perf_counter_ns()
+
+    for _ in range(num_runs):
+        run()
+
+    return time.perf_counter_ns() - start_time
+
+
+def get_results_as_json(
+    results: list[BenchmarkResult],
+) -> dict[str, typing.Any]:
+    """Get results as JSON, along with where they were measured."""
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": {
+            result.name: {
+                "nsPerOp": round(result.ns_per_op, 1),
+                "minNsPerOp": round(result.min_ns_per_op, 1),
+                "opsPerSec": round(result.ops_per_sec),
+                "opsPerRound": result.ops_per_round,
+            }
+            for result in results
+        },
+    }
+
+
+def save_results(results: list[BenchmarkResult], filename: str) -> None:
+    """Save results to a JSON file."""
+    with open(filename, "w") as file:
+        json.dump(get_results_as_json(results), file, indent=4)
+        file.write("\n")
+
+
+def load_baseline(filename: str) -> dict[str, float]:
+    """Load the time per operation of each benchmark from a results file.
+
+    Raises ValueError if the file isn't a valid results file.
+    """
+    with open(filename) as file:
+        results_json = json.load(file)
+
+    try:
+        if results_json["version"] != RESULTS_VERSION:
+            raise ValueError(f"Unsupported results version in '{filename}'.")
+
+        return {
+            name: float(result_json["nsPerOp"])
+            for name, result_json in results_json["benchmarks"].items()
+        }
+
+    except (KeyError, TypeError, AttributeError) as exception:
+        raise ValueError(f"Invalid results file '{filename}'.") from exception
+
+
+@dataclasses.dataclass(frozen=True)
+class Comparison:
+    """How a result compares to its baseline."""
+
+    name: str
+    baseline_ns_per_op: float
+    ns_per_op: float
+
+    @property
+    def ratio(self) -> float:
+        """Get the time per operation relative to the baseline."""
+        if self.baseline_ns_per_op == 0:
+            return 1
+
+        return self.ns_per_op / self.baseline_ns_per_op
+
+    def is_regression(self, threshold: float) -> bool:
+        """Check whether this is slower than the baseline by the threshold.
+
+        threshold - How much slower counts as a regression, such as 0.25 for
+            25 percent.
+        """
+        return self.ratio > (1 + threshold)
+
+
+def compare(
+    results: list[BenchmarkResult], baseline: dict[str, float]
+) -> list[Comparison]:
+    """Compare results to a baseline.
+
+    Benchmarks that aren't in the baseline are left out.
+    """
+    return [
+        Comparison(result.name, baseline[result.name], result.ns_per_op)
+        for result in results
+        if result.name in baseline
+    ]
@@ -0,0 +1,63 @@
+"""Soak test Sandman against a simulated clock.
+
+The controls, routines, and settings in the base directory are used, and a
+script of intents can be replayed. Reports are written to the base directory
+as usual, so use a copy of a real one.
+"""
+
+import argparse
+import json
+import tempfile
+
+import whenever
+
+import sandman_main.simulation
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--days", type=float, default=7, help="How many days to simulate."
+    )
+    parser.add_argument(
+        "--base-dir",
+        help="Sandman's base directory. A temporary one is used by default.",
+    )
+    parser.add_argument(
+        "--script", help="A JSON file with a list of intents to deliver."
+    )
+    parser.add_argument(
+        "--start",
+        help="When the simulation starts, as an ISO time with a time zone, "
+        + "such as 2025-09-28T12:00:00-05:00[America/Chicago].",
+    )
+    arguments = parser.parse_args()
+
+    base_dir = arguments.base_dir
+
+    if base_dir is None:
+        base_dir = tempfile.mkdtemp(prefix="sandman_soak_")
+
+    if base_dir.endswith("/") == False:
+        base_dir += "/"
+
+    start_time = whenever.ZonedDateTime.now("America/Chicago")
+
+    if arguments.start is not None:
+        start_time = whenever.ZonedDateTime.parse_common_iso(arguments.start)
+
+    harness = sandman_main.simulation.SoakHarness(base_dir, start_time)
+
+    if arguments.script is not None:
+        for intent in sandman_main.simulation.load_script(arguments.script):
+            harness.add_intent(intent)
+
+    if harness.start() == False:
+        raise ValueError("Failed to start Sandman.")
+
+    try:
+        results = harness.run_for_ms(int(arguments.days * 24 * 60 * 60 * 1000))
+
+    finally:
+        harness.stop()
+
+    print(json.dumps(results.get_as_json(), indent=4))
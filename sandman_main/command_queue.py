@@ -0,0 +1,168 @@
+"""A bounded queue for commands waiting to be processed.
+
+Commands are added by the MQTT network thread and removed by the main loop, so
+the queue is thread safe. It has a fixed capacity, so a burst of intents can't
+use an unbounded amount of memory.
+"""
+
+import collections
+import enum
+import logging
+import threading
+
+from . import commands
+
+_logger = logging.getLogger("sandman.command_queue")
+
+type Command = (
+    commands.StatusCommand | commands.ControlCommand | commands.RoutineCommand
+)
+
+_MOVE_ACTIONS = frozenset(
+    [
+        commands.ControlCommand.Action.MOVE_UP,
+        commands.ControlCommand.Action.MOVE_DOWN,
+    ]
+)
+
+
+class CommandQueue:
+    """Holds commands until the main loop is ready for them."""
+
+    @enum.unique
+    class OverflowPolicy(enum.Enum):
+        """What to do when a command is added to a full queue."""
+
+        # Drop the command that has been waiting the longest.
+        DROP_OLDEST = enum.auto()
+        # Drop the command being added.
+        DROP_NEWEST = enum.auto()
+        # Like DROP_OLDEST, but a move command also replaces any waiting move
+        # command for the same control, even when the queue isn't full.
+        COALESCE = enum.auto()
+
+    def __init__(
+        self,
+        capacity: int,
+        overflow_policy: OverflowPolicy = OverflowPolicy.COALESCE,
+    ) -> None:
+        """Initialize the instance.
+
+        capacity - The most commands that can be waiting at once.
+        overflow_policy - What to do when the queue is full.
+        """
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive.")
+
+        self.__capacity = capacity
+        self.__overflow_policy = overflow_policy
+        self.__lock = threading.Lock()
+        self.__commands = collections.deque[Command]()
+        self.__num_dropped = 0
+        self.__num_coalesced = 0
+        self.__max_depth = 0
+        # Only the first drop since the last drain is logged, so that a flood
+        # of commands doesn't also flood the log.
+        self.__has_dropped_since_drain = False
+
+    @property
+    def capacity(self) -> int:
+        """Get the most commands that can be waiting at once."""
+        return self.__capacity
+
+    @property
+    def overflow_policy(self) -> OverflowPolicy:
+        """Get what happens when the queue is full."""
+        return self.__overflow_policy
+
+    @property
+    def depth(self) -> int:
+        """Get the number of commands that are waiting."""
+        with self.__lock:
+            return len(self.__commands)
+
+    @property
+    def max_depth(self) -> int:
+        """Get the most commands that have been waiting at once."""
+        return self.__max_depth
+
+    @property
+    def num_dropped(self) -> int:
+        """Get the number of commands dropped because the queue was full."""
+        return self.__num_dropped
+
+    @property
+    def num_coalesced(self) -> int:
+        """Get the number of commands replaced by newer commands."""
+        return self.__num_coalesced
+
+    def push(self, command: Command) -> bool:
+        """Add a command to the back of the queue.
+
+        Returns False if the command was dropped.
+        """
+        with self.__lock:
+            if self.__overflow_policy == self.OverflowPolicy.COALESCE:
+                self.__coalesce(command)
+
+            if len(self.__commands) >= self.__capacity:
+                if self.__overflow_policy == self.OverflowPolicy.DROP_NEWEST:
+                    self.__record_drop(command)
+                    return False
+
+                self.__record_drop(self.__commands.popleft())
+
+            self.__commands.append(command)
+            self.__max_depth = max(self.__max_depth, len(self.__commands))
+
+        return True
+
+    def drain(self) -> list[Command]:
+        """Remove all of the waiting commands, in the order they were added."""
+        with self.__lock:
+            drained_commands = list(self.__commands)
+            self.__commands.clear()
+            self.__has_dropped_since_drain = False
+
+        return drained_commands
+
+    def __coalesce(self, command: Command) -> None:
+        """Remove a waiting move command that the command supersedes.
+
+        A lock or unlock that applies to the control is processed between the
+        waiting move and the new one, so moves waiting before it are kept.
+        """
+        if (type(command) is not commands.ControlCommand) or (
+            command.action not in _MOVE_ACTIONS
+        ):
+            return
+
+        for index in range(len(self.__commands) - 1, -1, -1):
+            waiting_command = self.__commands[index]
+
+            if (type(waiting_command) is not commands.ControlCommand) or (
+                waiting_command.control_name
+                not in (command.control_name, "all")
+            ):
+                continue
+
+            if waiting_command.action not in _MOVE_ACTIONS:
+                return
+
+            del self.__commands[index]
+            self.__num_coalesced += 1
+            return
+
+    def __record_drop(self, command: Command) -> None:
+        """Count a dropped command."""
+        self.__num_dropped += 1
+
+        if self.__has_dropped_since_drain == True:
+            return
+
+        self.__has_dropped_since_drain = True
+        _logger.warning(
+            "Command queue is full (%d commands), dropping %s.",
+            self.__capacity,
+            command,
+        )
@@ -12,6 +12,44 @@ class StatusCommand:
     pass
 
 
+@dataclasses.dataclass
+class CommandTrace:
+    """When a command from an intent reached each stage of being handled.
+
+    The times are points in time from the timer, and the later stages are None
+    until they're reached.
+    """
+
+    trace_id: int
+    # When the intent was received from MQTT.
+    received_time: int
+    # When the main loop took the command from the queue.
+    dequeued_time: int | None = None
+    # When the control manager started handling the command.
+    dispatched_time: int | None = None
+    # When the control's GPIO lines were set.
+    gpio_time: int | None = None
+
+    def get_stage_durations_ns(self) -> dict[str, int] | None:
+        """Get how long each stage took, once all of them have been reached.
+
+        Returns None if the command hasn't reached GPIO.
+        """
+        if (
+            (self.dequeued_time is None)
+            or (self.dispatched_time is None)
+            or (self.gpio_time is None)
+        ):
+            return None
+
+        return {
+            "receiveToDequeue": self.dequeued_time - self.received_time,
+            "dequeueToDispatch": self.dispatched_time - self.dequeued_time,
+            "dispatchToGpio": self.gpio_time - self.dispatched_time,
+            "receiveToGpio": self.gpio_time - self.received_time,
+        }
+
+
 @dataclasses.dataclass
 class ControlCommand:
     """A command to do something with a control."""
@@ -46,6 +84,8 @@ class ControlCommand:
     control_name: str
     action: Action
     source: str
+    # Only commands from intents are traced.
+    trace: CommandTrace | None = dataclasses.field(default=None, compare=False)
 
 
 @dataclasses.dataclass
@@ -78,244 +118,230 @@ class RoutineCommand:
 _logger = logging.getLogger("sandman.commands")
 
 
-def parse_from_intent(
-    intent_json: dict[str, typing.Any],
-) -> None | StatusCommand | ControlCommand | RoutineCommand:
-    """Parse an intent from JSON.
+@dataclasses.dataclass(frozen=True)
+class _IntentSpec:
+    """Describes how to turn an intent into a control or routine command."""
 
-    Return a command if one is recognized.
+    # Used in log messages.
+    description: str
+    # The slot that holds the action and the action for each of its values.
+    action_slot_name: str
+    actions: (
+        dict[str, ControlCommand.Action] | dict[str, RoutineCommand.Action]
+    )
+    is_routine: bool
+    # Whether the name can be all, for commands that apply to every control.
+    allows_all: bool
+
+
+# The intents with slots, by intent name. GetStatus has no slots, so it's
+# handled separately.
+_INTENT_SPECS = {
+    "MovePart": _IntentSpec(
+        "move control",
+        "direction",
+        {
+            "up": ControlCommand.Action.MOVE_UP,
+            "down": ControlCommand.Action.MOVE_DOWN,
+        },
+        is_routine=False,
+        allows_all=False,
+    ),
+    "LockControl": _IntentSpec(
+        "lock control",
+        "action",
+        {
+            "lock": ControlCommand.Action.LOCK,
+            "unlock": ControlCommand.Action.UNLOCK,
+        },
+        is_routine=False,
+        allows_all=True,
+    ),
+    "ControlRoutine": _IntentSpec(
+        "control routine",
+        "action",
+        {
+            "start": RoutineCommand.Action.START,
+            "stop": RoutineCommand.Action.STOP,
+        },
+        is_routine=True,
+        allows_all=False,
+    ),
+}
+
+
+class IntentParser:
+    """Turns intents into commands.
+
+    Names in intents can be checked against the controls and routines that
+    are actually loaded. Then intents with unknown names are rejected before
+    any command is created, and the names in commands are the same string
+    objects the managers use.
     """
-    # Try to get the intent name.
-    try:
-        intent = intent_json["intent"]
-
-    except KeyError:
-        _logger.warning("Invalid intent.")
-        return None
-
-    try:
-        intent_name = intent["intentName"]
-
-    except KeyError:
-        _logger.warning("Invalid intent: missing name.")
-        return None
-
-    match intent_name:
-        case "GetStatus":
-            _logger.info("Recognized a get status intent.")
-            return StatusCommand()
-
-        case "MovePart":
-            _logger.info("Attempting to recognize a move control intent.")
-            return _parse_from_move_control_intent(intent_json)
-
-        case "LockControl":
-            _logger.info("Attempting to recognize a lock control intent.")
-            return _parse_from_lock_control_intent(intent_json)
-
-        case "ControlRoutine":
-            _logger.info("Attempting to recognize a control routine intent.")
-            return _parse_from_control_routine_intent(intent_json)
 
-    _logger.warning("Unrecognized intent '%s'.", intent_name)
-    return None
-
-
-@dataclasses.dataclass
-class _IntentSlot:
-    """A slot from an intent."""
+    def __init__(self) -> None:
+        """Initialize the instance."""
+        # None means that any name is accepted.
+        self.__control_names: dict[str, str] | None = None
+        self.__routine_names: dict[str, str] | None = None
+
+    def set_control_names(self, names: list[str]) -> None:
+        """Set the names of the loaded controls."""
+        # Replaced as a whole, so that parsing on another thread always sees a
+        # consistent set of names.
+        self.__control_names = {name: name for name in names}
+
+    def set_routine_names(self, names: list[str]) -> None:
+        """Set the names of the loaded routines."""
+        self.__routine_names = {name: name for name in names}
+
+    def parse(
+        self, intent_json: dict[str, typing.Any]
+    ) -> None | StatusCommand | ControlCommand | RoutineCommand:
+        """Parse an intent from JSON.
+
+        Return a command if one is recognized.
+        """
+        # Try to get the intent name.
+        try:
+            intent_name = intent_json["intent"]["intentName"]
 
-    name: str
-    value: str
+        except KeyError:
+            _logger.warning("Invalid intent: missing name.")
+            return None
 
+        except TypeError:
+            _logger.warning("Invalid intent.")
+            return None
 
-def _parse_slots_from_intent(
-    intent_json: dict[str, typing.Any],
-) -> list[_IntentSlot]:
-    """Parse slots from intent JSON."""
-    slots: list[_IntentSlot] = []
+        if type(intent_name) is not str:
+            _logger.warning("Invalid intent: name is not a string.")
+            return None
 
-    try:
-        slots_json = intent_json["slots"]
+        if intent_name == "GetStatus":
+            _logger.debug("Recognized a get status intent.")
+            return StatusCommand()
 
-    except KeyError:
-        _logger.warning("Invalid intent: missing slots.")
-        return slots
+        spec = _INTENT_SPECS.get(intent_name)
 
-    if isinstance(slots_json, list) == False:
-        _logger.warning("Invalid intent: slots is not a list.")
-        return slots
+        if spec is None:
+            _logger.warning("Unrecognized intent '%s'.", intent_name)
+            return None
 
-    # Try to extract each slot.
-    for slot in slots_json:
-        # Each slot must have a name and a value.
-        try:
-            slot_name = slot["slotName"]
+        return self.__parse_with_spec(intent_json, spec)
 
-        except KeyError:
-            _logger.warning("Intent slot is missing a name.")
-            continue
+    def __parse_with_spec(
+        self, intent_json: dict[str, typing.Any], spec: _IntentSpec
+    ) -> None | ControlCommand | RoutineCommand:
+        """Parse a control or routine intent."""
+        slots_json = intent_json.get("slots")
 
-        if type(slot_name) is not str:
+        if type(slots_json) is not list:
             _logger.warning(
-                "Intent slot name '%s' is not a string.", str(slot_name)
+                "Invalid %s intent: missing slots.", spec.description
             )
-            continue
+            return None
 
-        try:
-            slot_value = slot["value"]
+        name = _get_slot_value(slots_json, "name")
+        action_string = _get_slot_value(slots_json, spec.action_slot_name)
 
-        except KeyError:
-            _logger.warning("Intent slot '%s' is missing a value.", slot_name)
-            continue
-
-        try:
-            slot_value_value = slot_value["value"]
-
-        except KeyError:
+        if name is None:
             _logger.warning(
-                "Intent slot '%s' value is missing a value.", slot_name
+                "Invalid %s intent: missing %s name.",
+                spec.description,
+                "routine" if spec.is_routine == True else "control",
             )
-            continue
+            return None
 
-        except TypeError:
-            _logger.warning(
-                "Intent slot '%s' value is not an object.", slot_name
-            )
-            continue
+        action = (
+            spec.actions.get(action_string)
+            if action_string is not None
+            else None
+        )
 
-        if type(slot_value_value) is not str:
+        if action is None:
             _logger.warning(
-                "Intent slot value '%s' is not a string.",
-                str(slot_value_value),
+                "Invalid %s intent: missing %s.",
+                spec.description,
+                spec.action_slot_name,
             )
-            continue
-
-        slots.append(_IntentSlot(slot_name, slot_value_value))
-
-    return slots
-
-
-def _parse_from_move_control_intent(
-    intent_json: dict[str, typing.Any],
-) -> None | ControlCommand:
-    """Parse a move control intent from JSON."""
-    slots = _parse_slots_from_intent(intent_json)
-
-    if len(slots) == 0:
-        _logger.warning("Invalid move control intent: missing slots.")
-        return None
-
-    # Try to find the control name and direction in the slots.
-    control_name: str | None = None
-    action: ControlCommand.Action | None = None
-
-    for slot in slots:
-        if slot.name == "name":
-            control_name = slot.value
-
-        elif slot.name == "direction":
-            if slot.value == "up":
-                action = ControlCommand.Action.MOVE_UP
+            return None
 
-            elif slot.value == "down":
-                action = ControlCommand.Action.MOVE_DOWN
+        known_name = self.__get_known_name(name, spec)
 
-    if control_name is None:
-        _logger.warning("Invalid move control intent: missing control name.")
-        return None
-
-    if action is None:
-        _logger.warning("Invalid move control intent: missing direction.")
-        return None
-
-    _logger.info(
-        "Recognized a move control intent: '%s' '%s'.",
-        control_name,
-        action.as_string(),
-    )
-    return ControlCommand(control_name, action, "voice")
+        if known_name is None:
+            _logger.warning(
+                "Ignoring %s intent with unknown name '%s'.",
+                spec.description,
+                name,
+            )
+            return None
 
+        _logger.debug(
+            "Recognized a %s intent: '%s' '%s'.",
+            spec.description,
+            known_name,
+            action.as_string(),
+        )
 
-def _parse_from_lock_control_intent(
-    intent_json: dict[str, typing.Any],
-) -> None | ControlCommand:
-    """Parse a lock control intent from JSON."""
-    slots = _parse_slots_from_intent(intent_json)
+        match action:
+            case ControlCommand.Action():
+                return ControlCommand(known_name, action, "voice")
 
-    if len(slots) == 0:
-        _logger.warning("Invalid lock control intent: missing slots.")
-        return None
+            case RoutineCommand.Action():
+                return RoutineCommand(known_name, action)
 
-    # Try to find the control name and action in the slots.
-    control_name: str | None = None
-    action: ControlCommand.Action | None = None
+            case unknown:
+                typing.assert_never(unknown)
 
-    for slot in slots:
-        if slot.name == "name":
-            control_name = slot.value
+    def __get_known_name(self, name: str, spec: _IntentSpec) -> str | None:
+        """Get the loaded name that matches a name from an intent."""
+        names = (
+            self.__routine_names
+            if spec.is_routine == True
+            else self.__control_names
+        )
 
-        elif slot.name == "action":
-            if slot.value == "lock":
-                action = ControlCommand.Action.LOCK
+        if names is None:
+            return name
 
-            elif slot.value == "unlock":
-                action = ControlCommand.Action.UNLOCK
+        if (spec.allows_all == True) and (name == "all"):
+            return "all"
 
-    if control_name is None:
-        _logger.warning("Invalid lock control intent: missing control name.")
-        return None
+        return names.get(name)
 
-    if action is None:
-        _logger.warning("Invalid lock control intent: missing action.")
-        return None
 
-    _logger.info(
-        "Recognized a lock control intent: '%s' '%s'.",
-        action.as_string(),
-        control_name,
-    )
-    return ControlCommand(control_name, action, "voice")
+# Used by parse_from_intent, so it accepts any name.
+_DEFAULT_PARSER = IntentParser()
 
 
-def _parse_from_control_routine_intent(
+def parse_from_intent(
     intent_json: dict[str, typing.Any],
-) -> None | RoutineCommand:
-    """Parse a control routine intent from JSON."""
-    slots = _parse_slots_from_intent(intent_json)
+) -> None | StatusCommand | ControlCommand | RoutineCommand:
+    """Parse an intent from JSON without checking names.
 
-    if len(slots) == 0:
-        _logger.warning("Invalid control routine intent: missing slots.")
-        return None
+    Return a command if one is recognized.
+    """
+    return _DEFAULT_PARSER.parse(intent_json)
 
-    # Try to find the routine name and action in the slots.
-    routine_name: str | None = None
-    action: RoutineCommand.Action | None = None
 
-    for slot in slots:
-        if slot.name == "name":
-            routine_name = slot.value
+def _get_slot_value(
+    slots_json: list[typing.Any], slot_name: str
+) -> str | None:
+    """Get the string value of the last valid slot with a name, if any."""
+    slot_value: str | None = None
 
-        elif slot.name == "action":
-            if slot.value == "start":
-                action = RoutineCommand.Action.START
+    for slot in slots_json:
+        try:
+            if slot["slotName"] != slot_name:
+                continue
 
-            elif slot.value == "stop":
-                action = RoutineCommand.Action.STOP
+            value = slot["value"]["value"]
 
-    if routine_name is None:
-        _logger.warning(
-            "Invalid control routine intent: missing routine name."
-        )
-        return None
+        except (KeyError, TypeError):
+            continue
 
-    if action is None:
-        _logger.warning("Invalid routine control intent: missing action.")
-        return None
+        if type(value) is str:
+            slot_value = value
 
-    _logger.info(
-        "Recognized a control routine intent: '%s' routine '%s'.",
-        action.as_string(),
-        routine_name,
-    )
-    return RoutineCommand(routine_name, action)
+    return slot_value
@@ -0,0 +1,202 @@
+"""Caches parsed config files between runs.
+
+Files are identified by their path, size and modification time, so a file only
+needs to be parsed again after it changes. Files that do need parsing are
+parsed in parallel.
+"""
+
+import collections.abc
+import concurrent.futures
+import json
+import logging
+import os
+import typing
+
+_logger = logging.getLogger("sandman.config_cache")
+
+# The most threads used to parse files that aren't cached.
+_MAX_PARSE_WORKERS = 8
+
+
+class _Config(typing.Protocol):
+    """What the cache needs from a parsed config."""
+
+    def is_valid(self) -> bool:
+        """Check whether the config is valid."""
+        ...
+
+    def get_as_json(self) -> dict[str, object]:
+        """Get the JSON representation of the config."""
+        ...
+
+
+class ConfigCache:
+    """Keeps the parsed contents of config files in a single cache file."""
+
+    VERSION = 1
+
+    def __init__(self, cache_filename: str) -> None:
+        """Initialize the instance."""
+        self.__cache_filename = cache_filename
+        # The key is the path and the value has the size, modification time,
+        # and JSON of the parsed config (None if it wasn't valid).
+        self.__entries: dict[str, tuple[int, int, typing.Any]] = {}
+        self.__is_dirty = False
+        self.__num_hits = 0
+        self.__num_misses = 0
+
+    @property
+    def num_hits(self) -> int:
+        """Get the number of files loaded from the cache."""
+        return self.__num_hits
+
+    @property
+    def num_misses(self) -> int:
+        """Get the number of files that had to be parsed."""
+        return self.__num_misses
+
+    def load(self) -> None:
+        """Load the cache file, if there is a valid one."""
+        self.__entries.clear()
+        self.__is_dirty = False
+
+        try:
+            with open(self.__cache_filename, encoding="utf-8") as file:
+                cache_json = json.load(file)
+
+            if cache_json["version"] != self.VERSION:
+                return
+
+            for path, (size, mtime_ns, config_json) in cache_json[
+                "entries"
+            ].items():
+                self.__entries[path] = (size, mtime_ns, config_json)
+
+        except FileNotFoundError:
+            return
+
+        except (OSError, ValueError, KeyError, TypeError):
+            _logger.warning(
+                "Ignoring invalid config cache '%s'.", self.__cache_filename
+            )
+            self.__entries.clear()
+
+    def save(self) -> None:
+        """Save the cache file if anything changed."""
+        # Forget about files that were removed.
+        for filename in list(self.__entries):
+            if os.path.exists(filename) == False:
+                del self.__entries[filename]
+                self.__is_dirty = True
+
+        if self.__is_dirty == False:
+            return
+
+        cache_json = {
+            "version": self.VERSION,
+            "entries": {
+                path: list(entry) for path, entry in self.__entries.items()
+            },
+        }
+
+        try:
+            with open(self.__cache_filename, "w", encoding="utf-8") as file:
+                json.dump(cache_json, file, separators=(",", ":"))
+
+        except OSError:
+            _logger.warning(
+                "Failed to save config cache '%s'.", self.__cache_filename
+            )
+            return
+
+        self.__is_dirty = False
+
+    def load_files[T: _Config](
+        self,
+        filenames: list[str],
+        parse_from_file: collections.abc.Callable[[str], T],
+        load_from_json: collections.abc.Callable[
+            [dict[str, typing.Any], str], T
+        ],
+    ) -> list[tuple[str, T | None]]:
+        """Get the config for each file, parsing only files that changed.
+
+        parse_from_file - Used to parse files that aren't cached.
+        load_from_json - Used to restore configs from the cache.
+
+        Returns each filename and its config (None if it's invalid), in the
+        same order as the filenames. Files that no longer exist are skipped.
+        """
+        results: dict[str, T | None] = {}
+        misses: list[tuple[str, int, int]] = []
+
+        for filename in filenames:
+            try:
+                stats = os.stat(filename)
+
+            except OSError:
+                continue
+
+            entry = self.__entries.get(filename)
+
+            if (entry is None) or (
+                (entry[0], entry[1]) != (stats.st_size, stats.st_mtime_ns)
+            ):
+                misses.append((filename, stats.st_size, stats.st_mtime_ns))
+                continue
+
+            self.__num_hits += 1
+            config_json = entry[2]
+            results[filename] = (
+                None
+                if config_json is None
+                else load_from_json(config_json, filename)
+            )
+
+        if len(misses) > 0:
+            self.__parse_misses(misses, parse_from_file, results)
+
+        return [
+            (filename, results[filename])
+            for filename in filenames
+            if filename in results
+        ]
+
+    def __parse_misses[T: _Config](
+        self,
+        misses: list[tuple[str, int, int]],
+        parse_from_file: collections.abc.Callable[[str], T],
+        results: dict[str, T | None],
+    ) -> None:
+        """Parse files that weren't cached and add them to the cache."""
+        num_workers = min(_MAX_PARSE_WORKERS, len(misses))
+
+        with concurrent.futures.ThreadPoolExecutor(num_workers) as executor:
+            futures = {
+                filename: executor.submit(parse_from_file, filename)
+                for filename, _size, _mtime_ns in misses
+            }
+
+            for filename, size, mtime_ns in misses:
+                try:
+                    config = futures[filename].result()
+
+                except OSError:
+                    _logger.warning("Failed to parse '%s'.", filename)
+                    continue
+
+                self.__num_misses += 1
+
+                if config.is_valid() == False:
+                    results[filename] = None
+                    self.__entries[filename] = (size, mtime_ns, None)
+
+                else:
+                    results[filename] = config
+                    self.__entries[filename] = (
+                        size,
+                        mtime_ns,
+                        config.get_as_json(),
+                    )
+
+                self.__is_dirty = True
@@ -4,12 +4,13 @@ Controls are used to manipulate parts of the bed.
 """
 
 import enum
+import functools
 import json
 import logging
 import pathlib
 import typing
 
-from . import commands, gpio, reports, time_util
+from . import commands, config_cache, gpio, reports, time_util
 
 _logger = logging.getLogger("sandman.control_config")
 
@@ -158,107 +159,109 @@ class ControlConfig:
                     )
                     return config
 
-                try:
-                    config.name = config_json["name"]
+                return cls.load_from_json(config_json, filename)
 
-                except KeyError:
-                    _logger.warning(
-                        "Missing 'name' key in control config file '%s'.",
-                        filename,
-                    )
+        except FileNotFoundError as error:
+            _logger.error("Could not find control config file '%s'.", filename)
+            raise error
 
-                except (TypeError, ValueError):
-                    _logger.warning(
-                        "Invalid name '%s' in control config file '%s'.",
-                        str(config_json["name"]),
-                        filename,
-                    )
+    @classmethod
+    def load_from_json(
+        cls, config_json: dict[str, typing.Any], filename: str
+    ) -> typing.Self:
+        """Load the config from a dictionary.
 
-                try:
-                    config.up_gpio_line = config_json["upGPIOLine"]
+        filename - Only used for logging.
+        """
+        config = cls()
 
-                except KeyError:
-                    _logger.warning(
-                        "Missing 'up GPIO line' key in control config file "
-                        + "'%s'.",
-                        filename,
-                    )
+        try:
+            config.name = config_json["name"]
 
-                except (TypeError, ValueError):
-                    _logger.warning(
-                        "Invalid up GPIO line '%s' in control config file "
-                        + "'%s'.",
-                        str(config_json["upGPIOLine"]),
-                        filename,
-                    )
+        except KeyError:
+            _logger.warning(
+                "Missing 'name' key in control config file '%s'.",
+                filename,
+            )
 
-                try:
-                    config.down_gpio_line = config_json["downGPIOLine"]
+        except (TypeError, ValueError):
+            _logger.warning(
+                "Invalid name '%s' in control config file '%s'.",
+                str(config_json["name"]),
+                filename,
+            )
 
-                except KeyError:
-                    _logger.warning(
-                        "Missing 'down GPIO line' key in control config file "
-                        + "'%s'.",
-                        filename,
-                    )
+        try:
+            config.up_gpio_line = config_json["upGPIOLine"]
 
-                except (TypeError, ValueError):
-                    _logger.warning(
-                        "Invalid down GPIO line '%s' in control config file "
-                        + "'%s'.",
-                        str(config_json["downGPIOLine"]),
-                        filename,
-                    )
+        except KeyError:
+            _logger.warning(
+                "Missing 'up GPIO line' key in control config file " + "'%s'.",
+                filename,
+            )
 
-                try:
-                    config.moving_duration_ms = config_json["movingDurationMS"]
+        except (TypeError, ValueError):
+            _logger.warning(
+                "Invalid up GPIO line '%s' in control config file " + "'%s'.",
+                str(config_json["upGPIOLine"]),
+                filename,
+            )
 
-                except KeyError:
-                    _logger.warning(
-                        "Missing 'moving duration' key in control config file "
-                        + "'%s'.",
-                        filename,
-                    )
+        try:
+            config.down_gpio_line = config_json["downGPIOLine"]
 
-                except (TypeError, ValueError):
-                    _logger.warning(
-                        "Invalid moving duration '%s' in control config file "
-                        + "'%s'.",
-                        str(config_json["movingDurationMS"]),
-                        filename,
-                    )
+        except KeyError:
+            _logger.warning(
+                "Missing 'down GPIO line' key in control config file "
+                + "'%s'.",
+                filename,
+            )
 
-                try:
-                    config.cool_down_duration_ms = config_json[
-                        "coolDownDurationMS"
-                    ]
-
-                except KeyError:
-                    # This is acceptable.
-                    pass
-
-                except (TypeError, ValueError):
-                    _logger.warning(
-                        "Invalid cool down duration '%s' in control config "
-                        + "file '%s'.",
-                        str(config_json["coolDownDurationMS"]),
-                        filename,
-                    )
+        except (TypeError, ValueError):
+            _logger.warning(
+                "Invalid down GPIO line '%s' in control config file "
+                + "'%s'.",
+                str(config_json["downGPIOLine"]),
+                filename,
+            )
 
-        except FileNotFoundError as error:
-            _logger.error("Could not find control config file '%s'.", filename)
-            raise error
+        try:
+            config.moving_duration_ms = config_json["movingDurationMS"]
 
-        return config
+        except KeyError:
+            _logger.warning(
+                "Missing 'moving duration' key in control config file "
+                + "'%s'.",
+                filename,
+            )
 
-    def save_to_file(self, filename: str) -> None:
-        """Save a config to a file."""
-        if self.is_valid() == False:
+        except (TypeError, ValueError):
             _logger.warning(
-                "Cannot save invalid control config to '%s'", filename
+                "Invalid moving duration '%s' in control config file "
+                + "'%s'.",
+                str(config_json["movingDurationMS"]),
+                filename,
             )
-            return
 
+        try:
+            config.cool_down_duration_ms = config_json["coolDownDurationMS"]
+
+        except KeyError:
+            # This is acceptable.
+            pass
+
+        except (TypeError, ValueError):
+            _logger.warning(
+                "Invalid cool down duration '%s' in control config "
+                + "file '%s'.",
+                str(config_json["coolDownDurationMS"]),
+                filename,
+            )
+
+        return config
+
+    def get_as_json(self) -> dict[str, object]:
+        """Get the JSON representation of the config."""
         config_json = {
             "name": self.__name,
             "upGPIOLine": self.__up_gpio_line,
@@ -267,6 +270,18 @@ class ControlConfig:
             "coolDownDurationMS": self.__cool_down_duration_ms,
         }
 
+        return config_json
+
+    def save_to_file(self, filename: str) -> None:
+        """Save a config to a file."""
+        if self.is_valid() == False:
+            _logger.warning(
+                "Cannot save invalid control config to '%s'", filename
+            )
+            return
+
+        config_json = self.get_as_json()
+
         try:
             with open(filename, "w") as file:
                 json.dump(config_json, file, indent=4)
@@ -323,6 +338,12 @@ class Control:
         self.__cool_down_duration_ms: int = -1
         self.__locked = False
         self.__initialized = False
+        self.__state_start_time = 0
+        # The trace of the command that set the desired state, if any, and
+        # the traces that have reached GPIO.
+        self.__pending_trace: commands.CommandTrace | None = None
+        self.__completed_traces: list[commands.CommandTrace] = []
+        self.__transition_counts: dict[Control.State, int] = {}
 
     def initialize(
         self,
@@ -375,26 +396,21 @@ class Control:
         self.__moving_duration_ms = moving_duration_ms
         self.__cool_down_duration_ms = cool_down_duration_ms
 
-        # Try to acquire the GPIO lines.
-        if (
-            self.__gpio_manager.acquire_output_line(self.__up_gpio_line)
-            == False
-        ):
-            self.__logger.error("Failed to acquire up GPIO line.")
-            return False
-
+        # Try to acquire both GPIO lines with a single request.
         if (
-            self.__gpio_manager.acquire_output_line(self.__down_gpio_line)
+            self.__gpio_manager.acquire_output_lines(
+                [self.__up_gpio_line, self.__down_gpio_line]
+            )
             == False
         ):
-            self.__logger.error("Failed to acquire down GPIO line.")
-            self.__gpio_manager.release_output_line(self.__up_gpio_line)
+            self.__logger.error("Failed to acquire GPIO lines.")
             return False
 
         # This should be redundant, but set both lines to an active just in
         # case.
-        self.__gpio_manager.set_line_inactive(self.__up_gpio_line)
-        self.__gpio_manager.set_line_inactive(self.__down_gpio_line)
+        self.__gpio_manager.set_line_values(
+            {self.__up_gpio_line: False, self.__down_gpio_line: False}
+        )
 
         self.__initialized = True
 
@@ -447,10 +463,68 @@ class Control:
         """Get the current state."""
         return self.__state
 
+    def set_durations(
+        self, moving_duration_ms: int, cool_down_duration_ms: int
+    ) -> bool:
+        """Change the durations of an initialized control.
+
+        Returns whether the durations were valid.
+        """
+        if moving_duration_ms < 1:
+            self.__logger.error(
+                "Invalid moving duration for control: %d ms.",
+                moving_duration_ms,
+            )
+            return False
+
+        if cool_down_duration_ms < 0:
+            self.__logger.error(
+                "Invalid cool down duration for control: %d ms.",
+                cool_down_duration_ms,
+            )
+            return False
+
+        self.__moving_duration_ms = moving_duration_ms
+        self.__cool_down_duration_ms = cool_down_duration_ms
+
+        self.__logger.info(
+            "Changed moving duration to %d ms and cool down duration to %d "
+            + "ms.",
+            self.__moving_duration_ms,
+            self.__cool_down_duration_ms,
+        )
+        return True
+
+    @property
+    def next_deadline(self) -> int | None:
+        """Get the point in time when the control next needs processing.
+
+        Returns None if the control is idle and will stay that way until it is
+        given a new desired state.
+        """
+        match self.__state:
+            case Control.State.IDLE:
+                return None
+            case Control.State.MOVE_UP | Control.State.MOVE_DOWN:
+                duration_ms = self.__moving_duration_ms
+            case Control.State.COOL_DOWN:
+                duration_ms = self.__cool_down_duration_ms
+            case unknown:
+                typing.assert_never(unknown)
+
+        return self.__state_start_time + (duration_ms * 1000000)
+
     def set_desired_state(
-        self, notification_list: list[str], state: State
+        self,
+        notification_list: list[str],
+        state: State,
+        trace: commands.CommandTrace | None = None,
     ) -> None:
-        """Set the next state."""
+        """Set the next state.
+
+        trace - If the state came from a traced command, when the control's
+            GPIO lines are set for the state is added to the trace.
+        """
         if self.__initialized == False:
             raise ValueError(
                 "Attempted to set state on an uninitialized control."
@@ -466,9 +540,21 @@ class Control:
             return
 
         self.__desired_state = state
+        self.__pending_trace = trace
 
         self.__logger.info("Set desired state to '%s'.", state.as_string())
 
+    @property
+    def transition_counts(self) -> dict[State, int]:
+        """Get how many times the control has entered each state."""
+        return dict(self.__transition_counts)
+
+    def pop_completed_traces(self) -> list[commands.CommandTrace]:
+        """Remove and return the traces that have reached GPIO."""
+        completed_traces = self.__completed_traces
+        self.__completed_traces = []
+        return completed_traces
+
     @property
     def locked(self) -> bool:
         """Get whether the control is locked."""
@@ -520,28 +606,50 @@ class Control:
             state.as_string(),
         )
 
+        # Only a move to the desired state completes the pending trace. Any
+        # other transition means the traced command no longer applies.
+        trace = self.__pending_trace if state == self.__desired_state else None
+        self.__pending_trace = None
+        trace_id = trace.trace_id if trace is not None else None
+
+        # Both lines are set together so they never change separately.
         match state:
             case Control.State.MOVE_UP:
-                self.__gpio_manager.set_line_inactive(self.__down_gpio_line)
-                self.__gpio_manager.set_line_active(self.__up_gpio_line)
+                self.__gpio_manager.set_line_values(
+                    {self.__down_gpio_line: False, self.__up_gpio_line: True},
+                    trace_id,
+                )
                 notifications.append(f"Raising the {self.__name}.")
 
             case Control.State.MOVE_DOWN:
-                self.__gpio_manager.set_line_inactive(self.__up_gpio_line)
-                self.__gpio_manager.set_line_active(self.__down_gpio_line)
+                self.__gpio_manager.set_line_values(
+                    {self.__up_gpio_line: False, self.__down_gpio_line: True},
+                    trace_id,
+                )
                 notifications.append(f"Lowering the {self.__name}.")
 
             case Control.State.COOL_DOWN:
-                self.__gpio_manager.set_line_inactive(self.__up_gpio_line)
-                self.__gpio_manager.set_line_inactive(self.__down_gpio_line)
+                self.__gpio_manager.set_line_values(
+                    {self.__up_gpio_line: False, self.__down_gpio_line: False}
+                )
                 notifications.append(f"{self.__name} stopped.")
 
             case _:
-                self.__gpio_manager.set_line_inactive(self.__up_gpio_line)
-                self.__gpio_manager.set_line_inactive(self.__down_gpio_line)
+                self.__gpio_manager.set_line_values(
+                    {self.__up_gpio_line: False, self.__down_gpio_line: False}
+                )
 
         self.__state = state
         self.__state_start_time = self.__timer.get_current_time()
+        self.__transition_counts[state] = (
+            self.__transition_counts.get(state, 0) + 1
+        )
+
+        if (trace is not None) and (
+            state in (Control.State.MOVE_UP, Control.State.MOVE_DOWN)
+        ):
+            trace.gpio_time = self.__state_start_time
+            self.__completed_traces.append(trace)
 
     def __process_idle_state(self, notifications: list[str]) -> None:
         """Process the idle state."""
@@ -602,18 +710,53 @@ class ControlManager:
         timer: time_util.Timer,
         gpio_manager: gpio.GPIOManager,
         report_manager: reports.ReportManager,
+        scheduler: time_util.Scheduler | None = None,
     ) -> None:
-        """Initialize the manager."""
+        """Initialize the manager.
+
+        scheduler - If provided, controls register their deadlines with it and
+            only controls that are due get processed. Otherwise every control
+            is processed every time.
+        """
         self.__timer = timer
         self.__gpio_manager = gpio_manager
         self.__report_manager = report_manager
+        self.__scheduler = scheduler
         self.__controls: dict[str, Control] = {}
+        # The config of each control and which file each control came from.
+        self.__configs: dict[str, ControlConfig] = {}
+        self.__config_names: dict[str, str] = {}
+        # Only used with a scheduler. A dictionary keeps the order stable.
+        self.__due_names: dict[str, None] = {}
+        self.__deadline_handles: dict[str, int] = {}
+        self.__completed_traces: list[commands.CommandTrace] = []
+        # Transitions of controls that have been removed, so the totals don't
+        # go backwards when a control is reloaded.
+        self.__removed_transition_counts: dict[tuple[str, str], int] = {}
 
     @property
     def num_controls(self) -> int:
         """Get the number of controls."""
         return len(self.__controls)
 
+    def get_transition_counts(self) -> dict[tuple[str, str], int]:
+        """Get how many times each control has entered each state.
+
+        The keys are the control name and the state as a string.
+        """
+        counts = dict(self.__removed_transition_counts)
+
+        for name, control in self.__controls.items():
+            for state, count in control.transition_counts.items():
+                key = (name, state.as_string())
+                counts[key] = counts.get(key, 0) + count
+
+        return counts
+
+    def get_names(self) -> list[str]:
+        """Get the names of the controls."""
+        return list(self.__controls)
+
     def get_states(self) -> dict[str, Control.State]:
         """Get the states of the controls."""
         states: dict[str, Control.State] = {}
@@ -632,21 +775,42 @@ class ControlManager:
 
         return states
 
-    def initialize(self, base_dir: str) -> None:
-        """Initialize the manager (load controls)."""
+    def initialize(
+        self,
+        base_dir: str,
+        cache: config_cache.ConfigCache | None = None,
+    ) -> None:
+        """Initialize the manager (load controls).
+
+        cache - If provided, only configs that changed since they were cached
+            are parsed.
+        """
         self.uninitialize()
 
         control_path = pathlib.Path(base_dir + "controls/")
         _logger.info("Loading controls from '%s'.", str(control_path))
 
-        for config_path in control_path.glob("*.ctl"):
-            # Try parsing the config.
-            config_file = str(config_path)
-            _logger.info("Loading control from '%s'.", config_file)
+        config_files = [str(path) for path in control_path.glob("*.ctl")]
 
-            config = ControlConfig.parse_from_file(config_file)
+        if cache is None:
+            loaded_configs: list[tuple[str, ControlConfig | None]] = []
+
+            for config_file in config_files:
+                # Try parsing the config.
+                _logger.info("Loading control from '%s'.", config_file)
+                loaded_configs.append(
+                    (config_file, ControlConfig.parse_from_file(config_file))
+                )
+
+        else:
+            loaded_configs = cache.load_files(
+                config_files,
+                ControlConfig.parse_from_file,
+                ControlConfig.load_from_json,
+            )
 
-            if config.is_valid() == False:
+        for config_file, config in loaded_configs:
+            if (config is None) or (config.is_valid() == False):
                 continue
 
             # Make sure it control with this name doesn't already exist.
@@ -658,20 +822,7 @@ class ControlManager:
                 )
                 continue
 
-            control = Control(config.name, self.__timer, self.__gpio_manager)
-
-            if (
-                control.initialize(
-                    up_gpio_line=config.up_gpio_line,
-                    down_gpio_line=config.down_gpio_line,
-                    moving_duration_ms=config.moving_duration_ms,
-                    cool_down_duration_ms=config.cool_down_duration_ms,
-                )
-                == False
-            ):
-                continue
-
-            self.__controls[config.name] = control
+            self.__add_control(config_file, config)
 
     def uninitialize(self) -> None:
         """Uninitialize the manager."""
@@ -679,6 +830,88 @@ class ControlManager:
             control.uninitialize()
 
         self.__controls.clear()
+        self.__configs.clear()
+        self.__config_names.clear()
+
+        for name in list(self.__deadline_handles):
+            self.__cancel_deadline(name)
+
+        self.__due_names.clear()
+
+    def reload_config_file(self, config_file: str) -> None:
+        """Apply changes to a control config file while running.
+
+        Controls are only recreated, and their GPIO lines reacquired, if their
+        name or lines changed. A recreated control starts out idle but stays
+        locked if it was locked. Invalid configs, and configs for a control
+        that can't be created, leave the control as it was.
+        """
+        old_name = self.__config_names.get(config_file)
+
+        try:
+            config = ControlConfig.parse_from_file(config_file)
+
+        except FileNotFoundError:
+            if old_name is not None:
+                _logger.info(
+                    "Removing control '%s' because its config was deleted.",
+                    old_name,
+                )
+                self.__remove_control(old_name)
+
+            return
+
+        if config.is_valid() == False:
+            _logger.warning(
+                "Ignoring changes to invalid control config file '%s'.",
+                config_file,
+            )
+            return
+
+        if (config.name in self.__controls) and (config.name != old_name):
+            _logger.warning(
+                "A control with name '%s' already exists. Ignoring config "
+                + "file '%s'.",
+                config.name,
+                config_file,
+            )
+            return
+
+        if old_name is not None:
+            old_config = self.__configs[old_name]
+
+            if config == old_config:
+                return
+
+            if (
+                (config.name == old_config.name)
+                and (config.up_gpio_line == old_config.up_gpio_line)
+                and (config.down_gpio_line == old_config.down_gpio_line)
+            ):
+                control = self.__controls[old_name]
+
+                if (
+                    control.set_durations(
+                        config.moving_duration_ms,
+                        config.cool_down_duration_ms,
+                    )
+                    == True
+                ):
+                    self.__configs[old_name] = config
+                    self.__schedule_control(old_name, control)
+
+                return
+
+            _logger.info("Recreating control '%s' from new config.", old_name)
+            self.__recreate_control(config_file, old_name, config)
+            return
+
+        if self.__add_control(config_file, config) == False:
+            _logger.error(
+                "Failed to add control '%s' from config file '%s'.",
+                config.name,
+                config_file,
+            )
 
     def process_command(
         self, notification_list: list[str], command: commands.ControlCommand
@@ -687,6 +920,9 @@ class ControlManager:
 
         Returns whether the command was successful.
         """
+        if command.trace is not None:
+            command.trace.dispatched_time = self.__timer.get_current_time()
+
         self.__report_manager.add_control_event(
             command.control_name,
             command.action.as_string(),
@@ -701,13 +937,15 @@ class ControlManager:
         match command.action:
             case commands.ControlCommand.Action.MOVE_UP:
                 control_list[0].set_desired_state(
-                    notification_list, Control.State.MOVE_UP
+                    notification_list, Control.State.MOVE_UP, command.trace
                 )
+                self.__mark_due(command.control_name)
 
             case commands.ControlCommand.Action.MOVE_DOWN:
                 control_list[0].set_desired_state(
-                    notification_list, Control.State.MOVE_DOWN
+                    notification_list, Control.State.MOVE_DOWN, command.trace
                 )
+                self.__mark_due(command.control_name)
 
             case commands.ControlCommand.Action.LOCK:
                 if command.control_name == "all":
@@ -733,9 +971,179 @@ class ControlManager:
         return True
 
     def process_controls(self, notification_list: list[str]) -> None:
-        """Process controls."""
-        for _name, control in self.__controls.items():
+        """Process controls.
+
+        When using a scheduler, only controls that were given commands or whose
+        deadlines expired (when the scheduler was processed) are processed.
+        """
+        if self.__scheduler is None:
+            names = list(self.__controls)
+
+        else:
+            names = list(self.__due_names)
+            self.__due_names.clear()
+
+        for name in names:
+            control = self.__controls.get(name)
+
+            if control is None:
+                continue
+
             control.process(notification_list)
+            self.__schedule_control(name, control)
+
+            for trace in control.pop_completed_traces():
+                self.__add_completed_trace(name, trace)
+
+    def pop_completed_traces(self) -> list[commands.CommandTrace]:
+        """Remove and return the traces of commands that reached GPIO."""
+        completed_traces = self.__completed_traces
+        self.__completed_traces = []
+        return completed_traces
+
+    def __add_completed_trace(
+        self, name: str, trace: commands.CommandTrace
+    ) -> None:
+        """Report a trace that reached GPIO and keep it for the caller."""
+        stage_durations_ns = trace.get_stage_durations_ns()
+
+        if stage_durations_ns is None:
+            return
+
+        self.__report_manager.add_trace_event(
+            name,
+            trace.trace_id,
+            {
+                stage + "Us": duration_ns // 1000
+                for stage, duration_ns in stage_durations_ns.items()
+            },
+        )
+        self.__completed_traces.append(trace)
+
+    def __add_control(self, config_file: str, config: ControlConfig) -> bool:
+        """Create and initialize a control from a valid config.
+
+        Returns whether the control was added.
+        """
+        control = self.__create_control(config)
+
+        if control is None:
+            return False
+
+        self.__controls[config.name] = control
+        self.__configs[config.name] = config
+        self.__config_names[config_file] = config.name
+        return True
+
+    def __create_control(self, config: ControlConfig) -> Control | None:
+        """Create and initialize a control from a valid config.
+
+        Returns None if the control couldn't be initialized.
+        """
+        control = Control(config.name, self.__timer, self.__gpio_manager)
+
+        if (
+            control.initialize(
+                up_gpio_line=config.up_gpio_line,
+                down_gpio_line=config.down_gpio_line,
+                moving_duration_ms=config.moving_duration_ms,
+                cool_down_duration_ms=config.cool_down_duration_ms,
+            )
+            == False
+        ):
+            return None
+
+        return control
+
+    def __recreate_control(
+        self, config_file: str, old_name: str, config: ControlConfig
+    ) -> None:
+        """Replace a control with one created from a new config.
+
+        If the new control can't be created, the old config is kept. Either
+        way, the replacement starts idle, since releasing the old lines
+        stopped the control.
+        """
+        old_control = self.__controls[old_name]
+        old_config = self.__configs[old_name]
+
+        # Release the old lines first, since the new config may reuse some.
+        old_control.uninitialize()
+        control = self.__create_control(config)
+
+        if control is None:
+            _logger.error(
+                "Failed to recreate control '%s' from config file '%s'. "
+                + "Keeping the old config.",
+                old_name,
+                config_file,
+            )
+
+            config = old_config
+            control = self.__create_control(config)
+
+            if control is None:
+                _logger.error("Failed to restore control '%s'.", old_name)
+                self.__forget_control(old_name)
+                return
+
+        if old_control.locked == True:
+            control.lock([])
+
+        self.__forget_control(old_name)
+        self.__controls[config.name] = control
+        self.__configs[config.name] = config
+        self.__config_names[config_file] = config.name
+
+    def __remove_control(self, name: str) -> None:
+        """Uninitialize and remove a control."""
+        self.__controls[name].uninitialize()
+        self.__forget_control(name)
+
+    def __forget_control(self, name: str) -> None:
+        """Remove a control that has already been uninitialized."""
+        control = self.__controls.pop(name)
+
+        for state, count in control.transition_counts.items():
+            key = (name, state.as_string())
+            self.__removed_transition_counts[key] = (
+                self.__removed_transition_counts.get(key, 0) + count
+            )
+
+        del self.__configs[name]
+        self.__cancel_deadline(name)
+        self.__due_names.pop(name, None)
+
+        for config_file, config_name in list(self.__config_names.items()):
+            if config_name == name:
+                del self.__config_names[config_file]
+
+    def __mark_due(self, name: str) -> None:
+        """Mark a control as needing processing."""
+        self.__due_names[name] = None
+
+    def __schedule_control(self, name: str, control: Control) -> None:
+        """Register the next deadline of a control with the scheduler."""
+        if self.__scheduler is None:
+            return
+
+        self.__cancel_deadline(name)
+
+        deadline = control.next_deadline
+
+        if deadline is None:
+            return
+
+        self.__deadline_handles[name] = self.__scheduler.schedule(
+            deadline, functools.partial(self.__mark_due, name)
+        )
+
+    def __cancel_deadline(self, name: str) -> None:
+        """Cancel the registered deadline of a control, if there is one."""
+        handle = self.__deadline_handles.pop(name, None)
+
+        if (handle is not None) and (self.__scheduler is not None):
+            self.__scheduler.cancel(handle)
 
     def __get_matching_controls(
         self, command: commands.ControlCommand
@@ -0,0 +1,257 @@
+"""Watches directories for files that change.
+
+On Linux, inotify is used so that nothing needs to be read from the disk until
+something actually changes. Elsewhere, or if inotify is unavailable, the
+directories are polled by comparing file sizes and modification times.
+"""
+
+import ctypes
+import ctypes.util
+import dataclasses
+import enum
+import logging
+import os
+import pathlib
+import struct
+
+_logger = logging.getLogger("sandman.file_watch")
+
+# Values from <sys/inotify.h>.
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE
+
+# The fixed size part of struct inotify_event, which is followed by the name.
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+@dataclasses.dataclass
+class FileChange:
+    """A change to a watched file."""
+
+    @enum.unique
+    class Kind(enum.Enum):
+        """What happened to the file."""
+
+        # The file was created or its contents changed.
+        MODIFIED = enum.auto()
+        DELETED = enum.auto()
+
+    path: str
+    kind: Kind
+
+
+@dataclasses.dataclass
+class _WatchedDirectory:
+    """A directory being watched and the files in it that matter."""
+
+    path: pathlib.Path
+    suffix: str
+    # Only used when polling, the size and modification time of each file.
+    snapshot: dict[str, tuple[int, int]]
+
+
+class FileWatcher:
+    """Watches directories for changes to files with particular suffixes."""
+
+    def __init__(self, use_inotify: bool = True) -> None:
+        """Initialize the instance.
+
+        use_inotify - If this is False, or inotify can't be used, directories
+            will be polled instead.
+        """
+        self.__directories: list[_WatchedDirectory] = []
+        self.__inotify_fd = -1
+        self.__libc: ctypes.CDLL | None = None
+        self.__watch_directories: dict[int, _WatchedDirectory] = {}
+
+        if use_inotify == True:
+            self.__init_inotify()
+
+    @property
+    def is_using_inotify(self) -> bool:
+        """Get whether changes are found with inotify instead of polling."""
+        return self.__inotify_fd >= 0
+
+    def watch_directory(self, path: str, suffix: str) -> bool:
+        """Start watching a directory for changes to files with a suffix.
+
+        Returns whether the directory is being watched.
+        """
+        directory = _WatchedDirectory(pathlib.Path(path), suffix, {})
+
+        if self.__libc is not None and self.__inotify_fd >= 0:
+            watch_descriptor = self.__libc.inotify_add_watch(
+                self.__inotify_fd, os.fsencode(path), _WATCH_MASK
+            )
+
+            if watch_descriptor < 0:
+                _logger.warning(
+                    "Failed to watch directory '%s' (error %d).",
+                    path,
+                    ctypes.get_errno(),
+                )
+                return False
+
+            self.__watch_directories[watch_descriptor] = directory
+
+        else:
+            directory.snapshot = self.__take_snapshot(directory)
+
+        self.__directories.append(directory)
+        _logger.info("Watching '%s' for '%s' files.", path, suffix)
+        return True
+
+    def poll(self) -> list[FileChange]:
+        """Get the changes since the last time this was called.
+
+        Each file is reported at most once, with its latest change.
+        """
+        changes: dict[str, FileChange.Kind] = {}
+
+        if self.__inotify_fd >= 0:
+            self.__read_inotify_events(changes)
+
+        else:
+            for directory in self.__directories:
+                self.__poll_directory(directory, changes)
+
+        return [FileChange(path, kind) for path, kind in changes.items()]
+
+    def close(self) -> None:
+        """Stop watching everything."""
+        if self.__inotify_fd >= 0:
+            os.close(self.__inotify_fd)
+            self.__inotify_fd = -1
+
+        self.__directories.clear()
+        self.__watch_directories.clear()
+
+    def __init_inotify(self) -> None:
+        """Try to set up inotify."""
+        library_name = ctypes.util.find_library("c")
+
+        if library_name is None:
+            _logger.info("No C library found, so polling for file changes.")
+            return
+
+        try:
+            libc = ctypes.CDLL(library_name, use_errno=True)
+            inotify_fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+
+        except (OSError, AttributeError):
+            _logger.info("Inotify is unavailable, so polling for changes.")
+            return
+
+        if inotify_fd < 0:
+            _logger.info(
+                "Failed to initialize inotify (error %d), so polling for "
+                + "changes.",
+                ctypes.get_errno(),
+            )
+            return
+
+        self.__libc = libc
+        self.__inotify_fd = inotify_fd
+
+    def __read_inotify_events(
+        self, changes: dict[str, FileChange.Kind]
+    ) -> None:
+        """Read all of the pending inotify events."""
+        while True:
+            try:
+                data = os.read(self.__inotify_fd, 65536)
+
+            except BlockingIOError:
+                return
+
+            except OSError:
+                _logger.warning("Failed to read inotify events.")
+                return
+
+            offset = 0
+
+            while offset + _EVENT_HEADER.size <= len(data):
+                watch_descriptor, mask, _cookie, name_size = (
+                    _EVENT_HEADER.unpack_from(data, offset)
+                )
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(
+                    data[offset : offset + name_size].rstrip(b"\0")
+                )
+                offset += name_size
+
+                # Events were lost, so check everything.
+                if (mask & _IN_Q_OVERFLOW) != 0:
+                    _logger.warning("Inotify events overflowed, rescanning.")
+                    self.__rescan(changes)
+                    continue
+
+                directory = self.__watch_directories.get(watch_descriptor)
+
+                if (directory is None) or (
+                    name.endswith(directory.suffix) == False
+                ):
+                    continue
+
+                path = str(directory.path / name)
+
+                if (mask & (_IN_DELETE | _IN_MOVED_FROM)) != 0:
+                    changes[path] = FileChange.Kind.DELETED
+
+                else:
+                    changes[path] = FileChange.Kind.MODIFIED
+
+    def __rescan(self, changes: dict[str, FileChange.Kind]) -> None:
+        """Report every watched file as modified."""
+        for directory in self.__directories:
+            for path in self.__take_snapshot(directory):
+                changes[path] = FileChange.Kind.MODIFIED
+
+    def __poll_directory(
+        self,
+        directory: _WatchedDirectory,
+        changes: dict[str, FileChange.Kind],
+    ) -> None:
+        """Compare a directory against its last snapshot."""
+        snapshot = self.__take_snapshot(directory)
+
+        for path, stats in snapshot.items():
+            if directory.snapshot.get(path) != stats:
+                changes[path] = FileChange.Kind.MODIFIED
+
+        for path in directory.snapshot:
+            if path not in snapshot:
+                changes[path] = FileChange.Kind.DELETED
+
+        directory.snapshot = snapshot
+
+    def __take_snapshot(
+        self, directory: _WatchedDirectory
+    ) -> dict[str, tuple[int, int]]:
+        """Get the size and modification time of each file in a directory."""
+        snapshot: dict[str, tuple[int, int]] = {}
+
+        try:
+            paths = list(directory.path.glob("*" + directory.suffix))
+
+        except OSError:
+            _logger.warning("Failed to list directory '%s'.", directory.path)
+            return snapshot
+
+        for path in paths:
+            try:
+                stats = path.stat()
+
+            except OSError:
+                continue
+
+            snapshot[str(path)] = (stats.st_size, stats.st_mtime_ns)
+
+        return snapshot
@@ -27,6 +27,14 @@ class GPIOManager:
         ] = {}
         self.__is_live_mode: bool = is_live_mode
         self.__initialized: bool = False
+        # The last value written to each acquired line, so that writes that
+        # wouldn't change anything can be skipped.
+        self.__line_values: dict[int, gpiod.line.Value] = {}
+        self.__num_issued_writes = 0
+        self.__num_elided_writes = 0
+        # Lines acquired together share a request, which is tracked by its id.
+        self.__request_lines: dict[int, list[int]] = {}
+        self.__request_num_acquired: dict[int, int] = {}
 
     def initialize(self) -> None:
         """Set up the manager for use."""
@@ -61,27 +69,58 @@ class GPIOManager:
         """Access a list of the acquired lines."""
         return list(self.__line_requests)
 
+    @property
+    def num_issued_writes(self) -> int:
+        """Get the number of line writes that changed a line's value."""
+        return self.__num_issued_writes
+
+    @property
+    def num_elided_writes(self) -> int:
+        """Get the number of line writes skipped because nothing changed."""
+        return self.__num_elided_writes
+
     def acquire_output_line(self, line: int) -> bool:
         """Acquire a line for output."""
+        return self.acquire_output_lines([line])
+
+    def acquire_output_lines(self, lines: list[int]) -> bool:
+        """Acquire several lines for output with a single request.
+
+        Either all of the lines are acquired or none of them are. Lines that
+        share a request can be released individually, but the request itself
+        is only released along with its last line.
+        """
         if self.__initialized == False:
             return False
 
-        if line in self.__line_requests:
-            self.__logger.info(
-                "Ignoring request to acquire output line %d because it has "
-                + "already been acquired.",
-                line,
+        if (len(lines) == 0) or (len(set(lines)) != len(lines)):
+            self.__logger.warning(
+                "Cannot acquire output lines %s, they must be unique.",
+                str(lines),
             )
             return False
 
-        # When not in live mode, pretend that the line was requested.
+        for line in lines:
+            if line in self.__line_requests:
+                self.__logger.info(
+                    "Ignoring request to acquire output line %d because it "
+                    + "has already been acquired.",
+                    line,
+                )
+                return False
+
+        # When not in live mode, pretend that the lines were requested.
         if self.__is_live_mode == False:
-            self.__line_requests[line] = None
+            for line in lines:
+                self.__line_requests[line] = None
+                self.__line_values[line] = gpiod.line.Value.ACTIVE
+
             return True
 
         if self.__chip is None:
             self.__logger.warning(
-                "Tried to acquire output line %d, but there is no chip.", line
+                "Tried to acquire output lines %s, but there is no chip.",
+                str(lines),
             )
             return False
 
@@ -89,7 +128,7 @@ class GPIOManager:
             request: gpiod.LineRequest = self.__chip.request_lines(
                 consumer="sandman",
                 config={
-                    line: gpiod.LineSettings(
+                    tuple(lines): gpiod.LineSettings(
                         direction=gpiod.line.Direction.OUTPUT,
                         output_value=gpiod.line.Value.ACTIVE,
                     )
@@ -97,14 +136,24 @@ class GPIOManager:
             )
 
         except ValueError:
-            self.__logger.warning("Failed to acquire output line %d.", line)
+            self.__logger.warning(
+                "Failed to acquire output lines %s.", str(lines)
+            )
             return False
 
         if bool(request) == False:
-            self.__logger.warning("Failed to acquire output line %d.", line)
+            self.__logger.warning(
+                "Failed to acquire output lines %s.", str(lines)
+            )
             return False
 
-        self.__line_requests[line] = request
+        for line in lines:
+            self.__line_requests[line] = request
+            # This matches the output value the line was requested with.
+            self.__line_values[line] = gpiod.line.Value.ACTIVE
+
+        self.__request_lines[id(request)] = list(lines)
+        self.__request_num_acquired[id(request)] = len(lines)
         return True
 
     def release_output_line(self, line: int) -> bool:
@@ -116,23 +165,32 @@ class GPIOManager:
             )
             return False
 
-        # Only release the line in live mode (it will be None otherwise).
-        if self.__is_live_mode == True:
-            request = self.__line_requests[line]
+        request = self.__line_requests.pop(line)
+        self.__line_values.pop(line, None)
 
-            if request is not None:
-                request.release()
+        # Only release the request in live mode (it will be None otherwise).
+        if request is None:
+            return True
+
+        # Keep the request until all of its lines are released.
+        request_id = id(request)
+        self.__request_num_acquired[request_id] -= 1
+
+        if self.__request_num_acquired[request_id] > 0:
+            return True
 
-        del self.__line_requests[line]
+        del self.__request_num_acquired[request_id]
+        request_lines = self.__request_lines.pop(request_id)
+        request.release()
 
         if self.__chip is None:
             return True
 
-        # Set the line back to input.
+        # Set the lines back to input.
         temp_request: gpiod.LineRequest = self.__chip.request_lines(
             consumer="sandman",
             config={
-                line: gpiod.LineSettings(
+                tuple(request_lines): gpiod.LineSettings(
                     direction=gpiod.line.Direction.INPUT,
                     output_value=gpiod.line.Value.ACTIVE,
                 )
@@ -154,6 +212,66 @@ class GPIOManager:
         # with the hardware set up.
         return self.__set_line_value(line, gpiod.line.Value.ACTIVE)
 
+    def set_line_values(
+        self, values: dict[int, bool], trace_id: int | None = None
+    ) -> bool:
+        """Set several output lines at once.
+
+        values - Whether each line should be active.
+        trace_id - Identifies the command that caused this, if it's traced.
+
+        Lines that share a request are set with a single call. Nothing is set
+        if any of the lines haven't been acquired.
+        """
+        for line in values:
+            if line not in self.__line_requests:
+                self.__logger.info(
+                    "Tried to set output line %d value, but it is not "
+                    + "acquired.",
+                    line,
+                )
+                return False
+
+        # Group the values that actually change by request.
+        request_values: dict[
+            int,
+            tuple[gpiod.LineRequest | None, dict[int | str, gpiod.line.Value]],
+        ] = {}
+
+        for line, is_active in values.items():
+            # For some reason our values need to be inverted. This may be an
+            # issue with the hardware set up.
+            value = (
+                gpiod.line.Value.INACTIVE
+                if is_active == True
+                else gpiod.line.Value.ACTIVE
+            )
+
+            if self.__line_values.get(line) == value:
+                self.__num_elided_writes += 1
+                continue
+
+            self.__line_values[line] = value
+            self.__num_issued_writes += 1
+
+            request = self.__line_requests[line]
+            request_values.setdefault(id(request), (request, {}))[1][line] = (
+                value
+            )
+
+        # Only set the values in live mode (requests will be None otherwise).
+        if self.__is_live_mode == True:
+            for request, line_values in request_values.values():
+                if request is not None:
+                    request.set_values(line_values)
+
+        if trace_id is not None:
+            self.__logger.debug(
+                "Set output lines %s for trace %d.", str(values), trace_id
+            )
+
+        return True
+
     def __set_line_value(self, line: int, value: gpiod.line.Value) -> bool:
         """Set the value of an output line."""
         if line not in self.__line_requests:
@@ -163,6 +281,13 @@ class GPIOManager:
             )
             return False
 
+        if self.__line_values.get(line) == value:
+            self.__num_elided_writes += 1
+            return True
+
+        self.__line_values[line] = value
+        self.__num_issued_writes += 1
+
         # Only set the value in live mode (it will be None otherwise).
         if self.__is_live_mode == True:
             request = self.__line_requests[line]
@@ -0,0 +1,40 @@
+"""Defers loading modules until they are first used.
+
+Some dependencies take a noticeable amount of time to import, but aren't
+needed until Sandman is actually running, so loading them lazily gets the app
+started sooner.
+"""
+
+import importlib.util
+import sys
+import types
+
+
+def load(name: str) -> types.ModuleType:
+    """Get a module that is only loaded when one of its attributes is used.
+
+    If the module has already been imported, it is returned as is.
+    """
+    module = sys.modules.get(name)
+
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+
+    if (spec is None) or (spec.loader is None):
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    # Make the module available from its package, like a regular import would.
+    parent_name, _, child_name = name.rpartition(".")
+
+    if parent_name != "":
+        setattr(sys.modules[parent_name], child_name, module)
+
+    return module
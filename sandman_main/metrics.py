@@ -0,0 +1,353 @@
+"""Keeps metrics about Sandman and serves them to be scraped.
+
+Metrics are served in the Prometheus text exposition format by a small HTTP
+server on its own thread. Updating a metric is just a dictionary update, and
+the server only reads copies of the values, so the main loop never waits on a
+scrape. Counts that are already kept elsewhere are copied in by collectors,
+which the main loop runs periodically rather than on every tick.
+"""
+
+import abc
+import collections.abc
+import http.server
+import logging
+import re
+import threading
+
+from . import profiling
+
+_logger = logging.getLogger("sandman.metrics")
+
+_NAME_PATTERN = re.compile(r"[a-zA-Z_:][a-zA-Z0-9_:]*")
+_LABEL_NAME_PATTERN = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+type LabelValues = tuple[str, ...]
+
+
+class _Metric(abc.ABC):
+    """The parts shared by every kind of metric."""
+
+    TYPE_NAME = ""
+
+    def __init__(
+        self, name: str, help_text: str, label_names: tuple[str, ...]
+    ) -> None:
+        """Initialize the instance.
+
+        name - The name of the metric, including the unit.
+        help_text - A description of what the metric measures.
+        label_names - The names of the labels that identify each value.
+        """
+        if _NAME_PATTERN.fullmatch(name) is None:
+            raise ValueError(f"Invalid metric name '{name}'.")
+
+        for label_name in label_names:
+            if (_LABEL_NAME_PATTERN.fullmatch(label_name) is None) or (
+                label_name.startswith("__")
+            ):
+                raise ValueError(f"Invalid label name '{label_name}'.")
+
+        self.__name = name
+        self.__help_text = help_text
+        self.__label_names = label_names
+
+    @property
+    def name(self) -> str:
+        """Get the name of the metric."""
+        return self.__name
+
+    @property
+    def label_names(self) -> tuple[str, ...]:
+        """Get the names of the labels that identify each value."""
+        return self.__label_names
+
+    def write(self, lines: list[str]) -> None:
+        """Add the metric to lines in the text exposition format."""
+        lines.append(f"# HELP {self.__name} {_escape_help(self.__help_text)}")
+        lines.append(f"# TYPE {self.__name} {self.TYPE_NAME}")
+        self._write_samples(lines)
+
+    def _check_label_values(self, label_values: LabelValues) -> None:
+        """Make sure there is a value for each label."""
+        if len(label_values) != len(self.__label_names):
+            raise ValueError(
+                f"Metric '{self.__name}' needs {len(self.__label_names)} "
+                + "label values."
+            )
+
+    @abc.abstractmethod
+    def _write_samples(self, lines: list[str]) -> None:
+        """Add the metric's samples to lines."""
+
+
+class _ValueMetric(_Metric):
+    """A metric with a single number for each set of label values."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: tuple[str, ...] = (),
+    ) -> None:
+        """Initialize the instance."""
+        super().__init__(name, help_text, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def get_value(self, label_values: LabelValues = ()) -> float:
+        """Get the value for a set of label values."""
+        return self._values.get(label_values, 0)
+
+    def set(self, value: float, label_values: LabelValues = ()) -> None:
+        """Set the value for a set of label values."""
+        self._check_label_values(label_values)
+        self._values[label_values] = value
+
+    def _write_samples(self, lines: list[str]) -> None:
+        """Add the metric's samples to lines."""
+        # Copying is atomic, so the main loop can keep updating the values.
+        values = self._values.copy()
+
+        for label_values, value in values.items():
+            lines.append(
+                self.name
+                + _format_labels(self.label_names, label_values)
+                + " "
+                + _format_value(value)
+            )
+
+
+class Counter(_ValueMetric):
+    """A total that only goes up.
+
+    Use set to copy in a total that is counted elsewhere.
+    """
+
+    TYPE_NAME = "counter"
+
+    def inc(self, label_values: LabelValues = (), amount: float = 1) -> None:
+        """Increase the total for a set of label values."""
+        if amount < 0:
+            raise ValueError("Counters can only be increased.")
+
+        self.set(self._values.get(label_values, 0) + amount, label_values)
+
+
+class Gauge(_ValueMetric):
+    """A value that can go up and down."""
+
+    TYPE_NAME = "gauge"
+
+    def set_all(self, values: dict[LabelValues, float]) -> None:
+        """Replace the values for every set of label values.
+
+        Label values that aren't provided are no longer served, which suits
+        gauges for things that come and go.
+        """
+        for label_values in values:
+            self._check_label_values(label_values)
+
+        # Replaced as a whole, so a scrape never sees a partial update.
+        self._values = dict(values)
+
+
+class Histogram(_Metric):
+    """Counts durations in the same fixed buckets as the profiler."""
+
+    TYPE_NAME = "histogram"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        """Initialize the instance."""
+        super().__init__(name, help_text, ())
+        self.__histogram = profiling.Histogram()
+
+    @property
+    def count(self) -> int:
+        """Get the number of observed durations."""
+        return self.__histogram.count
+
+    def observe_ns(self, duration_ns: int) -> None:
+        """Record a duration."""
+        self.__histogram.record(duration_ns)
+
+    def _write_samples(self, lines: list[str]) -> None:
+        """Add the metric's samples to lines."""
+        cumulative_count = 0
+
+        for bound_ns, count in self.__histogram.get_bucket_counts():
+            cumulative_count += count
+            bound = "+Inf" if bound_ns is None else repr(bound_ns / 1e9)
+            lines.append(
+                f'{self.name}_bucket{{le="{bound}"}} {cumulative_count}'
+            )
+
+        lines.append(
+            f"{self.name}_sum "
+            + _format_value(self.__histogram.total_ns / 1e9)
+        )
+        lines.append(f"{self.name}_count {cumulative_count}")
+
+
+class Registry:
+    """Holds metrics and the collectors that update them."""
+
+    def __init__(self) -> None:
+        """Initialize the instance."""
+        self.__metrics: dict[str, _Metric] = {}
+        self.__collectors: list[collections.abc.Callable[[], None]] = []
+
+    def register[MetricT: _Metric](self, metric: MetricT) -> MetricT:
+        """Add a metric to be served.
+
+        Returns the metric, so it can be created and registered at once.
+        """
+        if metric.name in self.__metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+
+        self.__metrics[metric.name] = metric
+        return metric
+
+    def get_metric(self, name: str) -> _Metric | None:
+        """Get a registered metric by name."""
+        return self.__metrics.get(name)
+
+    def add_collector(
+        self, collector: collections.abc.Callable[[], None]
+    ) -> None:
+        """Add a function that updates metrics when collect is called."""
+        self.__collectors.append(collector)
+
+    def collect(self) -> None:
+        """Run the collectors."""
+        for collector in self.__collectors:
+            collector()
+
+    def render(self) -> str:
+        """Get all of the metrics in the text exposition format."""
+        lines: list[str] = []
+
+        for metric in list(self.__metrics.values()):
+            metric.write(lines)
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the metrics in a registry over HTTP on a background thread."""
+
+    def __init__(self, registry: Registry, host: str, port: int) -> None:
+        """Initialize the instance.
+
+        host - The address to listen on. An empty string means all addresses.
+        port - The port to listen on. Zero picks any free port.
+        """
+        self.__registry = registry
+        self.__host = host
+        self.__port = port
+        self.__server: http.server.HTTPServer | None = None
+        self.__thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        """Get the port being listened on, once started."""
+        if self.__server is None:
+            return self.__port
+
+        return self.__server.server_address[1]
+
+    def start(self) -> bool:
+        """Start serving metrics.
+
+        Returns whether the server was started.
+        """
+        registry = self.__registry
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            """Answers scrapes of the metrics."""
+
+            # Don't let a stalled scraper hold up the next one forever.
+            timeout = 5
+
+            def do_GET(self) -> None:  # noqa: N802
+                """Send the metrics."""
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", _CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, message_format: str, *args: object) -> None:
+                """Log requests through Sandman's logger."""
+                _logger.debug(message_format, *args)
+
+        try:
+            self.__server = http.server.HTTPServer(
+                (self.__host, self.__port), _Handler
+            )
+
+        except OSError as error:
+            _logger.error(
+                "Failed to serve metrics on port %d: %s", self.__port, error
+            )
+            return False
+
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever,
+            name="sandman-metrics",
+            daemon=True,
+        )
+        self.__thread.start()
+        _logger.info("Serving metrics on port %d.", self.port)
+        return True
+
+    def stop(self) -> None:
+        """Stop serving metrics."""
+        if self.__server is None:
+            return
+
+        self.__server.shutdown()
+        self.__server.server_close()
+
+        if self.__thread is not None:
+            self.__thread.join()
+
+        self.__server = None
+        self.__thread = None
+
+
+def _escape_help(text: str) -> str:
+    """Escape help text for the text exposition format."""
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(
+    label_names: tuple[str, ...], label_values: LabelValues
+) -> str:
+    """Format labels for a sample, or nothing if there are none."""
+    if len(label_names) == 0:
+        return ""
+
+    labels = ",".join(
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(label_names, label_values, strict=True)
+    )
+    return "{" + labels + "}"
+
+
+def _escape_label_value(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value, without a fraction for whole numbers."""
+    if float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
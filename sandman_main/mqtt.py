@@ -1,18 +1,66 @@
 """Everything needed to use MQTT."""
 
+import asyncio
 import collections
+import collections.abc
 import dataclasses
 import json
 import logging
 import os
-import time
+import random
+import socket
+import threading
 import typing
 
-import paho.mqtt.client
-import paho.mqtt.enums
-import paho.mqtt.reasoncodes
-
-from . import commands
+from . import (
+    command_queue,
+    commands,
+    lazy_import,
+    notifications,
+    time_util,
+)
+
+# Paho is slow to import and isn't needed until connecting, so it's loaded the
+# first time it's used.
+if typing.TYPE_CHECKING:
+    import paho.mqtt.client
+    import paho.mqtt.enums
+else:
+    # Loading the modules lazily makes them available from the package.
+    lazy_import.load("paho.mqtt.client")
+    lazy_import.load("paho.mqtt.enums")
+    paho = lazy_import.load("paho")
+
+# The range of delays between attempts to connect to the broker.
+_MIN_RECONNECT_DELAY_SEC = 1
+_MAX_RECONNECT_DELAY_SEC = 60
+
+# The most commands that can wait to be processed. Commands arrive much more
+# slowly than they're processed, so this is only reached by a flood of intents.
+_MAX_PENDING_COMMANDS = 64
+
+# The most notifications kept while waiting to connect. When there are more,
+# the oldest are dropped, because they will be stale anyway.
+_MAX_PENDING_NOTIFICATIONS = 32
+
+# The most notification payloads kept ready to publish.
+_PAYLOAD_CACHE_SIZE = 128
+
+# The site that notifications are played on.
+_SITE_ID = "default"
+
+# Where statistics about Sandman are published.
+_STATS_TOPIC = "sandman/stats"
+
+# Once anything is heard on these topics, the dialogue manager is up and will
+# be able to play notifications. This only listens, because Hermes has no
+# request that gets a reply without starting a session, which would speak or
+# listen for speech. So on a quiet system the full startup delay is waited.
+_READINESS_TOPICS = ["hermes/dialogueManager/#", "hermes/hotword/#"]
+
+# The socket types that paho passes to socket callbacks. This is lazily
+# evaluated, because the websocket wrapper is only public in the type stubs.
+type _Socket = socket.socket | paho.mqtt.client.WebsocketWrapper | None
 
 
 @dataclasses.dataclass
@@ -23,141 +71,486 @@ class _MessageInfo:
     payload: str
 
 
+class PayloadCache:
+    """Keeps the encoded payloads of recently published notifications.
+
+    Notifications come from a small set of phrases, so the same payloads are
+    published over and over. The least recently used payload is forgotten
+    when the cache is full.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize the instance.
+
+        capacity - The most payloads that are kept.
+        """
+        self.__capacity = capacity
+        self.__payloads: collections.OrderedDict[tuple[str, str], bytes] = (
+            collections.OrderedDict()
+        )
+        self.__num_hits = 0
+        self.__num_misses = 0
+
+    @property
+    def num_hits(self) -> int:
+        """Get the number of payloads that were already encoded."""
+        return self.__num_hits
+
+    @property
+    def num_misses(self) -> int:
+        """Get the number of payloads that had to be encoded."""
+        return self.__num_misses
+
+    def __len__(self) -> int:
+        """Get the number of payloads being kept."""
+        return len(self.__payloads)
+
+    def get_start_session_payload(self, text: str, site_id: str) -> bytes:
+        """Get the payload to start a session that speaks a notification."""
+        key = (text, site_id)
+        payload = self.__payloads.get(key)
+
+        if payload is not None:
+            self.__num_hits += 1
+            self.__payloads.move_to_end(key)
+            return payload
+
+        self.__num_misses += 1
+
+        payload_json = {
+            "init": {"type": "notification", "text": text},
+            "siteId": site_id,
+        }
+        payload = json.dumps(payload_json).encode("utf8")
+        self.__payloads[key] = payload
+
+        if len(self.__payloads) > self.__capacity:
+            self.__payloads.popitem(last=False)
+
+        return payload
+
+
+class ReconnectBackoff:
+    """Picks the delays between attempts to connect.
+
+    The delays grow exponentially with each failed attempt, up to a limit. Each
+    delay is picked at random from the upper half of the current range, so
+    clients that lost the broker at the same time don't all retry together.
+    """
+
+    def __init__(
+        self,
+        min_delay_sec: int,
+        max_delay_sec: int,
+        random_source: random.Random | None = None,
+    ) -> None:
+        """Initialize the instance.
+
+        min_delay_sec - The range of the first delay after connecting.
+        max_delay_sec - The range will never grow past this.
+        random_source - Used to pick the delays, which is useful for testing.
+        """
+        self.__min_delay_sec = min_delay_sec
+        self.__max_delay_sec = max_delay_sec
+        self.__random = (
+            random_source if random_source is not None else random.Random()
+        )
+        self.__num_failures = 0
+        self.__range_sec = min_delay_sec
+
+    @property
+    def num_failures(self) -> int:
+        """Get the number of attempts that failed since the last reset."""
+        return self.__num_failures
+
+    def get_next_delay_sec(self) -> int:
+        """Record a failed attempt and get the delay before the next one."""
+        delay_sec = self.__random.randint(
+            max(self.__range_sec // 2, self.__min_delay_sec), self.__range_sec
+        )
+
+        self.__num_failures += 1
+        self.__range_sec = min(self.__range_sec * 2, self.__max_delay_sec)
+
+        return delay_sec
+
+    def reset(self) -> None:
+        """Go back to the shortest delays after connecting successfully."""
+        self.__num_failures = 0
+        self.__range_sec = self.__min_delay_sec
+
+
 class MQTTClient:
     """Functionality to communicate with an MQTT broker."""
 
-    def __init__(self) -> None:
-        """Initialize the instance."""
+    def __init__(
+        self,
+        intent_parser: commands.IntentParser | None = None,
+        timer: time_util.Timer | None = None,
+        client_factory: collections.abc.Callable[[], "paho.mqtt.client.Client"]
+        | None = None,
+    ) -> None:
+        """Initialize the instance.
+
+        intent_parser - Used to turn intents into commands. If this is None,
+            intents with any names are accepted.
+        timer - Used to trace when control commands are received.
+        client_factory - Creates the underlying Paho client when connecting.
+            If this is None, a regular client is used.
+        """
         self.__logger = logging.getLogger("sandman.mqtt_client")
-        self.__pending_commands = collections.deque[
-            commands.StatusCommand
-            | commands.ControlCommand
-            | commands.RoutineCommand
-        ]()
-        self.__pending_notifications = collections.deque[str]()
+        self.__timer = timer if timer is not None else time_util.Timer()
+        self.__next_trace_id = 1
+        self.__intent_parser = (
+            intent_parser
+            if intent_parser is not None
+            else commands.IntentParser()
+        )
+        self.__client_factory = client_factory
+        # Created when connecting.
+        self.__client: paho.mqtt.client.Client | None = None
+        self.__command_queue = command_queue.CommandQueue(
+            _MAX_PENDING_COMMANDS
+        )
+        self.__pending_notifications = collections.deque[str](
+            maxlen=_MAX_PENDING_NOTIFICATIONS
+        )
+        self.__command_event = threading.Event()
+        self.__ready_event = threading.Event()
+        # Only used when the client is driven by an asyncio event loop.
+        self.__event_loop: asyncio.AbstractEventLoop | None = None
+        self.__async_command_event: asyncio.Event | None = None
+        self.__async_ready_event: asyncio.Event | None = None
+        self.__misc_task: asyncio.Task[None] | None = None
+        self.__connection_task: asyncio.Task[None] | None = None
+        self.__async_socket_closed: asyncio.Event | None = None
+        self.__payload_cache = PayloadCache(_PAYLOAD_CACHE_SIZE)
+        self.__backoff = ReconnectBackoff(
+            _MIN_RECONNECT_DELAY_SEC, _MAX_RECONNECT_DELAY_SEC
+        )
+        # Written by the network thread, so reads may briefly be out of date.
         self.__is_connected: bool = False
-        pass
+        self.__is_stopping: bool = False
+        self.__num_connections = 0
+        self.__num_notifications_published = 0
+
+    @property
+    def intent_parser(self) -> commands.IntentParser:
+        """Get what turns intents into commands."""
+        return self.__intent_parser
+
+    @property
+    def is_connected(self) -> bool:
+        """Get whether the client is currently connected to the broker."""
+        return self.__is_connected
+
+    @property
+    def num_reconnects(self) -> int:
+        """Get the number of times the connection was established again."""
+        return max(self.__num_connections - 1, 0)
+
+    @property
+    def num_notifications_published(self) -> int:
+        """Get the number of sessions published to speak notifications."""
+        return self.__num_notifications_published
+
+    @property
+    def num_pending_notifications(self) -> int:
+        """Get the number of notifications waiting to be published."""
+        return len(self.__pending_notifications)
 
     def connect(self) -> bool:
-        """Connect to the broker."""
-        self.__client = paho.mqtt.client.Client()
+        """Start connecting to the broker on a background thread.
+
+        This doesn't wait for the connection. If the broker can't be reached,
+        or the connection is lost later, the background thread keeps trying
+        to connect with increasing delays until stop is called.
+
+        Returns True if the background thread was started.
+        """
+        client = self.__create_client()
+        client.on_connect_fail = self.__handle_connect_fail
+
+        host, port = self.__get_host_and_port()
+        self.__logger.info("Connecting to MQTT host %s:%d...", host, port)
+        client.connect_async(host, port)
+
+        # Connect and process messages in another thread.
+        start_result = client.loop_start()
+
+        if start_result != paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS:
+            return False
+
+        return True
+
+    async def connect_async(self) -> None:
+        """Start connecting to the broker with the event loop.
+
+        Use this instead of connect when running under asyncio. The socket is
+        serviced by the running event loop rather than by a background
+        thread, so messages are handled on the event loop's thread. Like
+        connect, this doesn't wait for the connection and keeps trying to
+        connect until stop_async is called.
+        """
+        self.__event_loop = asyncio.get_running_loop()
+        self.__async_command_event = asyncio.Event()
+        self.__async_ready_event = asyncio.Event()
+        self.__async_socket_closed = asyncio.Event()
+        self.__async_socket_closed.set()
+        client = self.__create_client()
+
+        client.on_socket_open = self.__handle_socket_open
+        client.on_socket_close = self.__handle_socket_close
+        client.on_socket_register_write = self.__handle_socket_register_write
+        client.on_socket_unregister_write = (
+            self.__handle_socket_unregister_write
+        )
+
+        self.__connection_task = self.__event_loop.create_task(
+            self.__run_connection_loop(client)
+        )
+
+    def __create_client(self) -> "paho.mqtt.client.Client":
+        """Create the underlying client."""
+        if self.__client_factory is None:
+            client = paho.mqtt.client.Client()
 
-        self.__client.on_connect = self.__handle_connect
+        else:
+            client = self.__client_factory()
 
+        client.on_connect = self.__handle_connect
+        client.on_disconnect = self.__handle_disconnect
+        self.__client = client
+        return client
+
+    def __get_host_and_port(self) -> tuple[str, int]:
+        """Get where the broker is."""
         # In the case of running inside of a Docker container, this environment
         # variable will be set to the name of the Rhasspy container.
         host = os.environ.get("RHASSPY_HOSTNAME", "localhost")
         port = 12183
 
-        # Keep attempting to connect a certain number of times before giving
-        # up.
-        num_attempts = 150
+        return host, port
+
+    def __attempt_connect(
+        self, client: "paho.mqtt.client.Client", attempt_index: int
+    ) -> bool:
+        """Make a single attempt to connect to the broker.
+
+        This blocks while the broker's address is resolved and the connection
+        is opened. Returns True if the connection was initiated.
+        """
+        host, port = self.__get_host_and_port()
+
+        self.__logger.info(
+            "Attempting to connect to MQTT host %s:%d (attempt %d)...",
+            host,
+            port,
+            attempt_index + 1,
+        )
+
+        try:
+            connect_result = client.connect(host, port)
 
-        for attempt_index in range(num_attempts):
+        except Exception as exception:
             self.__logger.info(
-                "Attempting to connect to MQTT host %s:%d (attempt %d)...",
-                host,
-                port,
+                "Connection attempt %d raised %s exception: %s",
                 attempt_index + 1,
+                type(exception),
+                exception,
             )
+            return False
+
+        if connect_result != paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS:
+            self.__logger.info(
+                "Connection attempt %d to MQTT host failed.",
+                attempt_index + 1,
+            )
+            return False
 
+        self.__logger.info("Initiated connection to MQTT host.")
+        return True
+
+    async def __run_connection_loop(
+        self, client: "paho.mqtt.client.Client"
+    ) -> None:
+        """Connect to the broker and reconnect whenever the connection ends."""
+        if self.__async_socket_closed is None:
+            return
+
+        while True:
+            # Connecting blocks, so it's done on another thread. The socket
+            # callbacks it makes are passed back to the event loop in order,
+            # so they have been handled by the time this resumes.
+            is_connecting = await asyncio.to_thread(
+                self.__attempt_connect, client, self.__backoff.num_failures
+            )
+
+            if (is_connecting == True) and (
+                self.__async_socket_closed.is_set() == False
+            ):
+                await self.__async_socket_closed.wait()
+
+            delay_sec = self.__backoff.get_next_delay_sec()
+            self.__logger.info(
+                "Trying to connect to MQTT host again in %d seconds.",
+                delay_sec,
+            )
+            await asyncio.sleep(delay_sec)
+
+    def stop(self) -> None:
+        """Stop MQTT services."""
+        client = self.__client
+
+        if client is None:
+            return
+
+        self.__is_stopping = True
+        client.loop_stop()
+        client.disconnect()
+
+    async def stop_async(self) -> None:
+        """Stop MQTT services after connecting with connect_async."""
+        if (self.__event_loop is None) or (self.__async_socket_closed is None):
+            return
+
+        self.__is_stopping = True
+
+        if self.__connection_task is not None:
+            self.__connection_task.cancel()
+            self.__connection_task = None
+
+        if (self.__client is not None) and (
+            self.__async_socket_closed.is_set() == False
+        ):
+            self.__client.disconnect()
+
+            # Give the event loop a chance to send the disconnect.
             try:
-                connect_result = self.__client.connect(host, port)
-
-            except Exception as exception:
-                connect_failed = True
-                self.__logger.info(
-                    "Connection attempt %d raised %s exception: %s",
-                    attempt_index + 1,
-                    type(exception),
-                    exception,
-                )
+                await asyncio.wait_for(self.__async_socket_closed.wait(), 1.0)
 
-            else:
-                connect_failed = (
-                    connect_result
-                    != paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS
-                )
+            except TimeoutError:
+                self.__logger.warning("Timed out waiting to disconnect.")
 
-                if connect_failed == True:
-                    self.__logger.info(
-                        "Connection attempt %d to MQTT host failed.",
-                        attempt_index + 1,
-                    )
+        if self.__misc_task is not None:
+            self.__misc_task.cancel()
+            self.__misc_task = None
 
-            if connect_failed == False:
-                self.__logger.info("Initiated connection to MQTT host.")
-                return True
+    @property
+    def payload_cache(self) -> PayloadCache:
+        """Get the cache of encoded notification payloads."""
+        return self.__payload_cache
 
-            # Sleep for two seconds.
-            time.sleep(2)
+    @property
+    def pending_commands(self) -> command_queue.CommandQueue:
+        """Get the queue of commands waiting to be processed."""
+        return self.__command_queue
 
-        self.__logger.warning(
-            "Failed to connect to MQTT host after %d attempts.", num_attempts
-        )
-        return False
+    def drain_commands(self) -> list[command_queue.Command]:
+        """Remove all of the pending commands, in the order they arrived."""
+        return self.__command_queue.drain()
 
-    def start(self) -> bool:
-        """Start MQTT services after connecting."""
-        if self.__client is None:
-            return False
+    def wait_for_command(self, timeout_sec: float) -> bool:
+        """Block until a command arrives or the timeout expires.
 
-        # Start processing in another thread.
-        start_result = self.__client.loop_start()
+        Returns True if a command may be pending, False if the timeout expired.
+        """
+        has_command = self.__command_event.wait(timeout_sec)
 
-        if start_result != paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS:
-            return False
+        # Clear before the caller pops commands so that a command arriving
+        # while they are being popped will wake the next wait.
+        self.__command_event.clear()
 
-        return True
+        return has_command
 
-    def stop(self) -> None:
-        """Stop MQTT services."""
-        if self.__client is None:
-            return
+    async def wait_for_command_async(self, timeout_sec: float) -> bool:
+        """Wait until a command arrives or the timeout expires.
 
-        self.__client.loop_stop()
-        self.__client.disconnect()
+        Returns True if a command may be pending, False if the timeout expired.
+        """
+        if self.__async_command_event is None:
+            self.__async_command_event = asyncio.Event()
 
-    def pop_command(
-        self,
-    ) -> (
-        commands.StatusCommand
-        | commands.ControlCommand
-        | commands.RoutineCommand
-        | None
-    ):
-        """Pop the next pending command off the queue, if there is one.
-
-        Returns the command or None if the queue is empty.
+        try:
+            await asyncio.wait_for(
+                self.__async_command_event.wait(), timeout_sec
+            )
+
+        except TimeoutError:
+            has_command = False
+
+        else:
+            has_command = True
+
+        self.__async_command_event.clear()
+
+        return has_command
+
+    def wait_until_ready(self, timeout_sec: float) -> bool:
+        """Block until the dialogue manager is ready or the timeout expires.
+
+        Returns True if the dialogue manager is ready, False if the timeout
+        expired.
         """
+        return self.__ready_event.wait(timeout_sec)
+
+    async def wait_until_ready_async(self, timeout_sec: float) -> bool:
+        """Wait until the dialogue manager is ready or the timeout expires.
+
+        Returns True if the dialogue manager is ready, False if the timeout
+        expired.
+        """
+        if self.__async_ready_event is None:
+            self.__async_ready_event = asyncio.Event()
+
+            if self.__ready_event.is_set() == True:
+                self.__async_ready_event.set()
+
         try:
-            command = self.__pending_commands.popleft()
-        except IndexError:
-            return None
+            await asyncio.wait_for(
+                self.__async_ready_event.wait(), timeout_sec
+            )
 
-        return command
+        except TimeoutError:
+            return False
+
+        return True
 
     def play_notification(self, notification: str) -> None:
         """Play the provided notification using the dialogue manager."""
         self.__pending_notifications.append(notification)
 
+    def publish_stats(self, stats_json: dict[str, typing.Any]) -> bool:
+        """Publish statistics about Sandman, if connected.
+
+        Returns whether the statistics were published.
+        """
+        if (self.__is_connected == False) or (self.__client is None):
+            return False
+
+        self.__client.publish(_STATS_TOPIC, json.dumps(stats_json))
+        return True
+
     def process(self) -> None:
         """Process things like pending messages, etc."""
         if self.__is_connected == False:
             return
 
-        # Publish all of the pending notifications.
-        while True:
-            try:
-                notification: str = self.__pending_notifications.popleft()
-            except IndexError:
-                break
+        if len(self.__pending_notifications) == 0:
+            return
 
-            self.__publish_notification(notification)
+        # Speak all of the pending notifications in a single session.
+        pending_notifications = list(self.__pending_notifications)
+        self.__pending_notifications.clear()
+
+        text = notifications.merge(pending_notifications)
+
+        if text != "":
+            self.__publish_notification(text)
 
     def __handle_connect(
         self,
-        client: paho.mqtt.client.Client,
+        client: "paho.mqtt.client.Client",
         userdata: None,
         flags: dict[str, typing.Any],
         reason_code: int,
@@ -171,26 +564,83 @@ class MQTTClient:
 
         self.__logger.info("Finished connecting to MQTT host.")
         self.__is_connected = True
+        self.__num_connections += 1
+        self.__backoff.reset()
+
+        # Wake the main loop so it can publish anything that was queued while
+        # we were connecting.
+        self.__signal_command()
 
         # Register callbacks for the topics.
-        self.__client.message_callback_add(
+        client.message_callback_add(
             "hermes/intent/#", self.__handle_intent_message
         )
 
+        topics = ["hermes/intent/#"]
+
+        # Until the dialogue manager is heard from, listen for it as well.
+        if self.__ready_event.is_set() == False:
+            for topic in _READINESS_TOPICS:
+                client.message_callback_add(
+                    topic, self.__handle_readiness_message
+                )
+
+            topics += _READINESS_TOPICS
+
         # Subscribe all of the topics in one go.
         qos = 0
-        subscribe_result, message_id = self.__client.subscribe(
-            [("hermes/intent/#", qos)]
+        subscribe_result, message_id = client.subscribe(
+            [(topic, qos) for topic in topics]
         )
 
         if subscribe_result != paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS:
             self.__logger.error("Failed to subscribe to topics.")
 
+    def __handle_connect_fail(
+        self, client: "paho.mqtt.client.Client", userdata: None
+    ) -> None:
+        """Handle failing to connect on the background thread."""
+        self.__set_reconnect_delay(client)
+
+    def __handle_disconnect(
+        self,
+        client: "paho.mqtt.client.Client",
+        userdata: None,
+        reason_code: int,
+    ) -> None:
+        """Handle the connection to the MQTT host ending."""
+        was_connected = self.__is_connected
+        self.__is_connected = False
+
+        if self.__is_stopping == True:
+            return
+
+        if was_connected == True:
+            self.__logger.warning(
+                "Lost connection to MQTT host with reason code %d.",
+                reason_code,
+            )
+
+        # The connection loop handles reconnecting when driven by asyncio.
+        if self.__event_loop is None:
+            self.__set_reconnect_delay(client)
+
+    def __set_reconnect_delay(self, client: "paho.mqtt.client.Client") -> None:
+        """Set how long the background thread waits before reconnecting."""
+        delay_sec = self.__backoff.get_next_delay_sec()
+        self.__logger.info(
+            "Trying to connect to MQTT host again in %d seconds.", delay_sec
+        )
+
+        # Paho doubles the delay itself, but without any jitter, so the delay
+        # is set to exactly the one picked for every attempt.
+        client.reconnect_delay_set(delay_sec, delay_sec)
+
     def __handle_intent_message(
         self,
-        client: paho.mqtt.client.Client,
+        client: "paho.mqtt.client.Client",
         userdata: None,
-        message: paho.mqtt.client.MQTTMessage,
+        message: "paho.mqtt.client.MQTTMessage",
     ) -> None:
         """Handle intent messages."""
         payload = message.payload.decode("utf8")
@@ -213,17 +663,169 @@ class MQTTClient:
             )
             return
 
-        command = commands.parse_from_intent(payload_json)
+        command = self.__intent_parser.parse(payload_json)
+
+        if isinstance(command, commands.ControlCommand):
+            command.trace = commands.CommandTrace(
+                self.__next_trace_id, self.__timer.get_current_time()
+            )
+            self.__next_trace_id += 1
+
+            self.__logger.debug(
+                "Tracing command from topic '%s' as %d.",
+                message.topic,
+                command.trace.trace_id,
+            )
 
         if command is not None:
-            self.__pending_commands.append(command)
+            self.__command_queue.push(command)
+            self.__signal_command()
+
+    def __handle_readiness_message(
+        self,
+        client: "paho.mqtt.client.Client",
+        userdata: None,
+        message: "paho.mqtt.client.MQTTMessage",
+    ) -> None:
+        """Handle the first message from the dialogue manager."""
+        if self.__ready_event.is_set() == True:
+            return
+
+        self.__logger.info(
+            "Heard from the dialogue manager on topic '%s'.", message.topic
+        )
+        self.__ready_event.set()
+
+        # When driven by asyncio, this is called on the event loop's thread.
+        if self.__async_ready_event is not None:
+            self.__async_ready_event.set()
+
+        # There's no need to keep receiving these messages.
+        for topic in _READINESS_TOPICS:
+            client.message_callback_remove(topic)
+
+        client.unsubscribe(_READINESS_TOPICS)
+
+    def __signal_command(self) -> None:
+        """Wake anything waiting for a command."""
+        self.__command_event.set()
+
+        # When driven by asyncio, this is called on the event loop's thread.
+        if self.__async_command_event is not None:
+            self.__async_command_event.set()
+
+    def __is_on_event_loop(self) -> bool:
+        """Check whether this is running on the event loop's thread.
+
+        The socket callbacks are made from another thread while connecting.
+        """
+        try:
+            return asyncio.get_running_loop() is self.__event_loop
+
+        except RuntimeError:
+            return False
+
+    def __handle_socket_open(
+        self,
+        client: "paho.mqtt.client.Client",
+        userdata: None,
+        sock: _Socket,
+    ) -> None:
+        """Start servicing a newly opened socket with the event loop."""
+        if (self.__event_loop is None) or (sock is None):
+            return
+
+        if self.__is_on_event_loop() == False:
+            self.__event_loop.call_soon_threadsafe(
+                self.__handle_socket_open, client, userdata, sock
+            )
+            return
+
+        if self.__async_socket_closed is not None:
+            self.__async_socket_closed.clear()
+
+        self.__event_loop.add_reader(sock, client.loop_read)
+        self.__misc_task = self.__event_loop.create_task(
+            self.__run_misc_loop(client)
+        )
+
+    def __handle_socket_close(
+        self,
+        client: "paho.mqtt.client.Client",
+        userdata: None,
+        sock: _Socket,
+    ) -> None:
+        """Stop servicing a socket that has closed."""
+        if (self.__event_loop is None) or (sock is None):
+            return
+
+        if self.__is_on_event_loop() == False:
+            self.__event_loop.call_soon_threadsafe(
+                self.__handle_socket_close, client, userdata, sock
+            )
+            return
+
+        self.__event_loop.remove_reader(sock)
+
+        if self.__misc_task is not None:
+            self.__misc_task.cancel()
+            self.__misc_task = None
+
+        if self.__async_socket_closed is not None:
+            self.__async_socket_closed.set()
+
+    def __handle_socket_register_write(
+        self,
+        client: "paho.mqtt.client.Client",
+        userdata: None,
+        sock: _Socket,
+    ) -> None:
+        """Let the event loop know there is data to write to the socket."""
+        if (self.__event_loop is None) or (sock is None):
+            return
+
+        if self.__is_on_event_loop() == False:
+            self.__event_loop.call_soon_threadsafe(
+                self.__handle_socket_register_write, client, userdata, sock
+            )
+            return
+
+        self.__event_loop.add_writer(sock, client.loop_write)
+
+    def __handle_socket_unregister_write(
+        self,
+        client: "paho.mqtt.client.Client",
+        userdata: None,
+        sock: _Socket,
+    ) -> None:
+        """Let the event loop know there is no more data to write."""
+        if (self.__event_loop is None) or (sock is None):
+            return
+
+        if self.__is_on_event_loop() == False:
+            self.__event_loop.call_soon_threadsafe(
+                self.__handle_socket_unregister_write, client, userdata, sock
+            )
+            return
+
+        self.__event_loop.remove_writer(sock)
+
+    async def __run_misc_loop(self, client: "paho.mqtt.client.Client") -> None:
+        """Periodically handle things like keep alive pings."""
+        while (
+            client.loop_misc()
+            == paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS
+        ):
+            await asyncio.sleep(1)
 
     def __publish_notification(self, text: str) -> None:
         """Publish the provided notification to the dialogue manager."""
-        payload_json = {
-            "init": {"type": "notification", "text": text},
-            "siteId": "default",
-        }
-        payload = json.dumps(payload_json)
+        if self.__client is None:
+            return
+
+        payload = self.__payload_cache.get_start_session_payload(
+            text, _SITE_ID
+        )
 
         self.__client.publish("hermes/dialogueManager/startSession", payload)
+        self.__num_notifications_published += 1
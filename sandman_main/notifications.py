@@ -0,0 +1,69 @@
+"""Combines notifications so that they can be spoken in one session.
+
+Each session with the dialogue manager costs an MQTT round trip and a TTS
+request, so notifications produced together are merged into a single session.
+Repeated phrases are only spoken once, and a control's movement phrase is
+dropped when a later one in the same batch makes it out of date.
+"""
+
+import re
+
+# The phrases the controls use when they start or stop moving. Only the last
+# of these for each control matters.
+_MOVEMENT_PATTERNS = [
+    re.compile(r"(?:Raising|Lowering) the (?P<name>.+)\."),
+    re.compile(r"(?P<name>.+) stopped\."),
+]
+
+
+def coalesce(notifications: list[str]) -> list[str]:
+    """Remove repeated and out of date notifications.
+
+    Returns the remaining notifications, in the order they were produced.
+    """
+    # Find the last movement notification for each control.
+    movement_names: list[str | None] = []
+    last_movement_indices: dict[str, int] = {}
+
+    for index, notification in enumerate(notifications):
+        name = _get_movement_name(notification)
+        movement_names.append(name)
+
+        if name is not None:
+            last_movement_indices[name] = index
+
+    coalesced: list[str] = []
+    seen: set[str] = set()
+
+    for index, notification in enumerate(notifications):
+        if notification in seen:
+            continue
+
+        name = movement_names[index]
+
+        if (name is not None) and (last_movement_indices[name] != index):
+            continue
+
+        seen.add(notification)
+        coalesced.append(notification)
+
+    return coalesced
+
+
+def merge(notifications: list[str]) -> str:
+    """Coalesce notifications and combine them into one to be spoken.
+
+    Returns an empty string if there is nothing to speak.
+    """
+    return " ".join(coalesce(notifications))
+
+
+def _get_movement_name(notification: str) -> str | None:
+    """Get the control a movement notification is about, if it is one."""
+    for pattern in _MOVEMENT_PATTERNS:
+        match = pattern.fullmatch(notification)
+
+        if match is not None:
+            return match.group("name")
+
+    return None
@@ -0,0 +1,227 @@
+"""Measures how long the main loop spends on each phase of a tick.
+
+Durations are counted in fixed buckets, so recording one costs a binary search
+and an increment no matter how many have been recorded.
+"""
+
+import bisect
+import logging
+import typing
+
+from . import commands, time_util
+
+# The upper bound (in nanoseconds) of each bucket, doubling from a microsecond
+# to about eight seconds. Anything longer goes in one last bucket.
+_BUCKET_BOUNDS_NS = [1000 << index for index in range(24)]
+
+
+class Histogram:
+    """Counts durations in fixed buckets."""
+
+    def __init__(self) -> None:
+        """Initialize the instance."""
+        self.__counts = [0] * (len(_BUCKET_BOUNDS_NS) + 1)
+        self.__count = 0
+        self.__total_ns = 0
+        self.__max_ns = 0
+
+    @property
+    def count(self) -> int:
+        """Get the number of recorded durations."""
+        return self.__count
+
+    @property
+    def max_ns(self) -> int:
+        """Get the longest recorded duration."""
+        return self.__max_ns
+
+    @property
+    def total_ns(self) -> int:
+        """Get the sum of the recorded durations."""
+        return self.__total_ns
+
+    def record(self, duration_ns: int) -> None:
+        """Record a duration."""
+        self.__counts[bisect.bisect_left(_BUCKET_BOUNDS_NS, duration_ns)] += 1
+        self.__count += 1
+        self.__total_ns += duration_ns
+        self.__max_ns = max(self.__max_ns, duration_ns)
+
+    def get_mean_ns(self) -> int:
+        """Get the mean of the recorded durations."""
+        if self.__count == 0:
+            return 0
+
+        return self.__total_ns // self.__count
+
+    def get_percentile_ns(self, percentile: float) -> int:
+        """Estimate a percentile (0 to 100) of the recorded durations.
+
+        This is the upper bound of the bucket the percentile falls in, but
+        never more than the longest duration.
+        """
+        if self.__count == 0:
+            return 0
+
+        threshold = self.__count * percentile / 100
+        cumulative_count = 0
+
+        for index, count in enumerate(self.__counts):
+            cumulative_count += count
+
+            if (cumulative_count >= threshold) and (
+                index < len(_BUCKET_BOUNDS_NS)
+            ):
+                return min(_BUCKET_BOUNDS_NS[index], self.__max_ns)
+
+        return self.__max_ns
+
+    def get_bucket_counts(self) -> list[tuple[int | None, int]]:
+        """Get the upper bound (in nanoseconds) and count of each bucket.
+
+        The last bucket has no upper bound.
+        """
+        bounds: list[int | None] = [*_BUCKET_BOUNDS_NS, None]
+        return list(zip(bounds, list(self.__counts), strict=True))
+
+    def get_as_json(self) -> dict[str, typing.Any]:
+        """Get a summary of the durations (in microseconds) as JSON."""
+        return {
+            "count": self.__count,
+            "meanUs": self.get_mean_ns() // 1000,
+            "p50Us": self.get_percentile_ns(50) // 1000,
+            "p99Us": self.get_percentile_ns(99) // 1000,
+            "maxUs": self.__max_ns // 1000,
+        }
+
+
+class TickProfiler:
+    """Records how long each phase of the main loop takes.
+
+    Call begin_tick at the start of a tick, end_phase after each phase, and
+    end_tick once the tick is done.
+    """
+
+    def __init__(self, timer: time_util.Timer) -> None:
+        """Initialize the instance."""
+        self.__timer = timer
+        self.__phases: dict[str, Histogram] = {}
+        self.__ticks = Histogram()
+        self.__jitter = Histogram()
+        self.__trace_stages: dict[str, Histogram] = {}
+        self.__tick_start_time = 0
+        self.__phase_start_time = 0
+
+    @property
+    def num_ticks(self) -> int:
+        """Get the number of ticks recorded since the last reset."""
+        return self.__ticks.count
+
+    def get_phase_names(self) -> list[str]:
+        """Get the names of the phases, in the order they were first seen."""
+        return list(self.__phases)
+
+    def get_phase(self, name: str) -> Histogram | None:
+        """Get the durations of a phase, if it has been recorded."""
+        return self.__phases.get(name)
+
+    def begin_tick(self, due_time: int | None = None) -> None:
+        """Start measuring a tick.
+
+        due_time - When the tick was meant to start, if it was waiting for a
+            deadline. How late it started is recorded as jitter.
+        """
+        self.__tick_start_time = self.__timer.get_current_time()
+        self.__phase_start_time = self.__tick_start_time
+
+        # Ticks that started early were woken by something else.
+        if (due_time is not None) and (self.__tick_start_time >= due_time):
+            self.__jitter.record(self.__tick_start_time - due_time)
+
+    def end_phase(self, name: str) -> None:
+        """Record the time since the previous phase ended."""
+        current_time = self.__timer.get_current_time()
+        histogram = self.__phases.get(name)
+
+        if histogram is None:
+            histogram = Histogram()
+            self.__phases[name] = histogram
+
+        histogram.record(current_time - self.__phase_start_time)
+        self.__phase_start_time = current_time
+
+    def end_tick(self) -> int:
+        """Record the time since the tick began.
+
+        Returns how long the tick took.
+        """
+        tick_duration_ns = (
+            self.__timer.get_current_time() - self.__tick_start_time
+        )
+        self.__ticks.record(tick_duration_ns)
+        return tick_duration_ns
+
+    def record_trace(self, trace: commands.CommandTrace) -> None:
+        """Record how long each stage of a command that reached GPIO took."""
+        stage_durations_ns = trace.get_stage_durations_ns()
+
+        if stage_durations_ns is None:
+            return
+
+        for stage, duration_ns in stage_durations_ns.items():
+            histogram = self.__trace_stages.get(stage)
+
+            if histogram is None:
+                histogram = Histogram()
+                self.__trace_stages[stage] = histogram
+
+            histogram.record(duration_ns)
+
+    def get_trace_stage(self, name: str) -> Histogram | None:
+        """Get the durations of a stage of traced commands, if any."""
+        return self.__trace_stages.get(name)
+
+    def get_as_json(self) -> dict[str, typing.Any]:
+        """Get a summary of everything recorded as JSON."""
+        return {
+            "tick": self.__ticks.get_as_json(),
+            "phases": {
+                name: histogram.get_as_json()
+                for name, histogram in self.__phases.items()
+            },
+            "jitter": self.__jitter.get_as_json(),
+            "traces": {
+                stage: histogram.get_as_json()
+                for stage, histogram in self.__trace_stages.items()
+            },
+        }
+
+    def log_summary(self, logger: logging.Logger) -> None:
+        """Log a summary of everything recorded."""
+        receive_to_gpio = self.__trace_stages.get("receiveToGpio", Histogram())
+        logger.info(
+            "%d ticks, mean %d us, p99 %d us, max %d us. Jitter p99 %d us. "
+            + "Receive to GPIO p99 %d us.",
+            self.__ticks.count,
+            self.__ticks.get_mean_ns() // 1000,
+            self.__ticks.get_percentile_ns(99) // 1000,
+            self.__ticks.max_ns // 1000,
+            self.__jitter.get_percentile_ns(99) // 1000,
+            receive_to_gpio.get_percentile_ns(99) // 1000,
+        )
+
+        for name, histogram in self.__phases.items():
+            logger.debug(
+                "Phase '%s': mean %d us, p99 %d us, max %d us.",
+                name,
+                histogram.get_mean_ns() // 1000,
+                histogram.get_percentile_ns(99) // 1000,
+                histogram.max_ns // 1000,
+            )
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        self.__phases.clear()
+        self.__ticks = Histogram()
+        self.__jitter = Histogram()
+        self.__trace_stages.clear()
@@ -9,6 +9,7 @@ import json
 import logging
 import pathlib
 import typing
+import zlib
 
 import whenever
 
@@ -16,34 +17,187 @@ from . import time_util
 
 _logger = logging.getLogger("sandman.report")
 
+# When archiving closed reports automatically, only one report is archived at
+# a time, at most this often, so a backlog doesn't hold up the main loop.
+_ARCHIVE_INTERVAL_MS = 1000
 
-type _ReportEventInfo = typing.Mapping[
+
+type ReportEventInfo = typing.Mapping[
     str, typing.Mapping[str, int | str] | int | str
 ]
 
 
 @dataclasses.dataclass
-class _ReportEvent:
-    """An event for a report file."""
+class ReportEvent:
+    """An event in a report file."""
 
     when: whenever.ZonedDateTime
-    info: _ReportEventInfo
+    info: ReportEventInfo
+
+
+@dataclasses.dataclass
+class _ReportWindow:
+    """The span of time covered by a single report."""
+
+    name: str
+    start: whenever.ZonedDateTime
+    end: whenever.ZonedDateTime
+
+    def contains(self, time: whenever.ZonedDateTime) -> bool:
+        """Return whether the time falls within the window."""
+        return (self.start <= time) and (time < self.end)
+
+
+class _ReportWriter:
+    """Keeps a report file open for appending between writes."""
+
+    def __init__(self) -> None:
+        """Initialize the instance."""
+        self.__file_name = ""
+        self.__file: typing.TextIO | None = None
+        self.__unflushed_size = 0
+
+    @property
+    def file_name(self) -> str:
+        """Get the name of the open file (empty if there isn't one)."""
+        return self.__file_name
+
+    @property
+    def unflushed_size(self) -> int:
+        """Get the amount of text written since the last flush."""
+        return self.__unflushed_size
+
+    def open(self, file_name: str) -> bool:
+        """Close any open file and open a file for appending.
+
+        Returns whether the file was opened.
+        """
+        self.close()
+
+        try:
+            self.__file = open(file_name, "a", encoding="utf-8")
+
+        except OSError:
+            _logger.error("Failed to open report file '%s'.", file_name)
+            return False
+
+        self.__file_name = file_name
+        return True
+
+    def write(self, text: str) -> bool:
+        """Write text to the open file.
+
+        Returns whether the text was written.
+        """
+        if self.__file is None:
+            return False
+
+        try:
+            self.__file.write(text)
+
+        except OSError:
+            _logger.error(
+                "Failed to write to report file '%s'.", self.__file_name
+            )
+            self.close()
+            return False
+
+        self.__unflushed_size += len(text)
+        return True
+
+    def flush(self) -> bool:
+        """Flush anything written to the open file.
+
+        Returns whether the flush succeeded.
+        """
+        if self.__file is None:
+            return True
+
+        try:
+            self.__file.flush()
+
+        except OSError:
+            _logger.error(
+                "Failed to flush report file '%s'.", self.__file_name
+            )
+            self.close()
+            return False
+
+        self.__unflushed_size = 0
+        return True
+
+    def close(self) -> None:
+        """Flush and close the open file, if there is one."""
+        if self.__file is None:
+            return
+
+        try:
+            self.__file.close()
+
+        except OSError:
+            _logger.error(
+                "Failed to close report file '%s'.", self.__file_name
+            )
+
+        self.__file = None
+        self.__file_name = ""
+        self.__unflushed_size = 0
 
 
 class ReportManager:
     """Manages recording events into per day report files."""
 
-    REPORT_VERSION = 4
+    REPORT_VERSION = 5
 
     def __init__(
-        self, time_source: time_util.TimeSource, base_dir: str
+        self,
+        time_source: time_util.TimeSource,
+        base_dir: str,
+        scheduler: time_util.Scheduler | None = None,
+        flush_interval_ms: int = 0,
+        flush_size: int = 0,
+        archive_closed: bool = False,
     ) -> None:
-        """Initialize the instance."""
+        """Initialize the instance.
+
+        scheduler - If provided, the start of the next report and any pending
+            flush are registered with it so that processing happens when they
+            are due.
+        flush_interval_ms - Written events are flushed to the report file at
+            least this often. Zero means flush every time events are written.
+        flush_size - Written events are flushed once at least this much text
+            is waiting to be flushed, even if the interval hasn't passed.
+        archive_closed - If this is True, closed reports are archived whenever
+            the current report changes, including when processing starts.
+            They are archived one at a time, and reports that fail to archive
+            are left alone until the manager is recreated.
+        """
         self.__time_source = time_source
         self.__reports_dir = base_dir + "reports/"
+        self.__scheduler = scheduler
+        self.__next_report_handle: int | None = None
+        self.__flush_interval_ms = flush_interval_ms
+        self.__flush_size = flush_size
+        self.__flush_handle: int | None = None
+        self.__last_flush_time: whenever.ZonedDateTime | None = None
+        self.__writer = _ReportWriter()
+        # The report that the current time falls in, once it is known to exist.
+        self.__current_window: _ReportWindow | None = None
         # Eventually this should be configurable.
         self.__report_start_hour = 17
-        self.__pending_events = collections.deque[_ReportEvent]()
+        self.__pending_events = collections.deque[ReportEvent]()
+        self.__num_events_written = 0
+        self.__archive_closed = archive_closed
+        # The report that was current when reports were last archived.
+        self.__archived_report_name: str | None = None
+        self.__is_archive_pending = False
+        self.__archive_handle: int | None = None
+        self.__unarchivable_names: set[str] = set()
+
+    @property
+    def num_events_written(self) -> int:
+        """Get the number of events written to report files."""
+        return self.__num_events_written
 
     def process(self) -> None:
         """Process reports."""
@@ -57,15 +211,79 @@ class ReportManager:
             return
 
         # Even if there are no events, we want to make sure that we are
-        # creating empty report files.
-        self.__maybe_create_report_file(curr_time)
+        # creating empty report files. The file system only needs to be
+        # checked when the current time leaves the known report.
+        if (self.__current_window is None) or (
+            self.__current_window.contains(curr_time) == False
+        ):
+            self.__maybe_create_report_file(curr_time)
+            self.__current_window = self.__get_window_from_time(curr_time)
 
-        event = self.__pop_event()
+            if (self.__archive_closed == True) and (
+                self.__archived_report_name != self.__current_window.name
+            ):
+                self.__archived_report_name = self.__current_window.name
+                self.__is_archive_pending = True
 
-        while event is not None:
-            self.__write_event(event)
+        if (self.__scheduler is not None) and (
+            self.__next_report_handle is None
+        ):
+            self.__next_report_handle = self.__scheduler.schedule_after_ms(
+                self.__get_time_until_next_report_ms(curr_time),
+                self.__handle_next_report_deadline,
+            )
 
-            event = self.__pop_event()
+        self.__write_pending_events()
+        self.__maybe_flush(curr_time)
+
+        if (self.__is_archive_pending == True) and (
+            self.__archive_handle is None
+        ):
+            self.__archive_next_closed_report(curr_time)
+
+    def close(self) -> None:
+        """Write any pending events and close the current report file."""
+        self.__write_pending_events()
+        self.__writer.close()
+
+        if (self.__scheduler is not None) and (
+            self.__flush_handle is not None
+        ):
+            self.__scheduler.cancel(self.__flush_handle)
+
+            if self.__archive_handle is not None:
+                self.__scheduler.cancel(self.__archive_handle)
+
+        self.__flush_handle = None
+        self.__archive_handle = None
+
+    def archive_closed_reports(self, compress: bool = True) -> int:
+        """Convert reports that can no longer get new events into archives.
+
+        Each closed report is replaced by a compact '.rpa' archive that can be
+        read with read_archived_report. The report that the current time falls
+        in is never archived.
+
+        Returns the number of reports that were archived.
+        """
+        try:
+            curr_time = self.__time_source.get_current_time()
+
+        except Exception:
+            _logger.warning("Cannot archive reports without a valid time.")
+            return 0
+
+        # Make sure every event has been written before converting files.
+        self.__write_pending_events()
+        self.__writer.close()
+
+        num_archived = 0
+
+        for report_path in self.__get_closed_report_paths(curr_time):
+            if _archive_report(report_path, compress) == True:
+                num_archived += 1
+
+        return num_archived
 
     def add_control_event(
         self, control: str, action: str, source: str
@@ -79,6 +297,18 @@ class ReportManager:
         }
         self.__add_event(info)
 
+    def add_trace_event(
+        self, control: str, trace_id: int, stage_durations_us: dict[str, int]
+    ) -> None:
+        """Add an event with how long a traced command took to reach GPIO."""
+        info: ReportEventInfo = {
+            "type": "trace",
+            "control": control,
+            "traceId": trace_id,
+            "stages": stage_durations_us,
+        }
+        self.__add_event(info)
+
     def add_routine_event(self, routine: str, action: str) -> None:
         """Add a routine event at the current time."""
         info = {"type": "routine", "routine": routine, "action": action}
@@ -103,14 +333,102 @@ class ReportManager:
         )
         return start_time
 
+    def __get_time_until_next_report_ms(
+        self, time: whenever.ZonedDateTime
+    ) -> int:
+        """Get the time from the given time until the next report starts."""
+        next_start_time = self.__get_start_time_from_time(time).add(days=1)
+        return int((next_start_time - time).in_milliseconds())
+
+    def __get_closed_report_paths(
+        self, time: whenever.ZonedDateTime
+    ) -> list[pathlib.Path]:
+        """Get the paths of the reports that are closed at the given time."""
+        current_name = self.__get_report_name_from_time(time)
+
+        try:
+            report_paths = sorted(
+                pathlib.Path(self.__reports_dir).glob("sandman*.rpt")
+            )
+
+        except OSError:
+            _logger.warning(
+                "Failed to list report directory '%s'.", self.__reports_dir
+            )
+            return []
+
+        return [
+            report_path
+            for report_path in report_paths
+            if report_path.stem < current_name
+        ]
+
+    def __archive_next_closed_report(
+        self, time: whenever.ZonedDateTime
+    ) -> None:
+        """Archive the oldest closed report that hasn't failed to archive."""
+        report_paths = [
+            report_path
+            for report_path in self.__get_closed_report_paths(time)
+            if report_path.stem not in self.__unarchivable_names
+        ]
+
+        if len(report_paths) == 0:
+            self.__is_archive_pending = False
+            return
+
+        report_path = report_paths[0]
+
+        # Events written before the report closed may still be buffered.
+        if pathlib.Path(self.__writer.file_name) == report_path:
+            self.__writer.close()
+
+        if _archive_report(report_path, compress=True) == False:
+            _logger.warning(
+                "Leaving report file '%s' unarchived.", str(report_path)
+            )
+            self.__unarchivable_names.add(report_path.stem)
+
+        if len(report_paths) == 1:
+            self.__is_archive_pending = False
+            return
+
+        if self.__scheduler is not None:
+            self.__archive_handle = self.__scheduler.schedule_after_ms(
+                _ARCHIVE_INTERVAL_MS, self.__handle_archive_deadline
+            )
+
+    def __handle_archive_deadline(self) -> None:
+        """Handle the scheduler reaching the time to archive another report."""
+        # The next call to process will archive the next report.
+        self.__archive_handle = None
+
+    def __handle_next_report_deadline(self) -> None:
+        """Handle the scheduler reaching the start of the next report."""
+        # The next call to process will create the report and schedule the
+        # following one.
+        self.__next_report_handle = None
+
     def __get_report_name_from_time(self, time: whenever.ZonedDateTime) -> str:
         """Get the report name based on given time."""
+        if (self.__current_window is not None) and (
+            self.__current_window.contains(time)
+        ):
+            return self.__current_window.name
+
+        return self.__get_window_from_time(time).name
+
+    def __get_window_from_time(
+        self, time: whenever.ZonedDateTime
+    ) -> _ReportWindow:
+        """Get the window of the report that the given time falls in."""
         start_time = self.__get_start_time_from_time(time)
 
-        return (
+        name = (
             f"sandman{start_time.year}-{start_time.month:02}-"
             + f"{start_time.day:02}"
         )
+        return _ReportWindow(name, start_time, start_time.add(days=1))
 
     def __maybe_create_report_file(self, time: whenever.ZonedDateTime) -> None:
         """Create the desired report if it doesn't exist."""
@@ -138,7 +456,7 @@ class ReportManager:
 
         _logger.info("Created report file '%s'.", str(report_file_name))
 
-    def __add_event(self, info: _ReportEventInfo) -> None:
+    def __add_event(self, info: ReportEventInfo) -> None:
         """Add an event with the given info at the current time."""
         try:
             curr_time = self.__time_source.get_current_time()
@@ -147,10 +465,10 @@ class ReportManager:
             _logger.warning("Cannot add events without a valid time.")
             return
 
-        event = _ReportEvent(curr_time, info)
+        event = ReportEvent(curr_time, info)
         self.__pending_events.append(event)
 
-    def __pop_event(self) -> _ReportEvent | None:
+    def __pop_event(self) -> ReportEvent | None:
         """Pop an event from the queue if there is one.
 
         Returns the event or None if the queue is empty.
@@ -163,30 +481,93 @@ class ReportManager:
 
         return event
 
-    def __write_event(self, event: _ReportEvent) -> None:
-        """Write the event to the appropriate file."""
-        self.__maybe_create_report_file(event.when)
+    def __write_pending_events(self) -> None:
+        """Write all of the pending events with one write per report file."""
+        if len(self.__pending_events) == 0:
+            return
 
-        report_name = self.__get_report_name_from_time(event.when)
-        report_file_name = self.__reports_dir + report_name + ".rpt"
+        # Group the lines by report, keeping the time of the first event for
+        # each report in case the report needs to be created.
+        report_lines: dict[str, tuple[whenever.ZonedDateTime, list[str]]] = {}
 
-        report_path = pathlib.Path(report_file_name)
+        event = self.__pop_event()
 
-        if report_path.exists() == False:
-            _logger.error(
-                "Failed to add event to '%s' - file doesn't exist.",
-                report_file_name,
+        while event is not None:
+            report_name = self.__get_report_name_from_time(event.when)
+
+            if report_name not in report_lines:
+                report_lines[report_name] = (event.when, [])
+
+            event_json = {
+                "when": event.when.format_common_iso(),
+                "info": event.info,
+            }
+            report_lines[report_name][1].append(json.dumps(event_json) + "\n")
+
+            event = self.__pop_event()
+
+        for report_name, (first_time, lines) in report_lines.items():
+            report_file_name = self.__reports_dir + report_name + ".rpt"
+
+            # Only switch files when the report changes.
+            if self.__writer.file_name != report_file_name:
+                self.__maybe_create_report_file(first_time)
+
+                if self.__writer.open(report_file_name) == False:
+                    _logger.error(
+                        "Failed to add %d events to '%s'.",
+                        len(lines),
+                        report_file_name,
+                    )
+                    self.__current_window = None
+                    continue
+
+            if self.__writer.write("".join(lines)) == False:
+                # Something happened to the file, so check it again next time.
+                self.__current_window = None
+                continue
+
+            self.__num_events_written += len(lines)
+
+    def __maybe_flush(self, time: whenever.ZonedDateTime) -> None:
+        """Flush written events if enough time passed or enough is waiting."""
+        if self.__writer.unflushed_size == 0:
+            return
+
+        should_flush = (self.__flush_interval_ms <= 0) or (
+            self.__writer.unflushed_size >= self.__flush_size
+        )
+
+        # Start timing from the first write if nothing has been flushed yet.
+        if self.__last_flush_time is None:
+            self.__last_flush_time = time
+
+        if should_flush == False:
+            elapsed_ms = (time - self.__last_flush_time).in_milliseconds()
+            should_flush = (elapsed_ms < 0) or (
+                elapsed_ms >= self.__flush_interval_ms
             )
+
+        if should_flush == False:
+            # Make sure we get processed when the flush is due.
+            if (self.__scheduler is not None) and (
+                self.__flush_handle is None
+            ):
+                self.__flush_handle = self.__scheduler.schedule_after_ms(
+                    self.__flush_interval_ms, self.__handle_flush_deadline
+                )
+
             return
 
-        event_json = {
-            "when": event.when.format_common_iso(),
-            "info": event.info,
-        }
-        event_line = json.dumps(event_json) + "\n"
+        if self.__writer.flush() == False:
+            self.__current_window = None
 
-        with open(report_file_name, "a", encoding="utf-8") as file:
-            file.write(event_line)
+        self.__last_flush_time = time
+
+    def __handle_flush_deadline(self) -> None:
+        """Handle the scheduler reaching the time to flush."""
+        # The next call to process will do the flush.
+        self.__flush_handle = None
 
 
 def bootstrap_reports(base_dir: str) -> None:
@@ -206,3 +587,796 @@ def bootstrap_reports(base_dir: str) -> None:
             "Failed to create report directory '%s'.", str(report_path)
         )
         return
+
+
+@dataclasses.dataclass
+class ReportQuery:
+    """Filters for finding events in report files.
+
+    Any filter that is None matches every event. The time range includes the
+    start time and excludes the end time.
+    """
+
+    event_type: str | None = None
+    control: str | None = None
+    routine: str | None = None
+    action: str | None = None
+    source: str | None = None
+    start: whenever.ZonedDateTime | None = None
+    end: whenever.ZonedDateTime | None = None
+
+    def matches_key(self, key: tuple[str, ...]) -> bool:
+        """Return whether the query matches an event's key."""
+        filters = (
+            self.event_type,
+            self.control,
+            self.routine,
+            self.action,
+            self.source,
+        )
+
+        for filter_value, key_value in zip(filters, key, strict=True):
+            if (filter_value is not None) and (filter_value != key_value):
+                return False
+
+        return True
+
+    def matches_time_ms(self, time_ms: int) -> bool:
+        """Return whether the query matches an event's time."""
+        if (self.start is not None) and (
+            time_ms < self.start.timestamp_millis()
+        ):
+            return False
+
+        if (self.end is not None) and (time_ms >= self.end.timestamp_millis()):
+            return False
+
+        return True
+
+    def covers_times_ms(self, first_ms: int, last_ms: int) -> bool:
+        """Return whether the query's time range covers the given span."""
+        return self.matches_time_ms(first_ms) and self.matches_time_ms(last_ms)
+
+    def overlaps_times_ms(self, first_ms: int, last_ms: int) -> bool:
+        """Return whether the query's time range overlaps the given span."""
+        if (self.start is not None) and (
+            last_ms < self.start.timestamp_millis()
+        ):
+            return False
+
+        if (self.end is not None) and (
+            first_ms >= self.end.timestamp_millis()
+        ):
+            return False
+
+        return True
+
+
+def _get_event_key(info: typing.Mapping[str, object]) -> tuple[str, ...]:
+    """Get the values of an event's info that queries can filter on."""
+    return tuple(
+        str(info.get(field, ""))
+        for field in ("type", "control", "routine", "action", "source")
+    )
+
+
+class _ReportIndex:
+    """A sidecar index of the events in a single report file or archive.
+
+    The index remembers how much of the report it has seen, so it only needs
+    to read lines that were appended since it was last updated. Archives never
+    change, so they are indexed once, and the offset of each event is its
+    position in the archive instead of a position in the file.
+    """
+
+    VERSION = 3
+
+    def __init__(self, report_file_name: str) -> None:
+        """Initialize the instance."""
+        report_path = pathlib.Path(report_file_name)
+        self.report_file_name = report_file_name
+        self.index_file_name = str(report_path.with_suffix(".idx"))
+        self.is_archive = report_path.suffix == ".rpa"
+        self.__clear()
+
+    def __clear(self) -> None:
+        """Forget everything that has been indexed."""
+        self.size = 0
+        self.offsets: list[int] = []
+        self.times_ms: list[int] = []
+        self.key_ids: list[int] = []
+        self.keys: list[tuple[str, ...]] = []
+        self.key_counts: list[int] = []
+        self.type_counts: dict[str, int] = {}
+        # The times of the earliest and latest events in the report.
+        self.first_time_ms = 0
+        self.last_time_ms = 0
+        self.__key_lookup: dict[tuple[str, ...], int] = {}
+
+    def load_and_update(self) -> bool:
+        """Load the saved index and index anything new in the report.
+
+        Returns whether the index could be brought up to date.
+        """
+        try:
+            report_size = pathlib.Path(self.report_file_name).stat().st_size
+
+        except OSError:
+            _logger.warning(
+                "Failed to read report file '%s' for indexing.",
+                self.report_file_name,
+            )
+            return False
+
+        self.__load()
+
+        # The report only ever grows, so if it shrank it was replaced. An
+        # archive that changed at all was replaced.
+        if (report_size < self.size) or (
+            (self.is_archive == True) and (report_size != self.size)
+        ):
+            self.__clear()
+
+        if report_size == self.size:
+            return True
+
+        if self.__index_report() == False:
+            return False
+
+        self.__save()
+        return True
+
+    def __load(self) -> None:
+        """Load the index from its file, if it exists and is valid."""
+        self.__clear()
+
+        try:
+            with open(self.index_file_name, encoding="utf-8") as file:
+                index_json = json.load(file)
+
+            if (index_json["version"] != self.VERSION) or (
+                index_json["isArchive"] != self.is_archive
+            ):
+                return
+
+            self.size = index_json["size"]
+            self.offsets = index_json["offsets"]
+            self.times_ms = index_json["times"]
+            self.key_ids = index_json["keyIds"]
+            self.keys = [tuple(key) for key in index_json["keys"]]
+            self.key_counts = index_json["keyCounts"]
+            self.type_counts = index_json["typeCounts"]
+            self.first_time_ms = index_json["firstTime"]
+            self.last_time_ms = index_json["lastTime"]
+
+        except (OSError, ValueError, KeyError, TypeError):
+            self.__clear()
+            return
+
+        self.__key_lookup = {
+            key: key_id for key_id, key in enumerate(self.keys)
+        }
+
+    def __save(self) -> None:
+        """Save the index to its file."""
+        index_json = {
+            "version": self.VERSION,
+            "isArchive": self.is_archive,
+            "size": self.size,
+            "offsets": self.offsets,
+            "times": self.times_ms,
+            "keyIds": self.key_ids,
+            "keys": self.keys,
+            "keyCounts": self.key_counts,
+            "typeCounts": self.type_counts,
+            "firstTime": self.first_time_ms,
+            "lastTime": self.last_time_ms,
+        }
+
+        try:
+            with open(self.index_file_name, "w", encoding="utf-8") as file:
+                json.dump(index_json, file)
+
+        except OSError:
+            _logger.warning(
+                "Failed to save report index '%s'.", self.index_file_name
+            )
+
+    def __index_report(self) -> bool:
+        """Index the lines of the report that haven't been indexed yet.
+
+        Returns whether the report could be read.
+        """
+        if self.is_archive == True:
+            return self.__index_archive()
+
+        try:
+            with open(self.report_file_name, "rb") as file:
+                file.seek(self.size)
+                offset = self.size
+
+                for line in file:
+                    # Leave partially written lines for next time.
+                    if line.endswith(b"\n") == False:
+                        break
+
+                    self.__index_line(offset, line)
+                    offset += len(line)
+
+        except OSError:
+            _logger.warning(
+                "Failed to read report file '%s' for indexing.",
+                self.report_file_name,
+            )
+            return False
+
+        self.size = offset
+        return True
+
+    def __index_archive(self) -> bool:
+        """Index every event in an archive.
+
+        Returns whether the archive could be read.
+        """
+        try:
+            size = pathlib.Path(self.report_file_name).stat().st_size
+
+        except OSError:
+            _logger.warning(
+                "Failed to read archived report '%s' for indexing.",
+                self.report_file_name,
+            )
+            return False
+
+        for position, event in enumerate(
+            read_archived_report(self.report_file_name)
+        ):
+            self.__index_event(
+                position, event.when.timestamp_millis(), event.info
+            )
+
+        self.size = size
+        return True
+
+    def __index_line(self, offset: int, line: bytes) -> None:
+        """Index a single line of a report."""
+        try:
+            line_json = json.loads(line)
+            when = whenever.ZonedDateTime.parse_common_iso(line_json["when"])
+            info = line_json["info"]
+
+        except (ValueError, KeyError, TypeError):
+            # The header and any malformed lines aren't events.
+            return
+
+        self.__index_event(offset, when.timestamp_millis(), info)
+
+    def __index_event(
+        self, offset: int, time_ms: int, info: typing.Mapping[str, object]
+    ) -> None:
+        """Index a single event."""
+        key = _get_event_key(info)
+        key_id = self.__key_lookup.get(key)
+
+        if key_id is None:
+            key_id = len(self.keys)
+            self.keys.append(key)
+            self.key_counts.append(0)
+            self.__key_lookup[key] = key_id
+
+        if (len(self.times_ms) == 0) or (time_ms < self.first_time_ms):
+            self.first_time_ms = time_ms
+
+        if (len(self.times_ms) == 0) or (time_ms > self.last_time_ms):
+            self.last_time_ms = time_ms
+
+        self.offsets.append(offset)
+        self.times_ms.append(time_ms)
+        self.key_ids.append(key_id)
+        self.key_counts[key_id] += 1
+        self.type_counts[key[0]] = self.type_counts.get(key[0], 0) + 1
+
+
+def _could_report_overlap_query(
+    report_path: pathlib.Path, query: ReportQuery
+) -> bool:
+    """Return whether a report's name allows it to have matching events.
+
+    A report named for a date starts on that date and lasts a day, so its
+    events fall within the named date and the next one in local time. Local
+    time is within a day of UTC, which leaves a day of margin on each side.
+    """
+    try:
+        date = whenever.Date.parse_common_iso(
+            report_path.stem.removeprefix("sandman")
+        )
+
+    except ValueError:
+        # Let the index decide for reports that aren't named for a date.
+        return True
+
+    first_time = whenever.Instant.from_utc(date.year, date.month, date.day)
+    return query.overlaps_times_ms(
+        first_time.add(hours=-24).timestamp_millis(),
+        first_time.add(hours=72).timestamp_millis(),
+    )
+
+
+def _get_report_indices(
+    base_dir: str, query: ReportQuery
+) -> list[_ReportIndex]:
+    """Get up to date indices for the reports that overlap the query.
+
+    The indices are in name order. Reports that can't overlap the query's
+    time range based on their names are skipped without being read.
+    Archived reports are included. If archiving a report was interrupted
+    before the report was removed, only the report is used.
+    """
+    reports_path = pathlib.Path(base_dir + "reports/")
+
+    try:
+        report_paths = list(reports_path.glob("sandman*.rpt"))
+        report_names = {report_path.stem for report_path in report_paths}
+        report_paths += [
+            archive_path
+            for archive_path in reports_path.glob("sandman*.rpa")
+            if archive_path.stem not in report_names
+        ]
+
+    except OSError:
+        _logger.warning(
+            "Failed to list report directory '%s'.", str(reports_path)
+        )
+        return []
+
+    report_paths.sort(key=lambda report_path: report_path.stem)
+
+    indices = []
+
+    for report_path in report_paths:
+        if _could_report_overlap_query(report_path, query) == False:
+            continue
+
+        index = _ReportIndex(str(report_path))
+
+        if index.load_and_update() == False:
+            continue
+
+        # Empty reports don't need to be considered.
+        if len(index.offsets) == 0:
+            continue
+
+        if (
+            query.overlaps_times_ms(index.first_time_ms, index.last_time_ms)
+            == False
+        ):
+            continue
+
+        indices.append(index)
+
+    return indices
+
+
+def count_report_events(base_dir: str, query: ReportQuery) -> int:
+    """Count the events in all reports that match the query.
+
+    Reports that are entirely inside the query's time range are counted
+    from their indices without looking at individual events.
+    """
+    count = 0
+
+    for index in _get_report_indices(base_dir, query):
+        if query.covers_times_ms(index.first_time_ms, index.last_time_ms):
+            count += sum(
+                key_count
+                for key, key_count in zip(
+                    index.keys, index.key_counts, strict=True
+                )
+                if query.matches_key(key)
+            )
+            continue
+
+        matching_keys = [query.matches_key(key) for key in index.keys]
+
+        for time_ms, key_id in zip(index.times_ms, index.key_ids, strict=True):
+            if matching_keys[key_id] and query.matches_time_ms(time_ms):
+                count += 1
+
+    return count
+
+
+def count_report_events_by_type(
+    base_dir: str,
+    start: whenever.ZonedDateTime | None = None,
+    end: whenever.ZonedDateTime | None = None,
+) -> dict[str, int]:
+    """Count the events of each type in all reports within a time range."""
+    query = ReportQuery(start=start, end=end)
+    counts: dict[str, int] = {}
+
+    for index in _get_report_indices(base_dir, query):
+        if query.covers_times_ms(index.first_time_ms, index.last_time_ms):
+            for event_type, type_count in index.type_counts.items():
+                counts[event_type] = counts.get(event_type, 0) + type_count
+
+            continue
+
+        for time_ms, key_id in zip(index.times_ms, index.key_ids, strict=True):
+            if query.matches_time_ms(time_ms):
+                event_type = index.keys[key_id][0]
+                counts[event_type] = counts.get(event_type, 0) + 1
+
+    return counts
+
+
+def find_report_events(base_dir: str, query: ReportQuery) -> list[ReportEvent]:
+    """Find the events in all reports that match the query.
+
+    Only the lines for matching events are read from the reports.
+    """
+    events = []
+
+    for index in _get_report_indices(base_dir, query):
+        matching_keys = [query.matches_key(key) for key in index.keys]
+        offsets = [
+            offset
+            for offset, time_ms, key_id in zip(
+                index.offsets, index.times_ms, index.key_ids, strict=True
+            )
+            if matching_keys[key_id] and query.matches_time_ms(time_ms)
+        ]
+
+        if len(offsets) == 0:
+            continue
+
+        if index.is_archive == True:
+            # Archives are read whole, so pick out the matching positions.
+            positions = set(offsets)
+            events += [
+                event
+                for position, event in enumerate(
+                    read_archived_report(index.report_file_name)
+                )
+                if position in positions
+            ]
+            continue
+
+        try:
+            with open(index.report_file_name, "rb") as file:
+                for offset in offsets:
+                    file.seek(offset)
+                    line_json = json.loads(file.readline())
+                    events.append(
+                        ReportEvent(
+                            whenever.ZonedDateTime.parse_common_iso(
+                                line_json["when"]
+                            ),
+                            line_json["info"],
+                        )
+                    )
+
+        except (OSError, ValueError, KeyError, TypeError):
+            _logger.warning(
+                "Failed to read events from report file '%s'.",
+                index.report_file_name,
+            )
+
+    return events
+
+
+# Archives start with this, followed by a format version and flags byte.
+_ARCHIVE_MAGIC = b"SRPA"
+_ARCHIVE_VERSION = 1
+_ARCHIVE_FLAG_COMPRESSED = 0x01
+
+
+def _append_varint(buffer: bytearray, value: int) -> None:
+    """Append a non-negative integer using 7 bits per byte."""
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> tuple[int, int]:
+    """Read a non-negative integer written by _append_varint.
+
+    Returns the value and the position after it.
+    """
+    value = 0
+    shift = 0
+
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+
+        if byte < 0x80:
+            return value, position
+
+        shift += 7
+
+
+def _zigzag_encode(value: int) -> int:
+    """Map a signed integer to a non-negative one, keeping small ones small."""
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def _zigzag_decode(value: int) -> int:
+    """Undo _zigzag_encode."""
+    return (value >> 1) if (value & 1) == 0 else -((value + 1) >> 1)
+
+
+def _encode_archive(header: str, events: list[ReportEvent]) -> bytes:
+    """Encode a report header and its events into columns.
+
+    Every string, including the JSON of each info value, is stored once in a
+    dictionary and referred to by index. Times are stored as the difference
+    from the previous event's time in nanoseconds.
+    """
+    strings: list[str] = []
+    string_ids: dict[str, int] = {}
+
+    def get_string_id(string: str) -> int:
+        string_id = string_ids.get(string)
+
+        if string_id is None:
+            string_id = len(strings)
+            strings.append(string)
+            string_ids[string] = string_id
+
+        return string_id
+
+    header_id = get_string_id(header)
+
+    time_column = bytearray()
+    zone_column = bytearray()
+    previous_time_ns = 0
+
+    # Fields are kept in the order they are first seen so that info comes
+    # back out in the same order. A value of zero means the field is absent.
+    field_values: dict[str, list[int]] = {}
+
+    for event_index, event in enumerate(events):
+        time_ns = event.when.timestamp_nanos()
+        _append_varint(time_column, _zigzag_encode(time_ns - previous_time_ns))
+        previous_time_ns = time_ns
+
+        _append_varint(zone_column, get_string_id(str(event.when.tz)))
+
+        for field, value in event.info.items():
+            if field not in field_values:
+                field_values[field] = [0] * len(events)
+
+            field_values[field][event_index] = (
+                get_string_id(json.dumps(value)) + 1
+            )
+
+    field_ids = [get_string_id(field) for field in field_values]
+
+    body = bytearray()
+    _append_varint(body, len(strings))
+
+    for string in strings:
+        encoded = string.encode("utf-8")
+        _append_varint(body, len(encoded))
+        body += encoded
+
+    _append_varint(body, header_id)
+    _append_varint(body, len(events))
+    body += time_column
+    body += zone_column
+    _append_varint(body, len(field_values))
+
+    for field_id, values in zip(field_ids, field_values.values(), strict=True):
+        _append_varint(body, field_id)
+
+        for value in values:
+            _append_varint(body, value)
+
+    return bytes(body)
+
+
+def _archive_report(report_path: pathlib.Path, compress: bool) -> bool:
+    """Replace a report file with an archive.
+
+    Returns whether the report was archived.
+    """
+    report_file_name = str(report_path)
+    events = []
+
+    try:
+        with open(report_file_name, encoding="utf-8") as file:
+            header = file.readline().rstrip("\n")
+
+            for line in file:
+                line_json = json.loads(line)
+                events.append(
+                    ReportEvent(
+                        whenever.ZonedDateTime.parse_common_iso(
+                            line_json["when"]
+                        ),
+                        line_json["info"],
+                    )
+                )
+
+    except (OSError, ValueError, KeyError, TypeError):
+        _logger.warning(
+            "Failed to read report file '%s' for archiving.", report_file_name
+        )
+        return False
+
+    body = _encode_archive(header, events)
+    flags = 0
+
+    if compress == True:
+        body = zlib.compress(body)
+        flags |= _ARCHIVE_FLAG_COMPRESSED
+
+    archive_path = report_path.with_suffix(".rpa")
+
+    try:
+        with open(archive_path, "wb") as file:
+            file.write(
+                _ARCHIVE_MAGIC + bytes((_ARCHIVE_VERSION, flags)) + body
+            )
+
+        report_path.unlink()
+        report_path.with_suffix(".idx").unlink(missing_ok=True)
+
+    except OSError:
+        _logger.warning(
+            "Failed to archive report file '%s'.", report_file_name
+        )
+        return False
+
+    _logger.info(
+        "Archived report file '%s' to '%s'.", report_file_name, archive_path
+    )
+    return True
+
+
+def read_archived_report_header(file_name: str) -> dict[str, object] | None:
+    """Read the header of an archived report.
+
+    Returns None if the archive couldn't be read.
+    """
+    body = _read_archive_body(file_name)
+
+    if body is None:
+        return None
+
+    try:
+        num_strings, position = _read_varint(body, 0)
+        strings, position = _read_archive_strings(body, position, num_strings)
+        header_id, position = _read_varint(body, position)
+        header = json.loads(strings[header_id])
+
+    except (IndexError, ValueError):
+        _logger.warning("Archived report '%s' is malformed.", file_name)
+        return None
+
+    return dict(header)
+
+
+def read_archived_report(file_name: str) -> typing.Iterator[ReportEvent]:
+    """Read the events from an archived report in their original order."""
+    body = _read_archive_body(file_name)
+
+    if body is None:
+        return
+
+    try:
+        num_strings, position = _read_varint(body, 0)
+        strings, position = _read_archive_strings(body, position, num_strings)
+        _, position = _read_varint(body, position)
+        num_events, position = _read_varint(body, position)
+
+        times_ns = []
+        time_ns = 0
+
+        for _ in range(num_events):
+            delta, position = _read_varint(body, position)
+            time_ns += _zigzag_decode(delta)
+            times_ns.append(time_ns)
+
+        zone_ids = []
+
+        for _ in range(num_events):
+            zone_id, position = _read_varint(body, position)
+            zone_ids.append(zone_id)
+
+        num_fields, position = _read_varint(body, position)
+        fields: list[tuple[str, list[int]]] = []
+
+        for _ in range(num_fields):
+            field_id, position = _read_varint(body, position)
+            values = []
+
+            for _ in range(num_events):
+                value, position = _read_varint(body, position)
+                values.append(value)
+
+            fields.append((strings[field_id], values))
+
+        # Values are decoded lazily, since most only appear a few times.
+        decoded_values: dict[int, typing.Any] = {}
+
+        for event_index in range(num_events):
+            info = {}
+
+            for field, values in fields:
+                value_id = values[event_index]
+
+                if value_id == 0:
+                    continue
+
+                if value_id not in decoded_values:
+                    decoded_values[value_id] = json.loads(
+                        strings[value_id - 1]
+                    )
+
+                info[field] = decoded_values[value_id]
+
+            yield ReportEvent(
+                whenever.ZonedDateTime.from_timestamp_nanos(
+                    times_ns[event_index],
+                    tz=strings[zone_ids[event_index]],
+                ),
+                info,
+            )
+
+    except (IndexError, ValueError):
+        _logger.warning("Archived report '%s' is malformed.", file_name)
+
+
+def _read_archive_body(file_name: str) -> bytes | None:
+    """Read and, if needed, decompress the body of an archive."""
+    try:
+        with open(file_name, "rb") as file:
+            data = file.read()
+
+    except OSError:
+        _logger.warning("Failed to read archived report '%s'.", file_name)
+        return None
+
+    prefix_size = len(_ARCHIVE_MAGIC) + 2
+
+    if (
+        len(data) < prefix_size
+        or data.startswith(_ARCHIVE_MAGIC) == False
+        or data[len(_ARCHIVE_MAGIC)] != _ARCHIVE_VERSION
+    ):
+        _logger.warning("'%s' is not a supported report archive.", file_name)
+        return None
+
+    flags = data[len(_ARCHIVE_MAGIC) + 1]
+    body = data[prefix_size:]
+
+    if (flags & _ARCHIVE_FLAG_COMPRESSED) != 0:
+        try:
+            body = zlib.decompress(body)
+
+        except zlib.error:
+            _logger.warning("Failed to decompress '%s'.", file_name)
+            return None
+
+    return body
+
+
+def _read_archive_strings(
+    body: bytes, position: int, num_strings: int
+) -> tuple[list[str], int]:
+    """Read the string dictionary of an archive.
+
+    Returns the strings and the position after them.
+    """
+    strings = []
+
+    for _ in range(num_strings):
+        length, position = _read_varint(body, position)
+        strings.append(body[position : position + length].decode("utf-8"))
+        position += length
+
+    return strings, position
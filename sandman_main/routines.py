@@ -3,15 +3,22 @@
 Routines are user specified sequences of actions.
 """
 
+import dataclasses
+import enum
+import functools
 import json
 import logging
 import pathlib
 import typing
 
-from . import commands, reports, time_util
+from . import commands, config_cache, reports, time_util
 
 _logger = logging.getLogger("sandman.routines")
 
+# How long a pass through a looping routine takes if its steps have no delay.
+# Otherwise the routine would always be due and keep the main loop busy.
+_NO_DELAY_LOOP_DURATION_NS = 10 * 1000000
+
 
 class RoutineDesc:
     """Describes a routine."""
@@ -223,10 +230,30 @@ class RoutineDesc:
 
             return step_json
 
+    @enum.unique
+    class CatchUpPolicy(enum.Enum):
+        """How a routine handles steps it missed while processing stalled."""
+
+        # Execute every missed step in order.
+        FIRE = enum.auto()
+        # Only execute the most recent missed step.
+        SKIP = enum.auto()
+
+        def as_string(self) -> str:
+            """Return the string used for the policy in description files."""
+            match self:
+                case RoutineDesc.CatchUpPolicy.FIRE:
+                    return "fire"
+                case RoutineDesc.CatchUpPolicy.SKIP:
+                    return "skip"
+                case _:
+                    typing.assert_never(self)
+
     def __init__(self) -> None:
         """Initialize the description."""
         self.__name: str = ""
         self.__is_looping = False
+        self.__catch_up_policy = RoutineDesc.CatchUpPolicy.FIRE
         self.__steps: list[RoutineDesc.Step] = []
 
     @property
@@ -258,6 +285,19 @@ class RoutineDesc:
 
         self.__is_looping = is_looping
 
+    @property
+    def catch_up_policy(self) -> CatchUpPolicy:
+        """Get the catch up policy."""
+        return self.__catch_up_policy
+
+    @catch_up_policy.setter
+    def catch_up_policy(self, policy: CatchUpPolicy) -> None:
+        """Set the catch up policy."""
+        if isinstance(policy, RoutineDesc.CatchUpPolicy) == False:
+            raise TypeError("Catch up policy must be a policy.")
+
+        self.__catch_up_policy = policy
+
     @property
     def steps(self) -> list[Step]:
         """Get the steps."""
@@ -289,6 +329,7 @@ class RoutineDesc:
         return (
             (self.__name == other.__name)
             and (self.__is_looping == other.__is_looping)
+            and (self.__catch_up_policy == other.__catch_up_policy)
             and (self.__steps == other.__steps)
         )
 
@@ -309,71 +350,97 @@ class RoutineDesc:
                     )
                     return desc
 
-                try:
-                    desc.name = desc_json["name"]
-
-                except KeyError:
-                    _logger.warning(
-                        "Missing 'name' key in routine description file '%s'.",
-                        filename,
-                    )
+                return cls.load_from_json(desc_json, filename)
 
-                except (TypeError, ValueError):
-                    _logger.warning(
-                        "Invalid name '%s' in routine description file '%s'.",
-                        str(desc_json["name"]),
-                        filename,
-                    )
+        except FileNotFoundError as error:
+            _logger.error(
+                "Could not find routine description file '%s'.", filename
+            )
+            raise error
 
-                try:
-                    desc.is_looping = desc_json["isLooping"]
+    @classmethod
+    def load_from_json(
+        cls, desc_json: dict[str, typing.Any], filename: str
+    ) -> typing.Self:
+        """Load the description from a dictionary.
 
-                except KeyError:
-                    # This is not an error.
-                    pass
+        filename - Only used for logging.
+        """
+        desc = cls()
 
-                except TypeError:
-                    _logger.warning(
-                        "Invalid looping '%s' in routine description file"
-                        + " '%s'.",
-                        str(desc_json["isLooping"]),
-                        filename,
-                    )
+        try:
+            desc.name = desc_json["name"]
 
-                try:
-                    steps = desc_json["steps"]
+        except KeyError:
+            _logger.warning(
+                "Missing 'name' key in routine description file '%s'.",
+                filename,
+            )
 
-                except KeyError:
-                    # This is not an error.
-                    pass
+        except (TypeError, ValueError):
+            _logger.warning(
+                "Invalid name '%s' in routine description file '%s'.",
+                str(desc_json["name"]),
+                filename,
+            )
 
-                else:
-                    try:
-                        desc.__load_steps(steps, filename)
+        try:
+            desc.is_looping = desc_json["isLooping"]
 
-                    except TypeError:
-                        _logger.warning(
-                            "Steps in routine description file '%s' is not a "
-                            + "list.",
-                            filename,
-                        )
+        except KeyError:
+            # This is not an error.
+            pass
 
-        except FileNotFoundError as error:
-            _logger.error(
-                "Could not find routine description file '%s'.", filename
+        except TypeError:
+            _logger.warning(
+                "Invalid looping '%s' in routine description file '%s'.",
+                str(desc_json["isLooping"]),
+                filename,
             )
-            raise error
 
-        return desc
+        try:
+            catch_up_policy = desc_json["catchUpPolicy"]
 
-    def save_to_file(self, filename: str) -> None:
-        """Save the description to a file."""
-        if self.is_valid() == False:
-            _logger.warning(
-                "Cannot save invalid routine description to '%s'", filename
-            )
-            return
+        except KeyError:
+            # This is not an error.
+            pass
+
+        else:
+            for policy in RoutineDesc.CatchUpPolicy:
+                if catch_up_policy == policy.as_string():
+                    desc.catch_up_policy = policy
+                    break
+
+            else:
+                _logger.warning(
+                    "Invalid catch up policy '%s' in routine "
+                    + "description file '%s'.",
+                    str(catch_up_policy),
+                    filename,
+                )
+
+        try:
+            steps = desc_json["steps"]
+
+        except KeyError:
+            # This is not an error.
+            pass
+
+        else:
+            try:
+                desc.__load_steps(steps, filename)
 
+            except TypeError:
+                _logger.warning(
+                    "Steps in routine description file '%s' is not a "
+                    + "list.",
+                    filename,
+                )
+
+        return desc
+
+    def get_as_json(self) -> dict[str, object]:
+        """Get the JSON representation of the description."""
         steps_json = []
 
         for step in self.__steps:
@@ -382,9 +449,22 @@ class RoutineDesc:
         desc_json = {
             "name": self.__name,
             "isLooping": self.__is_looping,
+            "catchUpPolicy": self.__catch_up_policy.as_string(),
             "steps": steps_json,
         }
 
+        return desc_json
+
+    def save_to_file(self, filename: str) -> None:
+        """Save the description to a file."""
+        if self.is_valid() == False:
+            _logger.warning(
+                "Cannot save invalid routine description to '%s'", filename
+            )
+            return
+
+        desc_json = self.get_as_json()
+
         try:
             with open(filename, "w") as file:
                 json.dump(desc_json, file, indent=4)
@@ -409,22 +489,125 @@ class RoutineDesc:
                 self.append_step(step)
 
 
+@dataclasses.dataclass(frozen=True)
+class RoutineTimeline:
+    """A routine description compiled for running.
+
+    Each step is stored with its offset from the start of a pass through the
+    routine and the command it produces, so running routines don't need to
+    look at the description. Running routines emit copies of the commands, so
+    changes to an emitted command don't carry over to later passes.
+    """
+
+    name: str
+    is_looping: bool
+    catch_up_policy: RoutineDesc.CatchUpPolicy
+    # Offsets from the start of a pass, in the same units as the timer.
+    offsets: tuple[int, ...]
+    commands: tuple[commands.ControlCommand, ...]
+    # How long a single pass through the routine takes. This is never zero
+    # for looping routines.
+    duration: int
+
+    @classmethod
+    def compile(cls, desc: RoutineDesc) -> typing.Self:
+        """Compile a routine description."""
+        offsets = []
+        step_commands = []
+        offset = 0
+
+        for step in desc.steps:
+            offset += step.delay_ms * 1000000
+            offsets.append(offset)
+            step_commands.append(
+                commands.ControlCommand(
+                    step.control_name, step.control_action, "routine"
+                )
+            )
+
+        duration = offset
+
+        if (desc.is_looping == True) and (duration == 0):
+            duration = _NO_DELAY_LOOP_DURATION_NS
+
+        return cls(
+            desc.name,
+            desc.is_looping,
+            desc.catch_up_policy,
+            tuple(offsets),
+            tuple(step_commands),
+            duration,
+        )
+
+
 class Routine:
-    """An instance of a running routine."""
+    """An instance of a running routine.
+
+    A running routine is a cursor into a timeline. Steps are due at their
+    offsets from the start of the current pass, so a late step doesn't delay
+    the steps after it.
+    """
+
+    def __init__(
+        self, desc: RoutineDesc | RoutineTimeline, timer: time_util.Timer
+    ) -> None:
+        """Initialize the routine.
+
+        desc - Descriptions are compiled into a timeline. Providing an already
+            compiled timeline avoids that work.
+        """
+        if isinstance(desc, RoutineDesc):
+            desc = RoutineTimeline.compile(desc)
 
-    def __init__(self, desc: RoutineDesc, timer: time_util.Timer) -> None:
-        """Initialize the routine."""
-        self.__desc = desc
+        self.__timeline = desc
         self.__timer = timer
         self.__is_finished = False
         self.__step_index = 0
-        self.__step_start_time = timer.get_current_time()
+        self.__pass_start_time = timer.get_current_time()
+        self.__last_drift_ns = 0
+        self.__max_drift_ns = 0
+        self.__num_skipped_steps = 0
 
     @property
     def is_finished(self) -> bool:
         """Get whether the routine is finished."""
         return self.__is_finished
 
+    @property
+    def next_deadline(self) -> int | None:
+        """Get the point in time when the routine next needs processing.
+
+        Returns None if the routine will never need processing again.
+        """
+        if self.__is_finished == True:
+            return None
+
+        offsets = self.__timeline.offsets
+
+        if len(offsets) == 0:
+            # Routines without steps only need processing to finish.
+            if self.__timeline.is_looping == False:
+                return self.__pass_start_time
+
+            return None
+
+        return self.__pass_start_time + offsets[self.__step_index]
+
+    @property
+    def last_drift_ns(self) -> int:
+        """Get how late the most recently executed step was."""
+        return self.__last_drift_ns
+
+    @property
+    def max_drift_ns(self) -> int:
+        """Get the most that any executed step has been late."""
+        return self.__max_drift_ns
+
+    @property
+    def num_skipped_steps(self) -> int:
+        """Get the number of steps skipped by the catch up policy."""
+        return self.__num_skipped_steps
+
     def process(
         self,
         command_list: list[
@@ -433,50 +616,120 @@ class Routine:
             | commands.RoutineCommand
         ],
     ) -> None:
-        """Process the routine."""
+        """Process the routine.
+
+        Every step that is due gets executed in order, but at most one pass
+        through the routine happens per call. If the routine skips missed
+        steps, only the most recent steps that are due get executed.
+        """
         if self.__is_finished == True:
             return
 
-        steps = self.__desc.steps
-        num_steps = len(steps)
+        timeline = self.__timeline
+        num_steps = len(timeline.offsets)
 
         if num_steps == 0:
-            if self.__desc.is_looping == False:
+            if timeline.is_looping == False:
                 self.__is_finished = True
 
             return
 
-        # Wait until the time is up.
-        elapsed_time_ms = self.__timer.get_time_since_ms(
-            self.__step_start_time
+        current_time = self.__timer.get_current_time()
+        is_skipping = (
+            timeline.catch_up_policy == RoutineDesc.CatchUpPolicy.SKIP
         )
 
-        step = steps[self.__step_index]
+        if is_skipping == True:
+            self.__skip_missed_passes(current_time)
+
+        # The steps that are due at the same time as the latest due step.
+        due_commands: list[commands.ControlCommand] = []
+        due_time = 0
+
+        for _step in range(num_steps):
+            # Wait until the time is up.
+            step_time = (
+                self.__pass_start_time + timeline.offsets[self.__step_index]
+            )
+
+            if current_time < step_time:
+                break
+
+            # Steps are only missed if a step after them is due too, so steps
+            # that share a deadline are executed together.
+            if step_time != due_time:
+                if is_skipping == True:
+                    self.__num_skipped_steps += len(due_commands)
+
+                else:
+                    for due_command in due_commands:
+                        self.__execute_step(
+                            command_list, due_command, due_time, current_time
+                        )
+
+                due_commands = []
+
+            due_commands.append(timeline.commands[self.__step_index])
+            due_time = step_time
+
+            self.__advance_step()
+
+            if self.__is_finished == True:
+                break
+
+        for due_command in due_commands:
+            self.__execute_step(
+                command_list, due_command, due_time, current_time
+            )
+
+    def __execute_step(
+        self,
+        command_list: list[
+            commands.StatusCommand
+            | commands.ControlCommand
+            | commands.RoutineCommand
+        ],
+        command: commands.ControlCommand,
+        step_time: int,
+        current_time: int,
+    ) -> None:
+        """Execute a step and keep track of how late it was."""
+        command_list.append(dataclasses.replace(command))
+
+        self.__last_drift_ns = current_time - step_time
+        self.__max_drift_ns = max(self.__max_drift_ns, self.__last_drift_ns)
 
-        if elapsed_time_ms < step.delay_ms:
+    def __skip_missed_passes(self, current_time: int) -> None:
+        """Skip whole passes of a looping routine that were missed."""
+        timeline = self.__timeline
+
+        if (timeline.is_looping == False) or (timeline.duration <= 0):
             return
 
-        # Execute the step.
-        command = commands.ControlCommand(
-            step.control_name, step.control_action, "routine"
+        step_time = (
+            self.__pass_start_time + timeline.offsets[self.__step_index]
         )
-        command_list.append(command)
 
-        self.__advance_step()
+        # Only jump far enough that the current step is still due.
+        num_passes = (current_time - step_time) // timeline.duration
+
+        if num_passes < 1:
+            return
+
+        self.__pass_start_time += num_passes * timeline.duration
+        self.__num_skipped_steps += num_passes * len(timeline.offsets)
 
     def __advance_step(self) -> None:
         """Advance to the next step."""
-        self.__step_start_time = self.__timer.get_current_time()
-
-        num_steps = len(self.__desc.steps)
         self.__step_index += 1
 
-        if self.__step_index < num_steps:
+        if self.__step_index < len(self.__timeline.offsets):
             return
 
         # We have reached the end of the routine, so either loop or finish.
-        if self.__desc.is_looping == True:
+        if self.__timeline.is_looping == True:
             self.__step_index = 0
+            self.__pass_start_time += self.__timeline.duration
             return
 
         self.__is_finished = True
@@ -486,13 +739,28 @@ class RoutineManager:
     """Manages routine descriptions and running routines."""
 
     def __init__(
-        self, timer: time_util.Timer, report_manager: reports.ReportManager
+        self,
+        timer: time_util.Timer,
+        report_manager: reports.ReportManager,
+        scheduler: time_util.Scheduler | None = None,
     ) -> None:
-        """Initialize the manager."""
+        """Initialize the manager.
+
+        scheduler - If provided, routines register their deadlines with it and
+            only routines that are due get processed. Otherwise every running
+            routine is processed every time.
+        """
         self.__timer = timer
         self.__report_manager = report_manager
+        self.__scheduler = scheduler
         self.__descs: dict[str, RoutineDesc] = {}
+        self.__timelines: dict[str, RoutineTimeline] = {}
+        # Which file each routine description came from.
+        self.__desc_names: dict[str, str] = {}
         self.__routines: dict[str, Routine] = {}
+        # Only used with a scheduler. A dictionary keeps the order stable.
+        self.__due_names: dict[str, None] = {}
+        self.__deadline_handles: dict[str, int] = {}
 
     @property
     def num_loaded(self) -> int:
@@ -504,6 +772,10 @@ class RoutineManager:
         """Get the number of running routines."""
         return len(self.__routines)
 
+    def get_names(self) -> list[str]:
+        """Get the names of the loaded routine descriptions."""
+        return list(self.__descs)
+
     def get_running_names(self) -> list[str]:
         """Get the names of the running routines."""
         names: list[str] = []
@@ -513,21 +785,49 @@ class RoutineManager:
 
         return names
 
-    def initialize(self, base_dir: str) -> None:
-        """Initialize the manager (load routine descriptions)."""
+    def get_drift_ms(self) -> dict[str, int]:
+        """Get the most that a step of each running routine has been late."""
+        return {
+            name: routine.max_drift_ns // 1000000
+            for name, routine in self.__routines.items()
+        }
+
+    def initialize(
+        self,
+        base_dir: str,
+        cache: config_cache.ConfigCache | None = None,
+    ) -> None:
+        """Initialize the manager (load routine descriptions).
+
+        cache - If provided, only descriptions that changed since they were
+            cached are parsed.
+        """
         self.uninitialize()
 
         routines_path = pathlib.Path(base_dir + "routines/")
         _logger.info("Loading routines from '%s'.", str(routines_path))
 
-        for desc_path in routines_path.glob("*.rtn"):
-            # Try parsing the routine description.
-            desc_filename = str(desc_path)
-            _logger.info("Loading routine from '%s'.", desc_filename)
+        desc_filenames = [str(path) for path in routines_path.glob("*.rtn")]
 
-            desc = RoutineDesc.parse_from_file(desc_filename)
+        if cache is None:
+            loaded_descs: list[tuple[str, RoutineDesc | None]] = []
+
+            for desc_filename in desc_filenames:
+                # Try parsing the routine description.
+                _logger.info("Loading routine from '%s'.", desc_filename)
+                loaded_descs.append(
+                    (desc_filename, RoutineDesc.parse_from_file(desc_filename))
+                )
+
+        else:
+            loaded_descs = cache.load_files(
+                desc_filenames,
+                RoutineDesc.parse_from_file,
+                RoutineDesc.load_from_json,
+            )
 
-            if desc.is_valid() == False:
+        for desc_filename, desc in loaded_descs:
+            if (desc is None) or (desc.is_valid() == False):
                 continue
 
             # Make sure a routine with this name doesn't already exist.
@@ -539,13 +839,76 @@ class RoutineManager:
                 )
                 continue
 
-            self.__descs[desc.name] = desc
+            self.__add_desc(desc_filename, desc)
 
     def uninitialize(self) -> None:
         """Uninitialize the manager."""
         self.__descs.clear()
+        self.__timelines.clear()
+        self.__desc_names.clear()
         self.__routines.clear()
 
+        for name in list(self.__deadline_handles):
+            self.__cancel_deadline(name)
+
+        self.__due_names.clear()
+
+    def reload_desc_file(self, desc_filename: str) -> None:
+        """Apply changes to a routine description file while running.
+
+        Running routines keep using the description they were started with.
+        Routines whose descriptions are deleted are stopped.
+        """
+        old_name = self.__desc_names.get(desc_filename)
+
+        try:
+            desc = RoutineDesc.parse_from_file(desc_filename)
+
+        except FileNotFoundError:
+            if old_name is not None:
+                _logger.info(
+                    "Removing routine '%s' because its description was "
+                    + "deleted.",
+                    old_name,
+                )
+                self.__remove_desc(old_name)
+
+            return
+
+        if desc.is_valid() == False:
+            _logger.warning(
+                "Ignoring changes to invalid routine description file '%s'.",
+                desc_filename,
+            )
+            return
+
+        if old_name is not None:
+            if desc == self.__descs[old_name]:
+                return
+
+            if desc.name != old_name:
+                self.__remove_desc(old_name)
+
+            elif old_name in self.__routines:
+                _logger.info(
+                    "Routine '%s' changed, but will keep running as it was "
+                    + "until it is restarted.",
+                    old_name,
+                )
+
+        if (desc.name in self.__descs) and (
+            self.__desc_names.get(desc_filename) != desc.name
+        ):
+            _logger.warning(
+                "A routine with name '%s' already exists. Ignoring "
+                + "description file '%s'.",
+                desc.name,
+                desc_filename,
+            )
+            return
+
+        self.__add_desc(desc_filename, desc)
+
     def process_command(self, command: commands.RoutineCommand) -> str:
         """Process a routine command.
 
@@ -581,10 +944,26 @@ class RoutineManager:
         ],
         notification_list: list[str],
     ) -> None:
-        """Process the running routines."""
+        """Process the running routines.
+
+        When using a scheduler, only routines whose deadlines expired (when the
+        scheduler was processed) are processed.
+        """
+        if self.__scheduler is None:
+            names = list(self.__routines)
+
+        else:
+            names = list(self.__due_names)
+            self.__due_names.clear()
+
         finished_names = []
 
-        for name, routine in self.__routines.items():
+        for name in names:
+            routine = self.__routines.get(name)
+
+            if routine is None:
+                continue
+
             # Processed the routine.
             routine.process(command_list)
 
@@ -592,9 +971,22 @@ class RoutineManager:
             if routine.is_finished == True:
                 finished_names.append(name)
 
+            else:
+                self.__schedule_routine(name, routine)
+
         for name in finished_names:
+            routine = self.__routines[name]
+            _logger.info(
+                "Routine '%s' finished with a maximum drift of %d ms and %d "
+                + "skipped steps.",
+                name,
+                routine.max_drift_ns // 1000000,
+                routine.num_skipped_steps,
+            )
+
             # Cleanup the routine.
             del self.__routines[name]
+            self.__cancel_deadline(name)
 
             notification_list.append(f"The {name} routine finished.")
 
@@ -609,13 +1001,14 @@ class RoutineManager:
 
         # Otherwise, see if there is a description with that name.
         try:
-            desc = self.__descs[routine_name]
+            timeline = self.__timelines[routine_name]
 
         except KeyError:
             return f"There is no {routine_name} routine."
 
-        routine = Routine(desc, self.__timer)
+        routine = Routine(timeline, self.__timer)
         self.__routines[routine_name] = routine
+        self.__schedule_routine(routine_name, routine)
         return f"Started the {routine_name} routine."
 
     def __stop_routine(self, routine_name: str) -> str:
@@ -628,8 +1021,57 @@ class RoutineManager:
             return f"The {routine_name} routine is not running."
 
         del self.__routines[routine_name]
+        self.__cancel_deadline(routine_name)
         return f"Stopped the {routine_name} routine."
 
+    def __add_desc(self, desc_filename: str, desc: RoutineDesc) -> None:
+        """Add or replace a valid routine description."""
+        self.__descs[desc.name] = desc
+        self.__timelines[desc.name] = RoutineTimeline.compile(desc)
+        self.__desc_names[desc_filename] = desc.name
+
+    def __remove_desc(self, name: str) -> None:
+        """Remove a routine description, stopping the routine if needed."""
+        del self.__descs[name]
+        del self.__timelines[name]
+
+        for desc_filename, desc_name in list(self.__desc_names.items()):
+            if desc_name == name:
+                del self.__desc_names[desc_filename]
+
+        if name in self.__routines:
+            del self.__routines[name]
+            self.__cancel_deadline(name)
+
+    def __mark_due(self, name: str) -> None:
+        """Mark a routine as needing processing."""
+        self.__due_names[name] = None
+
+    def __schedule_routine(self, name: str, routine: Routine) -> None:
+        """Register the next deadline of a routine with the scheduler."""
+        if self.__scheduler is None:
+            return
+
+        self.__cancel_deadline(name)
+
+        deadline = routine.next_deadline
+
+        if deadline is None:
+            return
+
+        self.__deadline_handles[name] = self.__scheduler.schedule(
+            deadline, functools.partial(self.__mark_due, name)
+        )
+
+    def __cancel_deadline(self, name: str) -> None:
+        """Cancel the registered deadline of a routine, if there is one."""
+        handle = self.__deadline_handles.pop(name, None)
+
+        if (handle is not None) and (self.__scheduler is not None):
+            self.__scheduler.cancel(handle)
+
+        self.__due_names.pop(name, None)
+
 
 def bootstrap_routines(base_dir: str) -> None:
     """Handle bootstrapping for routines."""
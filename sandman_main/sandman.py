@@ -1,32 +1,123 @@
 """Entry point for the Sandman application."""
 
+import collections.abc
+import contextlib
 import logging
 import logging.handlers
 import pathlib
-import time
 import typing
 
 from . import (
     commands,
+    config_cache,
     controls,
+    file_watch,
     gpio,
+    metrics,
     mqtt,
+    profiling,
     reports,
     routines,
     setting,
     time_util,
 )
 
+# The longest the main loop will wait without any commands or deadlines.
+_MAX_WAIT_TIME_NS = 60 * 1000000000
+
+# How often report events are flushed and how much text can wait to be flushed.
+_REPORT_FLUSH_INTERVAL_MS = 5000
+_REPORT_FLUSH_SIZE = 4096
+
+# How often control and routine config files are checked for changes.
+_CONFIG_CHECK_INTERVAL_MS = 2000
+
+# How often statistics about the main loop are published and logged.
+_STATS_INTERVAL_MS = 60 * 1000
+
+# How often the counts kept by the managers and the MQTT client are copied
+# into the metrics.
+_METRICS_COLLECT_INTERVAL_MS = 5000
+
+
+class _PhaseTimer:
+    """Measures how long each phase of starting up takes."""
+
+    def __init__(self, timer: time_util.Timer) -> None:
+        """Initialize the instance."""
+        self.__timer = timer
+        self.__start_time = timer.get_current_time()
+        self.__phase_times_ms: dict[str, int] = {}
+
+    @property
+    def phase_times_ms(self) -> dict[str, int]:
+        """Get how long each phase took (in milliseconds), in order."""
+        return dict(self.__phase_times_ms)
+
+    @contextlib.contextmanager
+    def measure(self, name: str) -> collections.abc.Iterator[None]:
+        """Measure how long the phase with the provided name takes."""
+        start_time = self.__timer.get_current_time()
+
+        try:
+            yield
+
+        finally:
+            self.__phase_times_ms[name] = self.__timer.get_time_since_ms(
+                start_time
+            )
+
+    def log(self, logger: logging.Logger) -> None:
+        """Log how long startup took in total and for each phase."""
+        logger.info(
+            "Startup took %d ms (%s).",
+            self.__timer.get_time_since_ms(self.__start_time),
+            ", ".join(
+                f"{name} {time_ms} ms"
+                for name, time_ms in self.__phase_times_ms.items()
+            ),
+        )
+
 
 class Sandman:
     """The state and logic to run the Sandman application."""
 
-    def __init__(self) -> None:
-        """Initialize the instance."""
-        self.__timer = time_util.Timer()
-        self.__time_source = time_util.TimeSource()
+    def __init__(
+        self,
+        timer: time_util.Timer | None = None,
+        time_source: time_util.TimeSource | None = None,
+        gpio_manager: gpio.GPIOManager | None = None,
+        mqtt_client: mqtt.MQTTClient | None = None,
+    ) -> None:
+        """Initialize the instance.
+
+        The arguments stand in for the real clock, GPIO lines, and MQTT
+        broker, such as when simulating. If any are None, the real one is
+        used.
+        """
+        self.__timer = timer if timer is not None else time_util.Timer()
+        self.__time_source = (
+            time_source if time_source is not None else time_util.TimeSource()
+        )
+        self.__scheduler = time_util.Scheduler(self.__timer)
+        self.__profiler = profiling.TickProfiler(self.__timer)
+        self.__metrics = metrics.Registry()
+        self.__register_metrics()
+        self.__metrics_server: metrics.MetricsServer | None = None
+        # When the main loop expects to wake for the next deadline.
+        self.__due_time: int | None = None
         # Change this if you want to run off device.
-        self.__gpio_manager = gpio.GPIOManager(is_live_mode=True)
+        self.__gpio_manager = (
+            gpio_manager
+            if gpio_manager is not None
+            else gpio.GPIOManager(is_live_mode=True)
+        )
+        self.__mqtt_client = (
+            mqtt_client
+            if mqtt_client is not None
+            else mqtt.MQTTClient(commands.IntentParser(), self.__timer)
+        )
+        self.__intent_parser = self.__mqtt_client.intent_parser
 
     def __setup_logging(self) -> None:
         """Set up logging."""
@@ -57,8 +148,10 @@ class Sandman:
 
         Returns True if initialization was successful, False otherwise.
         """
+        self.__phase_timer = _PhaseTimer(self.__timer)
         self.__is_testing = False
         self.__base_dir = str(pathlib.Path.home()) + "/.sandman/"
+        self.__is_serving_metrics = True
 
         if options is not None:
             if "TESTING" in options:
@@ -67,6 +160,10 @@ class Sandman:
             if "BASE_DIR" in options:
                 self.__base_dir = options["BASE_DIR"]
 
+            # Metrics are still kept when they aren't served.
+            if "SERVE_METRICS" in options:
+                self.__is_serving_metrics = options["SERVE_METRICS"]
+
         base_path = pathlib.Path(self.__base_dir)
 
         # If the base directory doesn't exist, try to create it.
@@ -80,69 +177,226 @@ class Sandman:
                 return False
 
         # Now that we have a base directory, set up logging.
-        self.__setup_logging()
+        with self.__phase_timer.measure("logging"):
+            self.__setup_logging()
 
-        self.__gpio_manager.initialize()
+        with self.__phase_timer.measure("gpio"):
+            self.__gpio_manager.initialize()
 
         # We only bootstrap once.
-        controls.bootstrap_controls(self.__base_dir)
-        reports.bootstrap_reports(self.__base_dir)
-        routines.bootstrap_routines(self.__base_dir)
-
-        self.__settings = setting.load_or_create_settings(self.__base_dir)
-
-        self.__time_source.set_time_zone_name(self.__settings.time_zone_name)
+        with self.__phase_timer.measure("bootstrap"):
+            controls.bootstrap_controls(self.__base_dir)
+            reports.bootstrap_reports(self.__base_dir)
+            routines.bootstrap_routines(self.__base_dir)
+
+        with self.__phase_timer.measure("settings"):
+            self.__settings = setting.load_or_create_settings(self.__base_dir)
+
+            self.__time_source.set_time_zone_name(
+                self.__settings.time_zone_name
+            )
+
+        with self.__phase_timer.measure("managers"):
+            self.__report_manager = reports.ReportManager(
+                self.__time_source,
+                self.__base_dir,
+                self.__scheduler,
+                flush_interval_ms=_REPORT_FLUSH_INTERVAL_MS,
+                flush_size=_REPORT_FLUSH_SIZE,
+                archive_closed=True,
+            )
+
+            self.__control_manager = controls.ControlManager(
+                self.__timer,
+                self.__gpio_manager,
+                self.__report_manager,
+                self.__scheduler,
+            )
+
+            self.__routine_manager = routines.RoutineManager(
+                self.__timer, self.__report_manager, self.__scheduler
+            )
 
-        self.__report_manager = reports.ReportManager(
-            self.__time_source, self.__base_dir
-        )
+        return True
 
-        self.__control_manager = controls.ControlManager(
-            self.__timer, self.__gpio_manager, self.__report_manager
-        )
+    @property
+    def metrics(self) -> metrics.Registry:
+        """Get the registry of metrics."""
+        return self.__metrics
 
-        self.__routine_manager = routines.RoutineManager(
-            self.__timer, self.__report_manager
-        )
-        return True
+    def get_startup_times_ms(self) -> dict[str, int]:
+        """Get how long each phase of starting up took (in milliseconds)."""
+        return self.__phase_timer.phase_times_ms
 
     def run(self) -> None:
         """Run the program."""
-        self.__logger.info("Starting Sandman...")
+        self.start()
 
-        self.__control_manager.initialize(self.__base_dir)
-        self.__routine_manager.initialize(self.__base_dir)
+        try:
+            # The controls and routines keep working while the broker is
+            # down, so this doesn't wait for the connection.
+            if self.__mqtt_client.connect() == False:
+                return
 
-        self.__mqtt_client = mqtt.MQTTClient()
+            with self.__phase_timer.measure("dialogue manager"):
+                self.__wait_until_ready()
 
-        if self.__mqtt_client.connect() == False:
-            return
+            self.__phase_timer.log(self.__logger)
 
-        if self.__mqtt_client.start() == False:
-            return
+            self.__mqtt_client.play_notification("Sandman initialized.")
 
-        startup_delay_sec = self.__settings.startup_delay_sec
+            while True:
+                self.process()
+
+                # Wait until there is a command or something else is due.
+                self.__mqtt_client.wait_for_command(self.__get_wait_time_sec())
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self.__mqtt_client.stop()
+
+            self.stop()
 
-        if startup_delay_sec > 0:
-            self.__logger.info("Sleeping for %i seconds...", startup_delay_sec)
-            time.sleep(startup_delay_sec)
+    async def run_async(self) -> None:
+        """Run the program as a coroutine on the running event loop.
+
+        This is an alternative to run for embedding Sandman in an asyncio
+        process. MQTT is serviced by the event loop instead of a background
+        thread. Cancel the task running this coroutine to exit.
+        """
+        self.start()
 
-        self.__mqtt_client.play_notification("Sandman initialized.")
+        await self.__mqtt_client.connect_async()
 
         try:
+            with self.__phase_timer.measure("dialogue manager"):
+                await self.__wait_until_ready_async()
+
+            self.__phase_timer.log(self.__logger)
+
+            self.__mqtt_client.play_notification("Sandman initialized.")
+
             while True:
-                self.__process()
+                self.process()
 
-                # Sleep for 10 µs.
-                time.sleep(0.01)
+                # Wait until there is a command or something else is due.
+                await self.__mqtt_client.wait_for_command_async(
+                    self.__get_wait_time_sec()
+                )
 
-        except KeyboardInterrupt:
-            pass
+        finally:
+            await self.__mqtt_client.stop_async()
 
-        self.__mqtt_client.stop()
+            self.stop()
 
+    def __wait_until_ready(self) -> None:
+        """Wait for the dialogue manager, up to the startup delay."""
+        startup_delay_sec = self.__settings.startup_delay_sec
+
+        if startup_delay_sec <= 0:
+            return
+
+        self.__logger.info(
+            "Waiting up to %i seconds for the dialogue manager...",
+            startup_delay_sec,
+        )
+
+        if self.__mqtt_client.wait_until_ready(startup_delay_sec) == False:
+            self.__logger.info("Timed out waiting for the dialogue manager.")
+
+    async def __wait_until_ready_async(self) -> None:
+        """Wait for the dialogue manager, up to the startup delay."""
+        startup_delay_sec = self.__settings.startup_delay_sec
+
+        if startup_delay_sec <= 0:
+            return
+
+        self.__logger.info(
+            "Waiting up to %i seconds for the dialogue manager...",
+            startup_delay_sec,
+        )
+
+        if (
+            await self.__mqtt_client.wait_until_ready_async(startup_delay_sec)
+            == False
+        ):
+            self.__logger.info("Timed out waiting for the dialogue manager.")
+
+    def start(self) -> None:
+        """Prepare the managers before running.
+
+        This is done by run and run_async, so it's only needed when driving
+        the main loop directly.
+        """
+        self.__logger.info("Starting Sandman...")
+
+        # Only configs that changed since the last run need to be parsed.
+        cache = config_cache.ConfigCache(self.__base_dir + "config_cache.json")
+
+        with self.__phase_timer.measure("config cache"):
+            cache.load()
+
+        with self.__phase_timer.measure("controls"):
+            self.__control_manager.initialize(self.__base_dir, cache)
+
+        with self.__phase_timer.measure("routines"):
+            self.__routine_manager.initialize(self.__base_dir, cache)
+
+        cache.save()
+        self.__update_intent_names()
+        self.__logger.info(
+            "Loaded %d configs from the cache and parsed %d.",
+            cache.num_hits,
+            cache.num_misses,
+        )
+
+        # Watch for config changes so they can be applied without restarting.
+        self.__file_watcher = file_watch.FileWatcher()
+        self.__file_watcher.watch_directory(
+            self.__base_dir + "controls/", ".ctl"
+        )
+        self.__file_watcher.watch_directory(
+            self.__base_dir + "routines/", ".rtn"
+        )
+        self.__config_check_handle = self.__scheduler.schedule_after_ms(
+            _CONFIG_CHECK_INTERVAL_MS, self.__check_config_files
+        )
+        self.__stats_handle = self.__scheduler.schedule_after_ms(
+            _STATS_INTERVAL_MS, self.__report_stats
+        )
+        self.__collect_metrics_handle = self.__scheduler.schedule_after_ms(
+            _METRICS_COLLECT_INTERVAL_MS, self.__collect_metrics
+        )
+
+        if self.__is_serving_metrics == True:
+            self.__metrics_server = metrics.MetricsServer(
+                self.__metrics,
+                self.__settings.metrics_host,
+                self.__settings.metrics_port,
+            )
+
+            # Sandman still works without metrics, so just carry on.
+            if self.__metrics_server.start() == False:
+                self.__metrics_server = None
+
+    def stop(self) -> None:
+        """Clean up the managers after running.
+
+        Like start, this is only needed when driving the main loop directly.
+        MQTT needs to be stopped separately.
+        """
         self.__logger.info("Sandman exiting.")
 
+        self.__scheduler.cancel(self.__config_check_handle)
+        self.__scheduler.cancel(self.__stats_handle)
+        self.__scheduler.cancel(self.__collect_metrics_handle)
+        self.__file_watcher.close()
+
+        if self.__metrics_server is not None:
+            self.__metrics_server.stop()
+
         self.__routine_manager.uninitialize()
 
         # Uninitialize the controls.
@@ -150,12 +404,14 @@ class Sandman:
 
         self.__gpio_manager.uninitialize()
 
+        self.__report_manager.close()
+
     def is_testing(self) -> bool:
         """Return whether the app is in test mode."""
         return self.__is_testing
 
-    def __process(self) -> None:
-        """Process during the main loop."""
+    def process(self) -> None:
+        """Process everything that is due or pending, once."""
         command_list: list[
             commands.StatusCommand
             | commands.ControlCommand
@@ -163,29 +419,297 @@ class Sandman:
         ] = []
         notification_list: list[str] = []
 
+        self.__profiler.begin_tick(self.__due_time)
+
+        # Let the controls, routines, and reports know which of their deadlines
+        # have expired.
+        self.__scheduler.process()
+        self.__profiler.end_phase("scheduler")
+
         self.__routine_manager.process_routines(
             command_list, notification_list
         )
+        self.__profiler.end_phase("routines")
 
         # Fetch any commands from MQTT as well.
-        command = self.__mqtt_client.pop_command()
-
-        while command is not None:
-            command_list.append(command)
-
-            command = self.__mqtt_client.pop_command()
+        self.__drain_commands(command_list)
+        self.__profiler.end_phase("drain")
 
         self.__process_commands(notification_list, command_list)
+        self.__profiler.end_phase("commands")
 
         self.__control_manager.process_controls(notification_list)
+        self.__profiler.end_phase("controls")
 
-        self.__mqtt_client.process()
-        self.__report_manager.process()
+        for trace in self.__control_manager.pop_completed_traces():
+            self.__profiler.record_trace(trace)
+            stage_durations_ns = trace.get_stage_durations_ns()
+
+            if stage_durations_ns is not None:
+                self.__command_latency_metric.observe_ns(
+                    stage_durations_ns["receiveToGpio"]
+                )
 
-        # Play all the notifications.
+        # Queue all the notifications before processing MQTT so that they are
+        # published this time through rather than waiting for the next wake.
         for notification in notification_list:
             self.__mqtt_client.play_notification(notification)
 
+        self.__mqtt_client.process()
+        self.__profiler.end_phase("mqtt")
+
+        self.__report_manager.process()
+        self.__profiler.end_phase("reports")
+
+        self.__tick_duration_metric.observe_ns(self.__profiler.end_tick())
+
+    def __drain_commands(
+        self,
+        command_list: list[
+            commands.StatusCommand
+            | commands.ControlCommand
+            | commands.RoutineCommand
+        ],
+    ) -> None:
+        """Add the commands from MQTT to the list."""
+        drained_commands = self.__mqtt_client.drain_commands()
+        dequeued_time: int | None = None
+
+        for command in drained_commands:
+            if isinstance(command, commands.ControlCommand) and (
+                command.trace is not None
+            ):
+                if dequeued_time is None:
+                    dequeued_time = self.__timer.get_current_time()
+
+                command.trace.dequeued_time = dequeued_time
+
+        command_list += drained_commands
+
+    def __report_stats(self) -> None:
+        """Publish and log statistics about the main loop, then reset them."""
+        stats_json = self.__profiler.get_as_json()
+
+        command_queue = self.__mqtt_client.pending_commands
+        stats_json["commandQueue"] = {
+            "depth": command_queue.depth,
+            "maxDepth": command_queue.max_depth,
+            "dropped": command_queue.num_dropped,
+            "coalesced": command_queue.num_coalesced,
+        }
+
+        payload_cache = self.__mqtt_client.payload_cache
+        stats_json["payloadCache"] = {
+            "hits": payload_cache.num_hits,
+            "misses": payload_cache.num_misses,
+        }
+        stats_json["routineDriftMs"] = self.__routine_manager.get_drift_ms()
+
+        self.__mqtt_client.publish_stats(stats_json)
+        self.__profiler.log_summary(self.__logger)
+        self.__profiler.reset()
+
+        self.__stats_handle = self.__scheduler.schedule_after_ms(
+            _STATS_INTERVAL_MS, self.__report_stats
+        )
+
+    def __register_metrics(self) -> None:
+        """Create the metrics that are served for scraping."""
+        registry = self.__metrics
+
+        # These are updated as things happen.
+        self.__commands_metric = registry.register(
+            metrics.Counter(
+                "sandman_commands_total",
+                "Commands processed, by type and source.",
+                ("type", "source"),
+            )
+        )
+        self.__tick_duration_metric = registry.register(
+            metrics.Histogram(
+                "sandman_tick_duration_seconds",
+                "How long each pass through the main loop took.",
+            )
+        )
+        self.__command_latency_metric = registry.register(
+            metrics.Histogram(
+                "sandman_command_latency_seconds",
+                "How long voice commands took from MQTT to GPIO.",
+            )
+        )
+
+        # These are copied from counts kept elsewhere when collected.
+        self.__control_transitions_metric = registry.register(
+            metrics.Counter(
+                "sandman_control_transitions_total",
+                "Times each control entered each state.",
+                ("control", "state"),
+            )
+        )
+        self.__gpio_writes_metric = registry.register(
+            metrics.Counter(
+                "sandman_gpio_writes_total",
+                "GPIO line writes, by whether they were issued or elided.",
+                ("result",),
+            )
+        )
+        self.__notifications_metric = registry.register(
+            metrics.Counter(
+                "sandman_notifications_published_total",
+                "Sessions published to speak notifications.",
+            )
+        )
+        self.__report_events_metric = registry.register(
+            metrics.Counter(
+                "sandman_report_events_written_total",
+                "Events written to report files.",
+            )
+        )
+        self.__mqtt_reconnects_metric = registry.register(
+            metrics.Counter(
+                "sandman_mqtt_reconnects_total",
+                "Times the connection to the MQTT broker was reestablished.",
+            )
+        )
+        self.__mqtt_connected_metric = registry.register(
+            metrics.Gauge(
+                "sandman_mqtt_connected",
+                "Whether the MQTT broker is connected.",
+            )
+        )
+        self.__command_queue_depth_metric = registry.register(
+            metrics.Gauge(
+                "sandman_command_queue_depth",
+                "Commands waiting for the main loop.",
+            )
+        )
+        self.__command_queue_max_depth_metric = registry.register(
+            metrics.Gauge(
+                "sandman_command_queue_max_depth",
+                "The most commands that have waited for the main loop.",
+            )
+        )
+        self.__commands_dropped_metric = registry.register(
+            metrics.Counter(
+                "sandman_commands_dropped_total",
+                "Commands dropped because the queue was full.",
+            )
+        )
+        self.__commands_coalesced_metric = registry.register(
+            metrics.Counter(
+                "sandman_commands_coalesced_total",
+                "Commands replaced by newer commands while queued.",
+            )
+        )
+        self.__pending_notifications_metric = registry.register(
+            metrics.Gauge(
+                "sandman_pending_notifications",
+                "Notifications waiting to be published.",
+            )
+        )
+        self.__routine_drift_metric = registry.register(
+            metrics.Gauge(
+                "sandman_routine_drift_seconds",
+                "The most that a step of each running routine has been late.",
+                ("routine",),
+            )
+        )
+
+        registry.add_collector(self.__collect_counts)
+
+    def __collect_counts(self) -> None:
+        """Copy the counts kept by the managers and clients into metrics."""
+        transition_counts = self.__control_manager.get_transition_counts()
+
+        for name_and_state, count in transition_counts.items():
+            self.__control_transitions_metric.set(count, name_and_state)
+
+        self.__gpio_writes_metric.set(
+            self.__gpio_manager.num_issued_writes, ("issued",)
+        )
+        self.__gpio_writes_metric.set(
+            self.__gpio_manager.num_elided_writes, ("elided",)
+        )
+        self.__report_events_metric.set(
+            self.__report_manager.num_events_written
+        )
+        drift_ms = self.__routine_manager.get_drift_ms()
+        self.__routine_drift_metric.set_all(
+            {(name,): ms / 1000 for name, ms in drift_ms.items()}
+        )
+
+        mqtt_client = self.__mqtt_client
+        self.__notifications_metric.set(
+            mqtt_client.num_notifications_published
+        )
+        self.__mqtt_reconnects_metric.set(mqtt_client.num_reconnects)
+        self.__mqtt_connected_metric.set(
+            1 if mqtt_client.is_connected == True else 0
+        )
+        self.__pending_notifications_metric.set(
+            mqtt_client.num_pending_notifications
+        )
+
+        command_queue = mqtt_client.pending_commands
+        self.__command_queue_depth_metric.set(command_queue.depth)
+        self.__command_queue_max_depth_metric.set(command_queue.max_depth)
+        self.__commands_dropped_metric.set(command_queue.num_dropped)
+        self.__commands_coalesced_metric.set(command_queue.num_coalesced)
+
+    def __collect_metrics(self) -> None:
+        """Update the collected metrics and schedule the next collection."""
+        self.__metrics.collect()
+
+        self.__collect_metrics_handle = self.__scheduler.schedule_after_ms(
+            _METRICS_COLLECT_INTERVAL_MS, self.__collect_metrics
+        )
+
+    def __check_config_files(self) -> None:
+        """Apply any changes to control and routine config files."""
+        changes = self.__file_watcher.poll()
+
+        for change in changes:
+            if change.path.endswith(".ctl"):
+                self.__control_manager.reload_config_file(change.path)
+
+            elif change.path.endswith(".rtn"):
+                self.__routine_manager.reload_desc_file(change.path)
+
+        if len(changes) > 0:
+            self.__update_intent_names()
+
+        self.__config_check_handle = self.__scheduler.schedule_after_ms(
+            _CONFIG_CHECK_INTERVAL_MS, self.__check_config_files
+        )
+
+    def __update_intent_names(self) -> None:
+        """Let the intent parser know which controls and routines exist."""
+        self.__intent_parser.set_control_names(
+            self.__control_manager.get_names()
+        )
+        self.__intent_parser.set_routine_names(
+            self.__routine_manager.get_names()
+        )
+
+    def get_next_deadline(self) -> int | None:
+        """Get the point in time when processing is next needed.
+
+        Returns None if nothing is due until a command arrives.
+        """
+        return self.__scheduler.get_next_deadline()
+
+    def __get_wait_time_sec(self) -> float:
+        """Get how long the main loop can wait before it must process again."""
+        wait_time_ns = _MAX_WAIT_TIME_NS
+        next_deadline = self.get_next_deadline()
+        self.__due_time = next_deadline
+
+        if next_deadline is not None:
+            current_time = self.__timer.get_current_time()
+            wait_time_ns = min(wait_time_ns, next_deadline - current_time)
+
+        return max(wait_time_ns, 0) / 1000000000
+
     def __process_commands(
         self,
         notification_list: list[str],
@@ -199,14 +723,17 @@ class Sandman:
         for command in command_list:
             match command:
                 case commands.StatusCommand():
+                    self.__commands_metric.inc(("status", "voice"))
                     self.__process_status_command(notification_list)
 
                 case commands.ControlCommand():
+                    self.__commands_metric.inc(("control", command.source))
                     self.__control_manager.process_command(
                         notification_list, command
                     )
 
                 case commands.RoutineCommand():
+                    self.__commands_metric.inc(("routine", "voice"))
                     notification = self.__routine_manager.process_command(
                         command
                     )
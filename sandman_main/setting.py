@@ -15,11 +15,15 @@ class Settings:
 
     DEFAULT_TIME_ZONE_NAME = "America/Chicago"
     DEFAULT_STARTUP_DELAY_SEC = 4
+    DEFAULT_METRICS_HOST = "127.0.0.1"
+    DEFAULT_METRICS_PORT = 9464
 
     def __init__(self) -> None:
         """Initialize the control config."""
         self.__time_zone_name: str = self.DEFAULT_TIME_ZONE_NAME
         self.__startup_delay_sec: int = self.DEFAULT_STARTUP_DELAY_SEC
+        self.__metrics_host: str = self.DEFAULT_METRICS_HOST
+        self.__metrics_port: int = self.DEFAULT_METRICS_PORT
         self.__was_any_missing_on_load = False
         self.__was_any_invalid_on_load = False
 
@@ -58,6 +62,38 @@ class Settings:
 
         self.__startup_delay_sec = startup_delay_sec
 
+    @property
+    def metrics_host(self) -> str:
+        """Get the host that metrics are served on."""
+        return self.__metrics_host
+
+    @metrics_host.setter
+    def metrics_host(self, metrics_host: str) -> None:
+        """Set the host that metrics are served on."""
+        if isinstance(metrics_host, str) == False:
+            raise TypeError("Metrics host must be a string.")
+
+        if metrics_host == "":
+            raise ValueError("Cannot set an empty metrics host.")
+
+        self.__metrics_host = metrics_host
+
+    @property
+    def metrics_port(self) -> int:
+        """Get the port that metrics are served on."""
+        return self.__metrics_port
+
+    @metrics_port.setter
+    def metrics_port(self, metrics_port: int) -> None:
+        """Set the port that metrics are served on."""
+        if isinstance(metrics_port, int) == False:
+            raise TypeError("Metrics port must be an integer.")
+
+        if (metrics_port < 1) or (metrics_port > 65535):
+            raise ValueError("Metrics port must be from 1 to 65535.")
+
+        self.__metrics_port = metrics_port
+
     @property
     def was_any_missing_on_load(self) -> bool:
         """Get whether there were any missing values when loading."""
@@ -79,6 +115,12 @@ class Settings:
         if self.__startup_delay_sec < 0:
             return False
 
+        if self.__metrics_host == "":
+            return False
+
+        if (self.__metrics_port < 1) or (self.__metrics_port > 65535):
+            return False
+
         return True
 
     def __eq__(self, other: object) -> bool:
@@ -86,8 +128,11 @@ class Settings:
         if not isinstance(other, Settings):
             return NotImplemented
 
-        return (self.__time_zone_name == other.__time_zone_name) and (
-            self.__startup_delay_sec == other.__startup_delay_sec
+        return (
+            (self.__time_zone_name == other.__time_zone_name)
+            and (self.__startup_delay_sec == other.__startup_delay_sec)
+            and (self.__metrics_host == other.__metrics_host)
+            and (self.__metrics_port == other.__metrics_port)
         )
 
     @classmethod
@@ -145,6 +190,42 @@ class Settings:
                         filename,
                     )
 
+                try:
+                    new_settings.metrics_host = settings_json["metricsHost"]
+
+                except KeyError:
+                    new_settings.__was_any_missing_on_load = True
+                    _logger.warning(
+                        "Missing 'metricsHost' key in settings file '%s'.",
+                        filename,
+                    )
+
+                except (TypeError, ValueError):
+                    new_settings.__was_any_invalid_on_load = True
+                    _logger.warning(
+                        "Invalid metrics host '%s' in settings file '%s'.",
+                        str(settings_json["metricsHost"]),
+                        filename,
+                    )
+
+                try:
+                    new_settings.metrics_port = settings_json["metricsPort"]
+
+                except KeyError:
+                    new_settings.__was_any_missing_on_load = True
+                    _logger.warning(
+                        "Missing 'metricsPort' key in settings file '%s'.",
+                        filename,
+                    )
+
+                except (TypeError, ValueError):
+                    new_settings.__was_any_invalid_on_load = True
+                    _logger.warning(
+                        "Invalid metrics port '%s' in settings file '%s'.",
+                        str(settings_json["metricsPort"]),
+                        filename,
+                    )
+
         except FileNotFoundError as error:
             _logger.error("Could not find settings file '%s'.", filename)
             raise error
@@ -160,6 +241,8 @@ class Settings:
         settings_json = {
             "timeZoneName": self.__time_zone_name,
             "startupDelaySec": self.__startup_delay_sec,
+            "metricsHost": self.__metrics_host,
+            "metricsPort": self.__metrics_port,
         }
 
         try:
@@ -0,0 +1,457 @@
+"""Runs Sandman against a simulated clock, GPIO lines, and MQTT broker.
+
+Instead of waiting, the clock jumps straight to the next deadline or scripted
+intent, so a soak test can cover weeks of routines and report rollovers in
+seconds. The CPU time spent on each wake of the main loop is measured along
+the way.
+"""
+
+import collections
+import collections.abc
+import dataclasses
+import heapq
+import json
+import logging
+import pathlib
+import time
+import typing
+import warnings
+
+import paho.mqtt.client
+import paho.mqtt.enums
+import whenever
+
+from . import gpio, metrics, mqtt, profiling, sandman, time_util
+
+_logger = logging.getLogger("sandman.simulation")
+
+_INTENT_TOPIC_PREFIX = "hermes/intent/"
+_START_SESSION_TOPIC = "hermes/dialogueManager/startSession"
+
+# How many times the main loop can be processed without the clock moving
+# before the simulation is considered stuck.
+_MAX_TICKS_WITHOUT_PROGRESS = 1000
+
+type _MessageCallback = collections.abc.Callable[
+    [paho.mqtt.client.Client, typing.Any, paho.mqtt.client.MQTTMessage], object
+]
+# MQTTClient uses version 1 callbacks.
+type _ConnectCallback = collections.abc.Callable[
+    [paho.mqtt.client.Client, typing.Any, dict[str, int], int], object
+]
+
+
+class LoopbackClient(paho.mqtt.client.Client):
+    """A Paho client connected to an in-process stand-in for the broker.
+
+    Connecting succeeds immediately. Published messages are counted, and the
+    text of spoken notifications is kept, rather than being sent anywhere.
+    Intents are delivered with deliver_intent.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the instance."""
+        # MQTTClient's callbacks use version 1 of the API, which is the
+        # default. Paho warns that it's deprecated whenever a client is
+        # created, which would happen for every simulation.
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                "ignore",
+                "Callback API version 1 is deprecated",
+                DeprecationWarning,
+            )
+            super().__init__()
+
+        self.__message_callbacks: dict[str, _MessageCallback] = {}
+        self.__num_published = collections.Counter[str]()
+        self.__spoken_texts: list[str] = []
+        self.__next_message_id = 1
+
+    @property
+    def spoken_texts(self) -> list[str]:
+        """Get the text of each notification session, in order."""
+        return list(self.__spoken_texts)
+
+    def get_num_published(self, topic: str) -> int:
+        """Get the number of messages published to a topic."""
+        return self.__num_published[topic]
+
+    def deliver_intent(self, intent_name: str, slots: dict[str, str]) -> None:
+        """Deliver an intent, as if it was recognized from speech."""
+        payload = {
+            "intent": {"intentName": intent_name},
+            "slots": [
+                {"slotName": name, "value": {"value": value}}
+                for name, value in slots.items()
+            ],
+        }
+        self.deliver(
+            _INTENT_TOPIC_PREFIX + intent_name, json.dumps(payload).encode()
+        )
+
+    def deliver(self, topic: str, payload: bytes) -> None:
+        """Deliver a message to the callbacks with matching subscriptions."""
+        message = paho.mqtt.client.MQTTMessage(topic=topic.encode())
+        message.payload = payload
+
+        for subscription, callback in list(self.__message_callbacks.items()):
+            if paho.mqtt.client.topic_matches_sub(subscription, topic):
+                callback(self, None, message)
+
+    def connect_async(self, *args: object, **kwargs: object) -> None:
+        """Pretend to start connecting."""
+        pass
+
+    def loop_start(self) -> int | None:
+        """Connect immediately, without a background thread."""
+        on_connect = self.on_connect
+
+        if on_connect is not None:
+            typing.cast(_ConnectCallback, on_connect)(
+                self, None, {}, paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS
+            )
+
+        return paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force: bool = False) -> int | None:
+        """Pretend to stop the background thread."""
+        return paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS
+
+    def disconnect(self, *args: object, **kwargs: object) -> int:
+        """Pretend to disconnect."""
+        return paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS
+
+    def subscribe(self, *args: object, **kwargs: object) -> tuple[int, int]:
+        """Pretend to subscribe. Messages go to the message callbacks."""
+        return paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS, self.__get_mid()
+
+    def unsubscribe(self, *args: object, **kwargs: object) -> tuple[int, int]:
+        """Pretend to unsubscribe."""
+        return paho.mqtt.enums.MQTTErrorCode.MQTT_ERR_SUCCESS, self.__get_mid()
+
+    def message_callback_add(
+        self, sub: str, callback: _MessageCallback
+    ) -> None:
+        """Call a callback for messages delivered to matching topics."""
+        self.__message_callbacks[sub] = callback
+
+    def message_callback_remove(self, sub: str) -> None:
+        """Stop calling the callback for a subscription."""
+        self.__message_callbacks.pop(sub, None)
+
+    def publish(
+        self,
+        topic: str,
+        payload: str | bytes | bytearray | float | None = None,
+        *args: object,
+        **kwargs: object,
+    ) -> paho.mqtt.client.MQTTMessageInfo:
+        """Record a published message."""
+        self.__num_published[topic] += 1
+
+        if (topic == _START_SESSION_TOPIC) and isinstance(
+            payload, (bytes, str)
+        ):
+            self.__spoken_texts.append(json.loads(payload)["init"]["text"])
+
+        return paho.mqtt.client.MQTTMessageInfo(self.__get_mid())
+
+    def __get_mid(self) -> int:
+        """Get the next message ID."""
+        message_id = self.__next_message_id
+        self.__next_message_id += 1
+        return message_id
+
+
+@dataclasses.dataclass(frozen=True)
+class ScriptedIntent:
+    """An intent to deliver at a point in a simulation."""
+
+    # When to deliver the intent, since the simulation started.
+    time_ms: int
+    intent_name: str
+    slots: dict[str, str] = dataclasses.field(default_factory=dict)
+    # If positive, the intent is delivered again this often.
+    repeat_interval_ms: int = 0
+
+    @classmethod
+    def load_from_json(cls, intent_json: dict[str, typing.Any]) -> typing.Self:
+        """Load a scripted intent from JSON.
+
+        Raises ValueError if the JSON isn't a valid scripted intent.
+        """
+        try:
+            time_ms = intent_json["timeMs"]
+            intent_name = intent_json["intent"]
+            slots = intent_json.get("slots", {})
+            repeat_interval_ms = intent_json.get("repeatIntervalMs", 0)
+
+        except (KeyError, TypeError, AttributeError) as exception:
+            raise ValueError("Invalid scripted intent.") from exception
+
+        if (
+            (isinstance(time_ms, int) == False)
+            or (time_ms < 0)
+            or (isinstance(intent_name, str) == False)
+            or (isinstance(slots, dict) == False)
+            or (isinstance(repeat_interval_ms, int) == False)
+            or (repeat_interval_ms < 0)
+        ):
+            raise ValueError("Invalid scripted intent.")
+
+        return cls(
+            time_ms,
+            intent_name,
+            {str(name): str(value) for name, value in slots.items()},
+            repeat_interval_ms,
+        )
+
+
+def load_script(filename: str) -> list[ScriptedIntent]:
+    """Load a list of scripted intents from a JSON file.
+
+    Raises ValueError if the file isn't a valid script.
+    """
+    with open(filename) as file:
+        script_json = json.load(file)
+
+    if isinstance(script_json, list) == False:
+        raise ValueError(f"Script '{filename}' must be a list of intents.")
+
+    return [ScriptedIntent.load_from_json(entry) for entry in script_json]
+
+
+@dataclasses.dataclass
+class SoakResults:
+    """What happened during a simulation and what it cost."""
+
+    simulated_ms: int = 0
+    # Each time the main loop was processed.
+    num_ticks: int = 0
+    num_intents: int = 0
+    num_notifications: int = 0
+    num_report_events: int = 0
+    num_report_files: int = 0
+    # The CPU time spent on each tick, including delivering intents.
+    tick_cpu: profiling.Histogram = dataclasses.field(
+        default_factory=profiling.Histogram
+    )
+
+    def get_as_json(self) -> dict[str, typing.Any]:
+        """Get the results as JSON, with CPU times in microseconds."""
+        return {
+            "simulatedMs": self.simulated_ms,
+            "ticks": self.num_ticks,
+            "intents": self.num_intents,
+            "notifications": self.num_notifications,
+            "reportEvents": self.num_report_events,
+            "reportFiles": self.num_report_files,
+            "cpuUs": self.tick_cpu.total_ns // 1000,
+            "tickCpu": self.tick_cpu.get_as_json(),
+        }
+
+
+class SoakHarness:
+    """Runs Sandman headless against a simulated clock.
+
+    GPIO runs in non-live mode and MQTT goes through a loopback client, so
+    nothing outside the process is touched apart from the base directory.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        start_time: whenever.ZonedDateTime,
+        log_level: int = logging.WARNING,
+    ) -> None:
+        """Initialize the instance.
+
+        base_dir - Where Sandman keeps its configs and reports.
+        start_time - When the simulation starts.
+        log_level - The level of Sandman's logging during the simulation.
+            Logging every event is slow when simulating weeks.
+        """
+        self.__base_dir = base_dir
+        self.__log_level = log_level
+        self.__clock = time_util.SimulatedClock(start_time.to_instant())
+        timer = time_util.SimulatedTimer(self.__clock)
+        self.__loopback_client = LoopbackClient()
+        self.__mqtt_client = mqtt.MQTTClient(
+            timer=timer, client_factory=lambda: self.__loopback_client
+        )
+        self.__app = sandman.Sandman(
+            timer,
+            time_util.SimulatedTimeSource(self.__clock),
+            gpio.GPIOManager(is_live_mode=False),
+            self.__mqtt_client,
+        )
+        # Scripted intents ordered by when they're due. The sequence number
+        # keeps intents due at the same time in the order they were added.
+        self.__script: list[tuple[int, int, ScriptedIntent]] = []
+        self.__next_sequence = 0
+        self.__is_started = False
+
+    @property
+    def clock(self) -> time_util.SimulatedClock:
+        """Get the simulated clock."""
+        return self.__clock
+
+    @property
+    def loopback_client(self) -> LoopbackClient:
+        """Get the stand-in for the broker."""
+        return self.__loopback_client
+
+    @property
+    def app(self) -> sandman.Sandman:
+        """Get the app being simulated."""
+        return self.__app
+
+    def add_intent(self, intent: ScriptedIntent) -> None:
+        """Add an intent to deliver during the simulation."""
+        self.__push_intent(intent.time_ms * 1000000, intent)
+
+    def start(self) -> bool:
+        """Initialize and start Sandman.
+
+        Returns whether Sandman started.
+        """
+        options = {"BASE_DIR": self.__base_dir, "SERVE_METRICS": False}
+
+        if self.__app.initialize(options) == False:
+            return False
+
+        logging.getLogger("sandman").setLevel(self.__log_level)
+
+        self.__app.start()
+
+        if self.__mqtt_client.connect() == False:
+            self.__app.stop()
+            return False
+
+        self.__is_started = True
+        return True
+
+    def stop(self) -> None:
+        """Stop Sandman."""
+        if self.__is_started == False:
+            return
+
+        self.__mqtt_client.stop()
+        self.__app.stop()
+        self.__is_started = False
+
+    def run_for_ms(self, duration_ms: int) -> SoakResults:
+        """Run the simulation for a duration of simulated time.
+
+        Raises RuntimeError if Sandman keeps processing without the clock
+        moving.
+        """
+        if self.__is_started == False:
+            raise RuntimeError("The harness must be started first.")
+
+        results = SoakResults(simulated_ms=duration_ms)
+        end_time = self.__clock.elapsed_ns + (duration_ms * 1000000)
+        num_ticks_without_progress = 0
+
+        while True:
+            current_time = self.__clock.elapsed_ns
+            start_cpu_ns = time.process_time_ns()
+
+            results.num_intents += self.__deliver_due_intents(current_time)
+            self.__app.process()
+
+            results.tick_cpu.record(time.process_time_ns() - start_cpu_ns)
+            results.num_ticks += 1
+
+            next_time = self.__get_next_time()
+
+            if (next_time is None) or (next_time > end_time):
+                self.__clock.advance_to(end_time)
+                break
+
+            if next_time > current_time:
+                self.__clock.advance_to(next_time)
+                num_ticks_without_progress = 0
+                continue
+
+            num_ticks_without_progress += 1
+
+            if num_ticks_without_progress >= _MAX_TICKS_WITHOUT_PROGRESS:
+                raise RuntimeError("The simulation stopped making progress.")
+
+        self.__app.metrics.collect()
+        results.num_notifications = int(
+            _get_counter_value(
+                self.__app.metrics, "sandman_notifications_published_total"
+            )
+        )
+        results.num_report_events = int(
+            _get_counter_value(
+                self.__app.metrics, "sandman_report_events_written_total"
+            )
+        )
+        results.num_report_files = len(
+            list(
+                pathlib.Path(self.__base_dir + "reports/").glob(
+                    "sandman*.rp[ta]"
+                )
+            )
+        )
+
+        _logger.info(
+            "Simulated %d ms in %d ticks, using %d us of CPU.",
+            duration_ms,
+            results.num_ticks,
+            results.tick_cpu.total_ns // 1000,
+        )
+        return results
+
+    def __push_intent(self, due_time: int, intent: ScriptedIntent) -> None:
+        """Add an intent to be delivered at a point in time."""
+        heapq.heappush(self.__script, (due_time, self.__next_sequence, intent))
+        self.__next_sequence += 1
+
+    def __deliver_due_intents(self, current_time: int) -> int:
+        """Deliver the intents that are due.
+
+        Returns the number of intents delivered.
+        """
+        num_delivered = 0
+
+        while (len(self.__script) > 0) and (
+            self.__script[0][0] <= current_time
+        ):
+            due_time, _sequence, intent = heapq.heappop(self.__script)
+            self.__loopback_client.deliver_intent(
+                intent.intent_name, intent.slots
+            )
+            num_delivered += 1
+
+            if intent.repeat_interval_ms > 0:
+                self.__push_intent(
+                    due_time + (intent.repeat_interval_ms * 1000000), intent
+                )
+
+        return num_delivered
+
+    def __get_next_time(self) -> int | None:
+        """Get when the next deadline or scripted intent is due."""
+        next_time = self.__app.get_next_deadline()
+
+        if len(self.__script) > 0:
+            next_intent_time = self.__script[0][0]
+
+            if (next_time is None) or (next_intent_time < next_time):
+                next_time = next_intent_time
+
+        return next_time
+
+
+def _get_counter_value(registry: metrics.Registry, name: str) -> float:
+    """Get the value of a counter without labels."""
+    metric = registry.get_metric(name)
+
+    if type(metric) is not metrics.Counter:
+        return 0
+
+    return metric.get_value()
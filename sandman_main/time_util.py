@@ -1,5 +1,7 @@
 """Useful things for dealing with time."""
 
+import collections.abc
+import heapq
 import time
 import zoneinfo
 
@@ -23,6 +25,168 @@ class Timer:
         return (current_time_ns - other_time) // 1000000
 
 
+class SimulatedClock:
+    """A clock that only moves when it's told to.
+
+    A simulated timer and time source share a clock, so a run that covers days
+    of deadlines can skip straight from one deadline to the next.
+    """
+
+    def __init__(self, start_time: whenever.Instant) -> None:
+        """Initialize the instance.
+
+        start_time - The time the clock starts at.
+        """
+        self.__start_time = start_time
+        self.__elapsed_ns = 0
+
+    @property
+    def elapsed_ns(self) -> int:
+        """Get how far the clock has moved since it started."""
+        return self.__elapsed_ns
+
+    def get_current_instant(self) -> whenever.Instant:
+        """Get the current time."""
+        return self.__start_time.add(nanoseconds=self.__elapsed_ns)
+
+    def advance_ns(self, duration_ns: int) -> None:
+        """Move the clock forward."""
+        if duration_ns < 0:
+            raise ValueError("The clock cannot move backward.")
+
+        self.__elapsed_ns += duration_ns
+
+    def advance_to(self, elapsed_ns: int) -> None:
+        """Move the clock forward to a time since it started."""
+        self.advance_ns(elapsed_ns - self.__elapsed_ns)
+
+
+class SimulatedTimer(Timer):
+    """A timer that reads a simulated clock.
+
+    Points in time are the time since the clock started.
+    """
+
+    def __init__(self, clock: SimulatedClock) -> None:
+        """Initialize the instance."""
+        super().__init__()
+        self.__clock = clock
+
+    def get_current_time(self) -> int:
+        """Get the current point in time."""
+        return self.__clock.elapsed_ns
+
+
+class Scheduler:
+    """Tracks deadlines so that only expired ones need to be handled.
+
+    Deadlines are points in time from the associated timer. They are kept in a
+    min-heap, so finding the next deadline is cheap and handling expired
+    deadlines only costs time for the ones that actually expired.
+    """
+
+    def __init__(self, timer: Timer) -> None:
+        """Initialize the instance."""
+        self.__timer = timer
+        self.__heap: list[
+            tuple[int, int, collections.abc.Callable[[], None]]
+        ] = []
+        self.__next_handle = 0
+        # Cancelled deadlines are removed from the heap lazily when they reach
+        # the top, so this tracks which ones are still pending.
+        self.__pending_handles: set[int] = set()
+
+    @property
+    def num_pending(self) -> int:
+        """Get the number of deadlines that are waiting to expire."""
+        return len(self.__pending_handles)
+
+    def schedule(
+        self, deadline: int, callback: collections.abc.Callable[[], None]
+    ) -> int:
+        """Schedule a callback for when a deadline expires.
+
+        Returns a handle that can be used to cancel the deadline.
+        """
+        handle = self.__next_handle
+        self.__next_handle += 1
+
+        heapq.heappush(self.__heap, (deadline, handle, callback))
+        self.__pending_handles.add(handle)
+
+        # Rebuild the heap if cancelled deadlines are taking up most of it.
+        if len(self.__heap) > (2 * len(self.__pending_handles)) + 64:
+            self.__heap = [
+                entry
+                for entry in self.__heap
+                if entry[1] in self.__pending_handles
+            ]
+            heapq.heapify(self.__heap)
+
+        return handle
+
+    def schedule_after_ms(
+        self, duration_ms: int, callback: collections.abc.Callable[[], None]
+    ) -> int:
+        """Schedule a callback for a duration after the current time.
+
+        Returns a handle that can be used to cancel the deadline.
+        """
+        deadline = self.__timer.get_current_time() + (duration_ms * 1000000)
+        return self.schedule(deadline, callback)
+
+    def cancel(self, handle: int) -> None:
+        """Cancel a deadline so that its callback is never called.
+
+        Cancelling a deadline that already expired does nothing.
+        """
+        self.__pending_handles.discard(handle)
+
+    def get_next_deadline(self) -> int | None:
+        """Get the earliest pending deadline.
+
+        Returns None if there are no pending deadlines.
+        """
+        self.__discard_cancelled()
+
+        if len(self.__heap) == 0:
+            return None
+
+        return self.__heap[0][0]
+
+    def process(self) -> int:
+        """Call the callbacks for all of the expired deadlines.
+
+        Returns the number of callbacks that were called.
+        """
+        current_time = self.__timer.get_current_time()
+        num_expired = 0
+
+        while True:
+            self.__discard_cancelled()
+
+            if len(self.__heap) == 0:
+                break
+
+            if self.__heap[0][0] > current_time:
+                break
+
+            _deadline, handle, callback = heapq.heappop(self.__heap)
+            self.__pending_handles.remove(handle)
+            num_expired += 1
+            callback()
+
+        return num_expired
+
+    def __discard_cancelled(self) -> None:
+        """Discard any cancelled deadlines at the top of the heap."""
+        while len(self.__heap) > 0:
+            if self.__heap[0][1] in self.__pending_handles:
+                return
+
+            heapq.heappop(self.__heap)
+
+
 class TimeSource:
     """An interface for getting the current time."""
 
@@ -49,3 +213,18 @@ class TimeSource:
         time_zone_name = self.get_time_zone_name()
         global_time = whenever.Instant.now()
         return global_time.to_tz(time_zone_name)
+
+
+class SimulatedTimeSource(TimeSource):
+    """A time source that reads a simulated clock."""
+
+    def __init__(self, clock: SimulatedClock) -> None:
+        """Initialize the instance."""
+        super().__init__()
+        self.__clock = clock
+
+    def get_current_time(self) -> whenever.ZonedDateTime:
+        """Get the current time in the current time zone."""
+        return self.__clock.get_current_instant().to_tz(
+            self.get_time_zone_name()
+        )
@@ -0,0 +1,74 @@
+"""Tests the benchmark harness and the benchmarks themselves."""
+
+import json
+import pathlib
+
+import pytest
+
+import benchmarks.bench_commands  # noqa: F401
+import benchmarks.bench_controls  # noqa: F401
+import benchmarks.bench_gpio  # noqa: F401
+import benchmarks.bench_reports  # noqa: F401
+import benchmarks.bench_routines  # noqa: F401
+import benchmarks.harness as harness
+
+
+def test_benchmarks_run() -> None:
+    """Test that every benchmark runs at its smallest size."""
+    benches = harness.get_benchmarks()
+    assert len(benches) > 0
+
+    for bench in benches:
+        size = min(bench.sizes)
+        result = harness.run_benchmark(
+            bench, size, num_rounds=1, min_round_ns=0
+        )
+        assert result.name == bench.get_name_for_size(size)
+        assert result.ns_per_op > 0
+        assert result.ops_per_round > 0
+
+
+def test_results_and_baseline(tmp_path: pathlib.Path) -> None:
+    """Test saving results and comparing them against a baseline."""
+    results = [
+        harness.BenchmarkResult("fast[1]", 100, 90, 1000),
+        harness.BenchmarkResult("slow[1]", 200, 150, 1000),
+        harness.BenchmarkResult("new[1]", 50, 50, 1000),
+    ]
+    assert results[0].ops_per_sec == 10000000
+
+    results_file = str(tmp_path / "results.json")
+    harness.save_results(results[0:2], results_file)
+    baseline = harness.load_baseline(results_file)
+    assert baseline == {"fast[1]": 100, "slow[1]": 200}
+
+    # Benchmarks that aren't in the baseline aren't compared.
+    slower_results = [
+        harness.BenchmarkResult("fast[1]", 120, 110, 1000),
+        harness.BenchmarkResult("slow[1]", 300, 280, 1000),
+        results[2],
+    ]
+    comparisons = harness.compare(slower_results, baseline)
+    assert [comparison.name for comparison in comparisons] == [
+        "fast[1]",
+        "slow[1]",
+    ]
+
+    assert comparisons[0].ratio == pytest.approx(1.2)
+    assert comparisons[0].is_regression(0.25) == False
+    assert comparisons[1].ratio == pytest.approx(1.5)
+    assert comparisons[1].is_regression(0.25) == True
+    assert comparisons[1].is_regression(0.5) == False
+
+    # Files that aren't results can't be used as a baseline.
+    for invalid_json in [
+        {"benchmarks": {}},
+        {"version": 0, "benchmarks": {}},
+        {"version": harness.RESULTS_VERSION, "benchmarks": []},
+        {"version": harness.RESULTS_VERSION, "benchmarks": {"a": {}}},
+    ]:
+        with open(results_file, "w") as file:
+            json.dump(invalid_json, file)
+
+        with pytest.raises(ValueError):
+            harness.load_baseline(results_file)
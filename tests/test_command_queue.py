@@ -0,0 +1,112 @@
+"""Tests the command queue."""
+
+import pytest
+
+import sandman_main.command_queue as command_queue
+import sandman_main.commands as commands
+
+_Action = commands.ControlCommand.Action
+_Policy = command_queue.CommandQueue.OverflowPolicy
+
+
+def _move(name: str, action: _Action) -> commands.ControlCommand:
+    """Make a move command."""
+    return commands.ControlCommand(name, action, "test")
+
+
+def test_command_queue_drop_oldest() -> None:
+    """Test dropping the oldest commands when the queue is full."""
+    with pytest.raises(ValueError):
+        command_queue.CommandQueue(0)
+
+    queue = command_queue.CommandQueue(2, _Policy.DROP_OLDEST)
+    assert queue.capacity == 2
+    assert queue.overflow_policy == _Policy.DROP_OLDEST
+    assert queue.drain() == []
+
+    first = _move("legs", _Action.MOVE_UP)
+    second = _move("legs", _Action.MOVE_DOWN)
+    third = commands.StatusCommand()
+    assert queue.push(first) == True
+    assert queue.push(second) == True
+    assert queue.depth == 2
+
+    # Moves aren't coalesced with this policy.
+    assert queue.num_coalesced == 0
+
+    assert queue.push(third) == True
+    assert queue.num_dropped == 1
+    assert queue.max_depth == 2
+    assert queue.drain() == [second, third]
+    assert queue.depth == 0
+
+
+def test_command_queue_drop_newest() -> None:
+    """Test dropping new commands when the queue is full."""
+    queue = command_queue.CommandQueue(2, _Policy.DROP_NEWEST)
+
+    first = commands.StatusCommand()
+    second = commands.RoutineCommand(
+        "test", commands.RoutineCommand.Action.START
+    )
+    assert queue.push(first) == True
+    assert queue.push(second) == True
+    assert queue.push(commands.StatusCommand()) == False
+    assert queue.push(commands.StatusCommand()) == False
+    assert queue.num_dropped == 2
+    assert queue.drain() == [first, second]
+
+    # There's room again after draining.
+    assert queue.push(first) == True
+    assert queue.drain() == [first]
+
+
+def test_command_queue_coalesce() -> None:
+    """Test coalescing move commands for the same control."""
+    queue = command_queue.CommandQueue(4)
+    assert queue.overflow_policy == _Policy.COALESCE
+
+    legs_up = _move("legs", _Action.MOVE_UP)
+    back_up = _move("back", _Action.MOVE_UP)
+    back_down = _move("back", _Action.MOVE_DOWN)
+    legs_lock = _move("legs", _Action.LOCK)
+    all_unlock = _move("all", _Action.UNLOCK)
+    legs_down = _move("legs", _Action.MOVE_DOWN)
+
+    # The newer move replaces the older one and goes to the back.
+    assert queue.push(legs_up) == True
+    assert queue.push(back_up) == True
+    assert queue.push(legs_down) == True
+    assert queue.num_coalesced == 1
+    assert queue.num_dropped == 0
+    assert queue.drain() == [back_up, legs_down]
+
+    # Moves aren't coalesced across a lock or unlock for the same control,
+    # since the earlier move happens before the control is locked.
+    assert queue.push(legs_up) == True
+    assert queue.push(legs_lock) == True
+    assert queue.push(legs_down) == True
+    assert queue.num_coalesced == 1
+    assert queue.drain() == [legs_up, legs_lock, legs_down]
+
+    assert queue.push(back_up) == True
+    assert queue.push(legs_up) == True
+    assert queue.push(all_unlock) == True
+    assert queue.push(back_down) == True
+    assert queue.num_coalesced == 1
+    assert queue.drain() == [back_up, legs_up, all_unlock, back_down]
+
+    # Locks for other controls don't get in the way.
+    assert queue.push(back_up) == True
+    assert queue.push(legs_lock) == True
+    assert queue.push(back_down) == True
+    assert queue.num_coalesced == 2
+    assert queue.drain() == [legs_lock, back_down]
+
+    # Other commands are never coalesced, so the oldest is dropped.
+    for _ in range(5):
+        assert queue.push(legs_lock) == True
+
+    assert queue.num_coalesced == 2
+    assert queue.num_dropped == 1
+    assert queue.depth == 4
@@ -1,5 +1,7 @@
 """Tests commands."""
 
+import typing
+
 import sandman_main.commands as commands
 
 
@@ -365,3 +367,70 @@ def test_control_routine_intents() -> None:
     assert isinstance(command, commands.RoutineCommand)
     assert command.routine_name == "wake"
     assert command.action == commands.RoutineCommand.Action.STOP
+
+
+def _make_intent(
+    intent_name: str, slots: dict[str, str]
+) -> dict[str, typing.Any]:
+    """Make an intent with string slots."""
+    return {
+        "intent": {"intentName": intent_name},
+        "slots": [
+            {"slotName": name, "value": {"value": value}}
+            for name, value in slots.items()
+        ],
+    }
+
+
+def test_intent_parser_names() -> None:
+    """Test checking names in intents against the loaded names."""
+    parser = commands.IntentParser()
+
+    # Without names, any name is accepted.
+    move_intent = _make_intent("MovePart", {"name": "cat", "direction": "up"})
+    assert isinstance(parser.parse(move_intent), commands.ControlCommand)
+
+    routine_intent = _make_intent(
+        "ControlRoutine", {"name": "nap", "action": "start"}
+    )
+    assert isinstance(parser.parse(routine_intent), commands.RoutineCommand)
+
+    # Only the loaded names are accepted and commands use the loaded strings.
+    legs_name = "".join(["le", "gs"])
+    parser.set_control_names(["back", legs_name])
+    parser.set_routine_names(["sleep"])
+    assert parser.parse(move_intent) is None
+    assert parser.parse(routine_intent) is None
+
+    command = parser.parse(
+        _make_intent("MovePart", {"name": "legs", "direction": "down"})
+    )
+    assert isinstance(command, commands.ControlCommand)
+    assert command.control_name is legs_name
+    assert command.action == commands.ControlCommand.Action.MOVE_DOWN
+
+    command = parser.parse(
+        _make_intent("ControlRoutine", {"name": "sleep", "action": "stop"})
+    )
+    assert isinstance(command, commands.RoutineCommand)
+    assert command.routine_name == "sleep"
+    assert command.action == commands.RoutineCommand.Action.STOP
+
+    # All controls can be locked, but not moved.
+    command = parser.parse(
+        _make_intent("LockControl", {"name": "all", "action": "lock"})
+    )
+    assert isinstance(command, commands.ControlCommand)
+    assert command.control_name == "all"
+    assert (
+        parser.parse(
+            _make_intent("MovePart", {"name": "all", "direction": "up"})
+        )
+        is None
+    )
+
+    # The status intent doesn't have any names.
+    assert isinstance(
+        parser.parse({"intent": {"intentName": "GetStatus"}}),
+        commands.StatusCommand,
+    )
@@ -0,0 +1,111 @@
+"""Tests caching configs."""
+
+import os
+import pathlib
+
+import sandman_main.config_cache as config_cache
+import sandman_main.controls as controls
+import sandman_main.routines as routines
+
+
+def _load_controls(
+    cache: config_cache.ConfigCache, control_path: pathlib.Path
+) -> dict[str, controls.ControlConfig | None]:
+    """Load all of the control configs in a directory through the cache."""
+    filenames = sorted(str(path) for path in control_path.glob("*.ctl"))
+    loaded = cache.load_files(
+        filenames,
+        controls.ControlConfig.parse_from_file,
+        controls.ControlConfig.load_from_json,
+    )
+    return {pathlib.Path(name).stem: config for name, config in loaded}
+
+
+def test_config_cache(tmp_path: pathlib.Path) -> None:
+    """Test that only changed configs are parsed."""
+    base_dir = str(tmp_path) + "/"
+    control_path = tmp_path / "controls"
+    cache_filename = str(tmp_path / "config_cache.json")
+
+    controls.bootstrap_controls(base_dir)
+    (control_path / "invalid.ctl").write_text("{}")
+
+    # Everything is parsed the first time.
+    cache = config_cache.ConfigCache(cache_filename)
+    cache.load()
+    first_configs = _load_controls(cache, control_path)
+    assert cache.num_hits == 0
+    assert cache.num_misses == 4
+    assert first_configs["invalid"] is None
+
+    cache.save()
+    assert pathlib.Path(cache_filename).exists() == True
+
+    # Nothing is parsed the next time, and the configs are the same.
+    cache = config_cache.ConfigCache(cache_filename)
+    cache.load()
+    assert _load_controls(cache, control_path) == first_configs
+    assert cache.num_hits == 4
+    assert cache.num_misses == 0
+
+    # Only changed files are parsed.
+    legs_file = str(control_path / "legs.ctl")
+    legs_config = controls.ControlConfig.parse_from_file(legs_file)
+    legs_config.moving_duration_ms = 1234
+    legs_config.save_to_file(legs_file)
+    stats = os.stat(legs_file)
+    os.utime(legs_file, ns=(stats.st_atime_ns, stats.st_mtime_ns + 1000))
+
+    cache = config_cache.ConfigCache(cache_filename)
+    cache.load()
+    configs = _load_controls(cache, control_path)
+    assert cache.num_hits == 3
+    assert cache.num_misses == 1
+    assert configs["legs"] == legs_config
+
+    # Removed files are forgotten.
+    pathlib.Path(legs_file).unlink()
+    cache.save()
+
+    cache = config_cache.ConfigCache(cache_filename)
+    cache.load()
+    configs = _load_controls(cache, control_path)
+    assert "legs" not in configs
+    assert cache.num_hits == 3
+
+    # Invalid cache files are ignored.
+    pathlib.Path(cache_filename).write_text("[")
+    cache = config_cache.ConfigCache(cache_filename)
+    cache.load()
+    assert _load_controls(cache, control_path)["back"] is not None
+    assert cache.num_misses == 3
+
+
+def test_config_cache_routines(tmp_path: pathlib.Path) -> None:
+    """Test loading routine descriptions through the cache."""
+    base_dir = str(tmp_path) + "/"
+    routines.bootstrap_routines(base_dir)
+
+    desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_catch_up_skip.rtn"
+    )
+    desc.save_to_file(str(tmp_path / "routines" / "test.rtn"))
+
+    for expected_hits in (0, 2):
+        cache = config_cache.ConfigCache(base_dir + "config_cache.json")
+        cache.load()
+
+        filenames = sorted(
+            str(path) for path in (tmp_path / "routines").glob("*.rtn")
+        )
+        loaded = cache.load_files(
+            filenames,
+            routines.RoutineDesc.parse_from_file,
+            routines.RoutineDesc.load_from_json,
+        )
+        cache.save()
+
+        assert cache.num_hits == expected_hits
+        assert loaded[0][1] is not None
+        assert loaded[0][1].name == "sleep"
+        assert loaded[1][1] == desc
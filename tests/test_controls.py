@@ -10,6 +10,7 @@ import sandman_main.commands as commands
 import sandman_main.controls as controls
 import sandman_main.gpio as gpio
 import sandman_main.reports as reports
+import sandman_main.time_util as time_util
 import tests.test_time_util as test_time_util
 
 _default_name = ""
@@ -872,6 +873,55 @@ def test_control_cool_down() -> None:
     gpio_manager.uninitialize()
 
 
+def test_control_next_deadline() -> None:
+    """Test when a control next needs processing."""
+    timer = test_time_util.TestTimer()
+    gpio_manager = gpio.GPIOManager(is_live_mode=False)
+    gpio_manager.initialize()
+
+    moving_duration_ms = 10
+    cool_down_duration_ms = 5
+    control = controls.Control("test_next_deadline", timer, gpio_manager)
+    control.initialize(
+        up_gpio_line=1,
+        down_gpio_line=2,
+        moving_duration_ms=moving_duration_ms,
+        cool_down_duration_ms=cool_down_duration_ms,
+    )
+
+    # An idle control doesn't need processing.
+    assert control.next_deadline is None
+
+    notification_list: list[str] = []
+    control.set_desired_state(
+        notification_list, controls.Control.State.MOVE_UP
+    )
+    timer.set_current_time_ms(3)
+    control.process(notification_list)
+    assert control.state == controls.Control.State.MOVE_UP
+    assert control.next_deadline == (3 + moving_duration_ms) * 1000000
+
+    # Processing before the deadline doesn't change it.
+    timer.set_current_time_ms(5)
+    control.process(notification_list)
+    assert control.next_deadline == (3 + moving_duration_ms) * 1000000
+
+    timer.set_current_time_ms(3 + moving_duration_ms)
+    control.process(notification_list)
+    assert control.state == controls.Control.State.COOL_DOWN
+    assert control.next_deadline == (
+        (3 + moving_duration_ms + cool_down_duration_ms) * 1000000
+    )
+
+    timer.set_current_time_ms(3 + moving_duration_ms + cool_down_duration_ms)
+    control.process(notification_list)
+    assert control.state == controls.Control.State.IDLE
+    assert control.next_deadline is None
+
+    assert control.uninitialize() == True
+    gpio_manager.uninitialize()
+
+
 def test_control_no_desired_cool_down() -> None:
     """Test that we cannot set cool down as a desired state."""
     gpio_manager = gpio.GPIOManager(is_live_mode=False)
@@ -1134,6 +1184,7 @@ def test_control_manager(tmp_path: pathlib.Path) -> None:
 
     control_manager.initialize("tests/data/controls/manager_duplicate/")
     assert control_manager.num_controls == 2
+    assert sorted(control_manager.get_names()) == ["back", "legs"]
     states = control_manager.get_states()
     _check_control_state(states, "back", controls.Control.State.IDLE)
     _check_control_state(states, "legs", controls.Control.State.IDLE)
@@ -1558,6 +1609,325 @@ def test_control_manager(tmp_path: pathlib.Path) -> None:
     _check_control_lock_state(lock_states, "elevation", False)
 
 
+def test_control_manager_scheduler(tmp_path: pathlib.Path) -> None:
+    """Test the control manager when it uses a scheduler."""
+    timer = test_time_util.TestTimer()
+    scheduler = time_util.Scheduler(timer)
+
+    gpio_manager = gpio.GPIOManager(is_live_mode=False)
+    gpio_manager.initialize()
+
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(time_source, str(tmp_path) + "/")
+
+    controls.bootstrap_controls(str(tmp_path) + "/")
+
+    control_manager = controls.ControlManager(
+        timer, gpio_manager, report_manager, scheduler
+    )
+    control_manager.initialize(str(tmp_path) + "/")
+    assert control_manager.num_controls == 3
+
+    # Idle controls don't have any deadlines.
+    notification_list: list[str] = []
+    control_manager.process_controls(notification_list)
+    assert len(notification_list) == 0
+    assert scheduler.num_pending == 0
+
+    # Commanded controls are processed right away.
+    command = commands.ControlCommand(
+        "elevation", commands.ControlCommand.Action.MOVE_UP, "test"
+    )
+    assert control_manager.process_command(notification_list, command) == True
+    control_manager.process_controls(notification_list)
+    assert notification_list == ["Raising the elevation."]
+    _check_control_state(
+        control_manager.get_states(),
+        "elevation",
+        controls.Control.State.MOVE_UP,
+    )
+    assert scheduler.num_pending == 1
+    assert scheduler.get_next_deadline() == 4000 * 1000000
+
+    # The control isn't processed again until its deadline has expired.
+    timer.set_current_time_ms(4000)
+    notification_list = []
+    control_manager.process_controls(notification_list)
+    assert len(notification_list) == 0
+    _check_control_state(
+        control_manager.get_states(),
+        "elevation",
+        controls.Control.State.MOVE_UP,
+    )
+
+    assert scheduler.process() == 1
+    control_manager.process_controls(notification_list)
+    assert notification_list == ["elevation stopped."]
+    _check_control_state(
+        control_manager.get_states(),
+        "elevation",
+        controls.Control.State.COOL_DOWN,
+    )
+    assert scheduler.get_next_deadline() == 4025 * 1000000
+
+    timer.set_current_time_ms(4025)
+    assert scheduler.process() == 1
+    control_manager.process_controls(notification_list)
+    _check_control_state(
+        control_manager.get_states(),
+        "elevation",
+        controls.Control.State.IDLE,
+    )
+    assert scheduler.num_pending == 0
+
+    # Uninitializing cancels any deadlines.
+    command = commands.ControlCommand(
+        "back", commands.ControlCommand.Action.MOVE_DOWN, "test"
+    )
+    assert control_manager.process_command(notification_list, command) == True
+    control_manager.process_controls(notification_list)
+    assert scheduler.num_pending == 1
+
+    control_manager.uninitialize()
+    assert scheduler.num_pending == 0
+    gpio_manager.uninitialize()
+
+
+def test_control_manager_traces(tmp_path: pathlib.Path) -> None:
+    """Test tracing commands until they reach GPIO."""
+    timer = test_time_util.TestTimer()
+
+    gpio_manager = gpio.GPIOManager(is_live_mode=False)
+    gpio_manager.initialize()
+
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(time_source, str(tmp_path) + "/")
+
+    controls.bootstrap_controls(str(tmp_path) + "/")
+
+    control_manager = controls.ControlManager(
+        timer, gpio_manager, report_manager
+    )
+    control_manager.initialize(str(tmp_path) + "/")
+
+    trace = commands.CommandTrace(7, 1000000, dequeued_time=3000000)
+    command = commands.ControlCommand(
+        "back", commands.ControlCommand.Action.MOVE_UP, "voice", trace
+    )
+
+    timer.set_current_time_ms(10)
+    notification_list: list[str] = []
+    assert control_manager.process_command(notification_list, command) == True
+    assert trace.dispatched_time == 10000000
+    assert control_manager.pop_completed_traces() == []
+
+    timer.set_current_time_ms(12)
+    control_manager.process_controls(notification_list)
+    assert control_manager.pop_completed_traces() == [trace]
+    assert control_manager.pop_completed_traces() == []
+    assert trace.get_stage_durations_ns() == {
+        "receiveToDequeue": 2000000,
+        "dequeueToDispatch": 7000000,
+        "dispatchToGpio": 2000000,
+        "receiveToGpio": 11000000,
+    }
+
+    # A command that doesn't change anything never reaches GPIO.
+    other_trace = commands.CommandTrace(8, 13000000, 13000000)
+    command = commands.ControlCommand(
+        "back", commands.ControlCommand.Action.MOVE_UP, "voice", other_trace
+    )
+    assert control_manager.process_command(notification_list, command) == True
+    control_manager.process_controls(notification_list)
+    assert control_manager.pop_completed_traces() == []
+    assert other_trace.gpio_time is None
+
+    # A traced move is dropped with the command if it arrives during the cool
+    # down.
+    timer.set_current_time_ms(30000)
+    control_manager.process_controls(notification_list)
+    _check_control_state(
+        control_manager.get_states(), "back", controls.Control.State.COOL_DOWN
+    )
+
+    later_trace = commands.CommandTrace(9, 30000000000, 30000000000)
+    command = commands.ControlCommand(
+        "back", commands.ControlCommand.Action.MOVE_DOWN, "voice", later_trace
+    )
+    assert control_manager.process_command(notification_list, command) == True
+
+    timer.set_current_time_ms(60000)
+    control_manager.process_controls(notification_list)
+    _check_control_state(
+        control_manager.get_states(), "back", controls.Control.State.IDLE
+    )
+    assert control_manager.pop_completed_traces() == []
+    assert later_trace.gpio_time is None
+
+    assert control_manager.get_transition_counts() == {
+        ("back", "move up"): 1,
+        ("back", "cool down"): 1,
+        ("back", "idle"): 1,
+    }
+
+
+def test_control_manager_reload(tmp_path: pathlib.Path) -> None:
+    """Test applying control config changes while running."""
+    base_dir = str(tmp_path) + "/"
+    control_path = tmp_path / "controls"
+    timer = test_time_util.TestTimer()
+
+    gpio_manager = gpio.GPIOManager(is_live_mode=False)
+    gpio_manager.initialize()
+
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(time_source, base_dir)
+
+    controls.bootstrap_controls(base_dir)
+
+    control_manager = controls.ControlManager(
+        timer, gpio_manager, report_manager
+    )
+    control_manager.initialize(base_dir)
+    assert control_manager.num_controls == 3
+
+    legs_file = str(control_path / "legs.ctl")
+    legs_config = controls.ControlConfig.parse_from_file(legs_file)
+
+    # Unchanged configs leave everything alone.
+    control_manager.reload_config_file(legs_file)
+    assert control_manager.num_controls == 3
+
+    # Changing only durations keeps the lines and the control's state.
+    notification_list: list[str] = []
+    command = commands.ControlCommand(
+        "legs", commands.ControlCommand.Action.MOVE_UP, "test"
+    )
+    control_manager.process_command(notification_list, command)
+    control_manager.process_controls(notification_list)
+
+    legs_config.moving_duration_ms = 1000
+    legs_config.save_to_file(legs_file)
+    control_manager.reload_config_file(legs_file)
+    _check_control_state(
+        control_manager.get_states(), "legs", controls.Control.State.MOVE_UP
+    )
+
+    # The control stops moving after the new duration.
+    timer.set_current_time_ms(1000)
+    control_manager.process_controls(notification_list)
+    _check_control_state(
+        control_manager.get_states(), "legs", controls.Control.State.COOL_DOWN
+    )
+
+    # Changing lines recreates the control on the new lines, and it stays
+    # locked.
+    lock_command = commands.ControlCommand(
+        "legs", commands.ControlCommand.Action.LOCK, "test"
+    )
+    control_manager.process_command(notification_list, lock_command)
+
+    legs_config.up_gpio_line = 6
+    legs_config.save_to_file(legs_file)
+    control_manager.reload_config_file(legs_file)
+    _check_control_state(
+        control_manager.get_states(), "legs", controls.Control.State.IDLE
+    )
+    assert control_manager.get_lock_states()["legs"] == True
+    assert 6 in gpio_manager.acquired_lines
+    assert 13 not in gpio_manager.acquired_lines
+
+    # Renaming a control to a name that's taken leaves it alone.
+    legs_config.name = "back"
+    legs_config.up_gpio_line = 11
+    legs_config.save_to_file(legs_file)
+    control_manager.reload_config_file(legs_file)
+    assert sorted(control_manager.get_names()) == ["back", "elevation", "legs"]
+    assert 6 in gpio_manager.acquired_lines
+    assert 11 not in gpio_manager.acquired_lines
+
+    # If the new lines can't be acquired, the control keeps its old ones.
+    legs_config.name = "legs"
+    legs_config.up_gpio_line = 20
+    legs_config.save_to_file(legs_file)
+    control_manager.reload_config_file(legs_file)
+    assert control_manager.num_controls == 3
+    assert control_manager.get_lock_states()["legs"] == True
+    assert sorted(gpio_manager.acquired_lines) == [5, 6, 16, 19, 20, 26]
+
+    # The old control still works.
+    control_manager.process_command(
+        notification_list,
+        commands.ControlCommand(
+            "legs", commands.ControlCommand.Action.UNLOCK, "test"
+        ),
+    )
+    control_manager.process_command(notification_list, command)
+    control_manager.process_controls(notification_list)
+    _check_control_state(
+        control_manager.get_states(), "legs", controls.Control.State.MOVE_UP
+    )
+
+    # A moving control that keeps its old lines was stopped by releasing
+    # them, so it goes back to idle.
+    control_manager.reload_config_file(legs_file)
+    assert control_manager.num_controls == 3
+    assert control_manager.get_lock_states()["legs"] == False
+    _check_control_state(
+        control_manager.get_states(), "legs", controls.Control.State.IDLE
+    )
+
+    notification_list = []
+    timer.set_current_time_ms(10000)
+    control_manager.process_controls(notification_list)
+    assert notification_list == []
+    _check_control_state(
+        control_manager.get_states(), "legs", controls.Control.State.IDLE
+    )
+
+    legs_config.up_gpio_line = 6
+    legs_config.save_to_file(legs_file)
+
+    # Invalid configs are ignored.
+    with open(legs_file, "w") as file:
+        file.write("{}")
+
+    control_manager.reload_config_file(legs_file)
+    assert control_manager.num_controls == 3
+    assert 6 in gpio_manager.acquired_lines
+
+    # Configs can be added and deleted.
+    feet_file = str(control_path / "feet.ctl")
+    feet_config = controls.ControlConfig()
+    feet_config.name = "feet"
+    feet_config.up_gpio_line = 7
+    feet_config.down_gpio_line = 8
+    feet_config.moving_duration_ms = 100
+    feet_config.save_to_file(feet_file)
+
+    control_manager.reload_config_file(feet_file)
+    assert control_manager.num_controls == 4
+    assert "feet" in control_manager.get_states()
+
+    # A new file can't reuse a name that's already taken.
+    duplicate_file = str(control_path / "duplicate.ctl")
+    feet_config.up_gpio_line = 9
+    feet_config.down_gpio_line = 10
+    feet_config.save_to_file(duplicate_file)
+    control_manager.reload_config_file(duplicate_file)
+    assert control_manager.num_controls == 4
+    assert 9 not in gpio_manager.acquired_lines
+
+    pathlib.Path(feet_file).unlink()
+    control_manager.reload_config_file(feet_file)
+    assert control_manager.num_controls == 3
+    assert 7 not in gpio_manager.acquired_lines
+
+    control_manager.uninitialize()
+    assert gpio_manager.acquired_lines == []
+    gpio_manager.uninitialize()
+
+
 def test_control_bootstrap(tmp_path: pathlib.Path) -> None:
     """Test control bootstrapping."""
     control_path = tmp_path / "controls/"
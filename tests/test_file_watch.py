@@ -0,0 +1,59 @@
+"""Tests watching files."""
+
+import pathlib
+
+import pytest
+
+import sandman_main.file_watch as file_watch
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watch(tmp_path: pathlib.Path, use_inotify: bool) -> None:
+    """Test finding changes to watched files."""
+    (tmp_path / "existing.ctl").write_text("1")
+
+    watcher = file_watch.FileWatcher(use_inotify=use_inotify)
+
+    if use_inotify == False:
+        assert watcher.is_using_inotify == False
+
+    # Missing directories can't be watched with inotify.
+    if watcher.is_using_inotify == True:
+        assert watcher.watch_directory(str(tmp_path / "missing"), ".ctl") == (
+            False
+        )
+
+    assert watcher.watch_directory(str(tmp_path), ".ctl") == True
+    assert watcher.poll() == []
+
+    # Files with other suffixes are ignored.
+    (tmp_path / "other.rtn").write_text("1")
+    assert watcher.poll() == []
+
+    created_path = tmp_path / "created.ctl"
+    created_path.write_text("1")
+    (tmp_path / "existing.ctl").write_text("22")
+
+    changes = sorted(watcher.poll(), key=lambda change: change.path)
+    assert changes == [
+        file_watch.FileChange(
+            str(created_path), file_watch.FileChange.Kind.MODIFIED
+        ),
+        file_watch.FileChange(
+            str(tmp_path / "existing.ctl"),
+            file_watch.FileChange.Kind.MODIFIED,
+        ),
+    ]
+    assert watcher.poll() == []
+
+    # Deleting a file is reported as a deletion.
+    created_path.unlink()
+    assert watcher.poll() == [
+        file_watch.FileChange(
+            str(created_path), file_watch.FileChange.Kind.DELETED
+        )
+    ]
+
+    watcher.close()
+    assert watcher.is_using_inotify == False
+    assert watcher.poll() == []
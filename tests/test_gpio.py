@@ -86,3 +86,90 @@ def test_gpio_line_values() -> None:
     manager.uninitialize()
     assert manager.set_line_active(3) == False
     assert manager.set_line_inactive(4) == False
+
+
+def test_gpio_elided_writes() -> None:
+    """Test that writes which don't change a line's value are skipped."""
+    manager: gpio.GPIOManager = gpio.GPIOManager(is_live_mode=False)
+    manager.initialize()
+    assert manager.num_issued_writes == 0
+    assert manager.num_elided_writes == 0
+
+    # Lines start out inactive, so setting them inactive does nothing.
+    assert manager.acquire_output_line(3) == True
+    assert manager.set_line_inactive(3) == True
+    assert manager.num_issued_writes == 0
+    assert manager.num_elided_writes == 1
+
+    assert manager.set_line_active(3) == True
+    assert manager.set_line_active(3) == True
+    assert manager.num_issued_writes == 1
+    assert manager.num_elided_writes == 2
+
+    assert manager.set_line_inactive(3) == True
+    assert manager.num_issued_writes == 2
+    assert manager.num_elided_writes == 2
+
+    # Failed writes aren't counted.
+    assert manager.set_line_active(4) == False
+    assert manager.num_issued_writes == 2
+    assert manager.num_elided_writes == 2
+
+    # Reacquired lines start out inactive again.
+    assert manager.set_line_active(3) == True
+    assert manager.release_output_line(3) == True
+    assert manager.acquire_output_line(3) == True
+    assert manager.set_line_inactive(3) == True
+    assert manager.num_issued_writes == 3
+    assert manager.num_elided_writes == 3
+
+    manager.uninitialize()
+
+
+def test_gpio_multiple_lines() -> None:
+    """Test acquiring and setting several GPIO lines at once."""
+    manager: gpio.GPIOManager = gpio.GPIOManager(is_live_mode=False)
+
+    # Cannot acquire lines prior to initialization.
+    assert manager.acquire_output_lines([2, 3]) == False
+    manager.initialize()
+
+    # Lines must be unique and there must be at least one.
+    assert manager.acquire_output_lines([]) == False
+    assert manager.acquire_output_lines([2, 2]) == False
+    assert len(manager.acquired_lines) == 0
+
+    assert manager.acquire_output_lines([2, 3]) == True
+    assert manager.acquired_lines == [2, 3]
+
+    # None of the lines are acquired if any of them already are.
+    assert manager.acquire_output_lines([4, 3]) == False
+    assert manager.acquired_lines == [2, 3]
+
+    # Nothing is set if any of the lines aren't acquired.
+    assert manager.set_line_values({2: True, 4: True}) == False
+    assert manager.num_issued_writes == 0
+
+    assert manager.set_line_values({2: False, 3: True}) == True
+    assert manager.num_issued_writes == 1
+    assert manager.num_elided_writes == 1
+
+    assert manager.set_line_values({3: False, 2: True}) == True
+    assert manager.num_issued_writes == 3
+    assert manager.num_elided_writes == 1
+
+    # Lines that share a request can still be released one at a time.
+    assert manager.release_output_line(2) == True
+    assert manager.acquired_lines == [3]
+    assert manager.set_line_values({2: False}) == False
+    assert manager.set_line_values({3: False}) == True
+    assert manager.release_output_line(3) == True
+    assert len(manager.acquired_lines) == 0
+
+    # Single lines and groups can be mixed.
+    assert manager.acquire_output_line(2) == True
+    assert manager.acquire_output_lines([3, 4]) == True
+    assert manager.acquired_lines == [2, 3, 4]
+
+    manager.uninitialize()
+    assert len(manager.acquired_lines) == 0
@@ -0,0 +1,41 @@
+"""Tests lazy imports."""
+
+import pathlib
+import sys
+
+import pytest
+
+import sandman_main.lazy_import as lazy_import
+
+
+def test_lazy_import(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that modules are only loaded when they are used."""
+    # Modules that are already loaded are returned as is.
+    assert lazy_import.load("json") is sys.modules["json"]
+
+    # The module appends to a list in this module when it's loaded.
+    (tmp_path / "lazy_test_module.py").write_text(
+        "import tests.test_lazy_import as test\n"
+        + "test.loaded_names.append(__name__)\n"
+        + "VALUE = 42\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_test_module", raising=False)
+
+    module = lazy_import.load("lazy_test_module")
+    assert sys.modules["lazy_test_module"] is module
+    assert loaded_names == []
+
+    # Using the module loads it, but only once.
+    assert module.VALUE == 42
+    assert module.VALUE == 42
+    assert loaded_names == ["lazy_test_module"]
+    assert lazy_import.load("lazy_test_module") is module
+
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import.load("sandman_main.does_not_exist")
+
+
+loaded_names: list[str] = []
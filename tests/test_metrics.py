@@ -0,0 +1,153 @@
+"""Tests keeping and serving metrics."""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+import sandman_main.metrics as metrics
+
+
+def test_counter_and_gauge() -> None:
+    """Test metrics with a value for each set of labels."""
+    with pytest.raises(ValueError):
+        metrics.Counter("bad name", "A counter.")
+
+    with pytest.raises(ValueError):
+        metrics.Counter("good_name", "A counter.", ("bad-label",))
+
+    counter = metrics.Counter(
+        "sandman_things_total", "Things.", ("type", "source")
+    )
+    assert counter.get_value(("a", "b")) == 0
+
+    counter.inc(("a", "b"))
+    counter.inc(("a", "b"), 2)
+    assert counter.get_value(("a", "b")) == 3
+
+    with pytest.raises(ValueError):
+        counter.inc(("a", "b"), -1)
+
+    # Every label needs a value.
+    with pytest.raises(ValueError):
+        counter.inc(("a",))
+
+    gauge = metrics.Gauge("sandman_depth", "Depth.")
+    gauge.set(5)
+    gauge.set(2)
+    assert gauge.get_value() == 2
+
+    # Values that aren't replaced are removed.
+    labeled_gauge = metrics.Gauge("sandman_drift", "Drift.", ("routine",))
+    labeled_gauge.set_all({("a",): 1, ("b",): 2})
+    labeled_gauge.set_all({("b",): 3})
+    assert labeled_gauge.get_value(("a",)) == 0
+    assert labeled_gauge.get_value(("b",)) == 3
+
+    lines: list[str] = []
+    labeled_gauge.write(lines)
+    assert lines[2:] == ['sandman_drift{routine="b"} 3']
+
+    with pytest.raises(ValueError):
+        labeled_gauge.set_all({(): 1})
+
+
+def test_registry_render() -> None:
+    """Test rendering metrics in the text exposition format."""
+    registry = metrics.Registry()
+
+    counter = registry.register(
+        metrics.Counter("sandman_commands_total", "Commands.", ("source",))
+    )
+    gauge = registry.register(
+        metrics.Gauge("sandman_depth", "Depth with a \\ and a\nnewline.")
+    )
+    histogram = registry.register(
+        metrics.Histogram("sandman_tick_duration_seconds", "Ticks.")
+    )
+
+    with pytest.raises(ValueError):
+        registry.register(metrics.Gauge("sandman_depth", "Depth again."))
+
+    assert registry.get_metric("sandman_depth") is gauge
+    assert registry.get_metric("sandman_missing") is None
+
+    counter.inc(('say "hi"',))
+    histogram.observe_ns(3000)
+    histogram.observe_ns(1500000)
+
+    # Collectors only run when asked to.
+    registry.add_collector(lambda: gauge.set(0.5))
+    assert gauge.get_value() == 0
+    registry.collect()
+
+    lines = registry.render().splitlines()
+
+    assert lines[0:3] == [
+        "# HELP sandman_commands_total Commands.",
+        "# TYPE sandman_commands_total counter",
+        'sandman_commands_total{source="say \\"hi\\""} 1',
+    ]
+    assert lines[3:6] == [
+        "# HELP sandman_depth Depth with a \\\\ and a\\nnewline.",
+        "# TYPE sandman_depth gauge",
+        "sandman_depth 0.5",
+    ]
+    assert lines[6:8] == [
+        "# HELP sandman_tick_duration_seconds Ticks.",
+        "# TYPE sandman_tick_duration_seconds histogram",
+    ]
+
+    # Buckets are cumulative and in seconds.
+    assert 'sandman_tick_duration_seconds_bucket{le="1e-06"} 0' in lines
+    assert 'sandman_tick_duration_seconds_bucket{le="4e-06"} 1' in lines
+    assert 'sandman_tick_duration_seconds_bucket{le="0.002048"} 2' in lines
+    assert 'sandman_tick_duration_seconds_bucket{le="+Inf"} 2' in lines
+    assert lines[-2] == "sandman_tick_duration_seconds_sum 0.001503"
+    assert lines[-1] == "sandman_tick_duration_seconds_count 2"
+
+
+def test_metrics_server() -> None:
+    """Test serving metrics over HTTP."""
+    registry = metrics.Registry()
+    gauge = registry.register(metrics.Gauge("sandman_depth", "Depth."))
+    gauge.set(3)
+
+    server = metrics.MetricsServer(registry, "127.0.0.1", 0)
+    assert server.start() == True
+    assert server.port != 0
+
+    try:
+        url = f"http://127.0.0.1:{server.port}/metrics"
+
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.status == 200
+            assert response.headers["Content-Type"].startswith("text/plain")
+            body = response.read().decode()
+
+        assert "sandman_depth 3\n" in body
+
+        # Values are read when scraped.
+        gauge.set(4)
+
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert "sandman_depth 4\n" in response.read().decode()
+
+        with pytest.raises(urllib.error.HTTPError) as error_info:
+            urllib.request.urlopen(
+                f"http://127.0.0.1:{server.port}/other", timeout=5
+            )
+
+        assert error_info.value.code == 404
+
+        # The port is already in use.
+        other_server = metrics.MetricsServer(
+            registry, "127.0.0.1", server.port
+        )
+        assert other_server.start() == False
+
+    finally:
+        server.stop()
+
+    # Stopping twice is harmless.
+    server.stop()
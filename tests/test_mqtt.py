@@ -0,0 +1,105 @@
+"""Tests MQTT."""
+
+import asyncio
+import json
+import random
+
+import sandman_main.mqtt as mqtt
+
+
+def test_wait_for_command_timeout() -> None:
+    """Test that waiting without any commands times out."""
+    client = mqtt.MQTTClient()
+    assert client.wait_for_command(0.001) == False
+    assert client.drain_commands() == []
+
+
+def test_wait_for_command_async_timeout() -> None:
+    """Test that waiting asynchronously without any commands times out."""
+    client = mqtt.MQTTClient()
+    assert asyncio.run(client.wait_for_command_async(0.001)) == False
+    assert client.drain_commands() == []
+
+
+def test_wait_until_ready_timeout() -> None:
+    """Test that waiting for the dialogue manager times out."""
+    client = mqtt.MQTTClient()
+    assert client.wait_until_ready(0.001) == False
+    assert asyncio.run(client.wait_until_ready_async(0.001)) == False
+
+
+def test_reconnect_backoff() -> None:
+    """Test the delays between attempts to connect."""
+    backoff = mqtt.ReconnectBackoff(1, 60, random.Random(42))
+    assert backoff.num_failures == 0
+
+    # Each delay is in the upper half of a range that doubles up to the limit.
+    for range_sec in [1, 2, 4, 8, 16, 32, 60, 60, 60]:
+        delay_sec = backoff.get_next_delay_sec()
+        assert max(range_sec // 2, 1) <= delay_sec <= range_sec
+
+    assert backoff.num_failures == 9
+
+    # The delays are jittered.
+    delays_sec = {backoff.get_next_delay_sec() for _ in range(20)}
+    assert len(delays_sec) > 1
+
+    backoff.reset()
+    assert backoff.num_failures == 0
+    assert backoff.get_next_delay_sec() == 1
+
+
+def test_not_connected() -> None:
+    """Test that notifications wait while not connected."""
+    client = mqtt.MQTTClient()
+    assert client.is_connected == False
+
+    client.play_notification("Test.")
+    client.process()
+    assert client.is_connected == False
+
+
+def test_stop_before_connect() -> None:
+    """Test that stopping before connecting does nothing."""
+    client = mqtt.MQTTClient()
+    client.stop()
+    asyncio.run(client.stop_async())
+    assert client.is_connected == False
+
+
+def test_payload_cache() -> None:
+    """Test caching encoded notification payloads."""
+    cache = mqtt.PayloadCache(2)
+    assert len(cache) == 0
+
+    payload = cache.get_start_session_payload("Raising the back.", "default")
+    assert json.loads(payload) == {
+        "init": {"type": "notification", "text": "Raising the back."},
+        "siteId": "default",
+    }
+    assert (cache.num_hits, cache.num_misses) == (0, 1)
+
+    # The same text and site use the cached payload.
+    assert (
+        cache.get_start_session_payload("Raising the back.", "default")
+        is payload
+    )
+    assert (cache.num_hits, cache.num_misses) == (1, 1)
+
+    # The site is part of the key.
+    other_payload = cache.get_start_session_payload(
+        "Raising the back.", "bedroom"
+    )
+    assert json.loads(other_payload)["siteId"] == "bedroom"
+    assert (cache.num_hits, cache.num_misses) == (1, 2)
+
+    # The least recently used payload is forgotten when the cache is full.
+    cache.get_start_session_payload("Raising the back.", "default")
+    cache.get_start_session_payload("Lowering the back.", "default")
+    assert len(cache) == 2
+
+    cache.get_start_session_payload("Raising the back.", "default")
+    assert (cache.num_hits, cache.num_misses) == (3, 3)
+
+    cache.get_start_session_payload("Raising the back.", "bedroom")
+    assert (cache.num_hits, cache.num_misses) == (3, 4)
@@ -0,0 +1,47 @@
+"""Tests combining notifications."""
+
+import sandman_main.notifications as notifications
+
+
+def test_coalesce() -> None:
+    """Test removing repeated and out of date notifications."""
+    assert notifications.coalesce([]) == []
+    assert notifications.merge([]) == ""
+
+    # Repeated phrases are only kept the first time.
+    assert notifications.coalesce(
+        ["Locked the back.", "Locked the legs.", "Locked the back."]
+    ) == ["Locked the back.", "Locked the legs."]
+
+    # Only the last movement phrase for each control is kept.
+    assert notifications.coalesce(
+        [
+            "Raising the back.",
+            "Raising the legs.",
+            "Lowering the back.",
+            "Sandman is running.",
+        ]
+    ) == ["Raising the legs.", "Lowering the back.", "Sandman is running."]
+    assert notifications.coalesce(["Raising the back.", "back stopped."]) == [
+        "back stopped."
+    ]
+
+    # Other phrases about a control don't replace its movement.
+    assert notifications.coalesce(
+        ["Raising the back.", "Cannot move the back, it is locked."]
+    ) == ["Raising the back.", "Cannot move the back, it is locked."]
+
+
+def test_merge() -> None:
+    """Test combining notifications into one."""
+    assert (
+        notifications.merge(
+            [
+                "Sandman is running.",
+                "The back is locked.",
+                "The legs is locked.",
+                "The back is locked.",
+            ]
+        )
+        == "Sandman is running. The back is locked. The legs is locked."
+    )
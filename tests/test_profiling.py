@@ -0,0 +1,110 @@
+"""Tests profiling the main loop."""
+
+import sandman_main.commands as commands
+import sandman_main.profiling as profiling
+from tests.test_time_util import TestTimer
+
+
+def test_histogram() -> None:
+    """Test counting durations in buckets."""
+    histogram = profiling.Histogram()
+    assert histogram.count == 0
+    assert histogram.get_mean_ns() == 0
+    assert histogram.get_percentile_ns(50) == 0
+
+    # Durations in microseconds: 90 of 3, 9 of 100, and 1 of 5000.
+    for _ in range(90):
+        histogram.record(3000)
+
+    for _ in range(9):
+        histogram.record(100000)
+
+    histogram.record(5000000)
+
+    assert histogram.count == 100
+    assert histogram.max_ns == 5000000
+    assert histogram.get_mean_ns() == (270000 + 900000 + 5000000) // 100
+
+    # Percentiles are the upper bound of the bucket they fall in.
+    assert histogram.get_percentile_ns(50) == 4000
+    assert histogram.get_percentile_ns(99) == 128000
+    assert histogram.get_percentile_ns(100) == 5000000
+
+    assert histogram.get_as_json() == {
+        "count": 100,
+        "meanUs": 61,
+        "p50Us": 4,
+        "p99Us": 128,
+        "maxUs": 5000,
+    }
+
+    bucket_counts = histogram.get_bucket_counts()
+    assert bucket_counts[2] == (4000, 90)
+    assert bucket_counts[7] == (128000, 9)
+    assert bucket_counts[13] == (8192000, 1)
+    assert sum(count for _bound_ns, count in bucket_counts) == 100
+    assert histogram.total_ns == 270000 + 900000 + 5000000
+
+    # Durations longer than the last bucket are still counted.
+    histogram.record(60 * 1000000000)
+    assert histogram.get_percentile_ns(100) == 60 * 1000000000
+    assert histogram.get_bucket_counts()[-1] == (None, 1)
+
+
+def test_tick_profiler() -> None:
+    """Test recording the phases of ticks."""
+    timer = TestTimer()
+    profiler = profiling.TickProfiler(timer)
+    assert profiler.num_ticks == 0
+    assert profiler.get_phase("routines") is None
+
+    for tick_index in range(2):
+        start_time_ms = tick_index * 1000
+        timer.set_current_time_ms(start_time_ms)
+
+        # The first tick was woken 5 ms late and the second was woken early.
+        profiler.begin_tick(
+            (start_time_ms - 5) * 1000000 if tick_index == 0 else None
+        )
+        timer.set_current_time_ms(start_time_ms + 2)
+        profiler.end_phase("routines")
+        timer.set_current_time_ms(start_time_ms + 3)
+        profiler.end_phase("controls")
+        assert profiler.end_tick() == 3000000
+
+    # Traces are only recorded once they reach GPIO.
+    trace = commands.CommandTrace(1, 1000000, dequeued_time=2000000)
+    profiler.record_trace(trace)
+    assert profiler.get_trace_stage("receiveToGpio") is None
+
+    trace.dispatched_time = 4000000
+    trace.gpio_time = 8000000
+    profiler.record_trace(trace)
+
+    assert profiler.num_ticks == 2
+    assert profiler.get_phase_names() == ["routines", "controls"]
+
+    routines = profiler.get_phase("routines")
+    assert routines is not None
+    assert routines.count == 2
+    assert routines.max_ns == 2000000
+
+    controls = profiler.get_phase("controls")
+    assert controls is not None
+    assert controls.max_ns == 1000000
+
+    stats_json = profiler.get_as_json()
+    assert stats_json["tick"]["count"] == 2
+    assert stats_json["tick"]["maxUs"] == 3000
+    assert stats_json["phases"]["routines"]["maxUs"] == 2000
+    assert stats_json["jitter"]["count"] == 1
+    assert stats_json["jitter"]["maxUs"] == 5000
+    assert stats_json["traces"]["receiveToDequeue"]["maxUs"] == 1000
+    assert stats_json["traces"]["dequeueToDispatch"]["maxUs"] == 2000
+    assert stats_json["traces"]["dispatchToGpio"]["maxUs"] == 4000
+    assert stats_json["traces"]["receiveToGpio"]["maxUs"] == 7000
+
+    profiler.reset()
+    assert profiler.num_ticks == 0
+    assert profiler.get_phase_names() == []
+    assert profiler.get_trace_stage("receiveToGpio") is None
@@ -7,6 +7,7 @@ import whenever
 
 import sandman_main.controls as controls
 import sandman_main.reports as reports
+import sandman_main.time_util as time_util
 import tests.test_time_util as test_time_util
 
 
@@ -89,6 +90,20 @@ def test_report_file_creation(tmp_path: pathlib.Path) -> None:
     report_manager.process()
     assert _get_num_files_in_dir(reports_path) == 1
 
+    # The report is remembered, so the file system isn't checked again until
+    # the time leaves the current report.
+    first_report_path.unlink()
+    report_manager.process()
+    assert _get_num_files_in_dir(reports_path) == 0
+
+    time_source.set_current_time(first_time.add(days=-1))
+    report_manager.process()
+    time_source.set_current_time(first_time)
+    report_manager.process()
+    assert _get_num_files_in_dir(reports_path) == 2
+    assert len(_check_file_and_read_lines(first_report_path)) == 1
+    (reports_path / "sandman2025-09-26.rpt").unlink()
+
     # Add one second to cross into the next report day.
     second_time = first_time.add(seconds=1)
     time_source.set_current_time(second_time)
@@ -148,6 +163,7 @@ def test_report_events(tmp_path: pathlib.Path) -> None:
     # Once processed, the event should show up in the appropriate file
     report_manager.process()
     assert _get_num_files_in_dir(reports_path) == 1
+    assert report_manager.num_events_written == 1
 
     first_report_path = reports_path / "sandman2025-09-27.rpt"
     first_report_lines = _check_file_and_read_lines(first_report_path)
@@ -176,6 +192,7 @@ def test_report_events(tmp_path: pathlib.Path) -> None:
     assert _get_num_files_in_dir(reports_path) == 1
     report_manager.process()
     assert _get_num_files_in_dir(reports_path) == 2
+    assert report_manager.num_events_written == 3
 
     first_report_lines = _check_file_and_read_lines(first_report_path)
 
@@ -284,6 +301,451 @@ def test_report_events(tmp_path: pathlib.Path) -> None:
     }
 
 
+def test_report_scheduler(tmp_path: pathlib.Path) -> None:
+    """Test that the start of the next report is scheduled."""
+    reports.bootstrap_reports(str(tmp_path) + "/")
+
+    timer = test_time_util.TestTimer()
+    scheduler = time_util.Scheduler(timer)
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(
+        time_source, str(tmp_path) + "/", scheduler
+    )
+
+    # Nothing is scheduled without a valid time.
+    report_manager.process()
+    assert scheduler.num_pending == 0
+
+    curr_time = whenever.ZonedDateTime(
+        year=2025,
+        month=9,
+        day=28,
+        hour=16,
+        minute=59,
+        second=59,
+        tz="America/Chicago",
+    )
+    time_source.set_current_time(curr_time)
+
+    report_manager.process()
+    assert scheduler.num_pending == 1
+    assert scheduler.get_next_deadline() == 1000 * 1000000
+
+    # Processing again doesn't schedule it twice.
+    report_manager.process()
+    assert scheduler.num_pending == 1
+
+    # Once the deadline expires, the following report is scheduled.
+    timer.set_current_time_ms(1000)
+    time_source.set_current_time(curr_time.add(seconds=1))
+    assert scheduler.process() == 1
+    assert scheduler.num_pending == 0
+
+    report_manager.process()
+    assert scheduler.num_pending == 1
+    assert scheduler.get_next_deadline() == (1000 + (24 * 3600000)) * 1000000
+
+
+def test_report_buffered_writes(tmp_path: pathlib.Path) -> None:
+    """Test that report events are buffered until a flush is due."""
+    reports_path = tmp_path / "reports/"
+    reports.bootstrap_reports(str(tmp_path) + "/")
+
+    timer = test_time_util.TestTimer()
+    scheduler = time_util.Scheduler(timer)
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(
+        time_source,
+        str(tmp_path) + "/",
+        scheduler,
+        flush_interval_ms=5000,
+        flush_size=1000,
+    )
+
+    first_time = whenever.ZonedDateTime(
+        year=2025,
+        month=9,
+        day=28,
+        hour=12,
+        tz="America/Chicago",
+    )
+    time_source.set_current_time(first_time)
+
+    # The header is written right away, but the event waits for a flush.
+    report_manager.add_status_event()
+    report_manager.process()
+
+    report_path = reports_path / "sandman2025-09-27.rpt"
+    assert len(_check_file_and_read_lines(report_path)) == 1
+
+    # A flush deadline is scheduled along with the next report.
+    assert scheduler.num_pending == 2
+    assert scheduler.get_next_deadline() == 5000 * 1000000
+
+    # Before the interval passes, nothing else is flushed.
+    time_source.set_current_time(first_time.add(seconds=4))
+    report_manager.add_routine_event("wake", "start")
+    report_manager.process()
+    assert len(_check_file_and_read_lines(report_path)) == 1
+
+    # Once the interval passes, everything is flushed.
+    timer.set_current_time_ms(5000)
+    assert scheduler.process() == 1
+    time_source.set_current_time(first_time.add(seconds=5))
+    report_manager.process()
+    assert len(_check_file_and_read_lines(report_path)) == 3
+
+    # Enough waiting text causes a flush before the interval passes.
+    for _ in range(30):
+        report_manager.add_status_event()
+
+    report_manager.process()
+    assert len(_check_file_and_read_lines(report_path)) == 33
+
+    # Events for a different report switch to the other file.
+    second_time = first_time.add(days=1)
+    time_source.set_current_time(second_time)
+    report_manager.add_status_event()
+    report_manager.process()
+
+    second_report_path = reports_path / "sandman2025-09-28.rpt"
+    assert len(_check_file_and_read_lines(second_report_path)) == 2
+
+    # Closing writes out anything still waiting.
+    report_manager.add_status_event()
+    report_manager.process()
+    assert len(_check_file_and_read_lines(second_report_path)) == 2
+
+    report_manager.close()
+    assert len(_check_file_and_read_lines(second_report_path)) == 3
+    assert len(_check_file_and_read_lines(report_path)) == 33
+
+
+def test_report_queries(tmp_path: pathlib.Path) -> None:
+    """Test querying events from report files."""
+    base_dir = str(tmp_path) + "/"
+    reports_path = tmp_path / "reports/"
+    reports.bootstrap_reports(base_dir)
+
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(time_source, base_dir)
+
+    # Nothing matches before there are any reports.
+    assert reports.count_report_events(base_dir, reports.ReportQuery()) == 0
+    assert reports.find_report_events(base_dir, reports.ReportQuery()) == []
+
+    first_time = whenever.ZonedDateTime(
+        year=2025,
+        month=9,
+        day=28,
+        hour=12,
+        tz="America/Chicago",
+    )
+    time_source.set_current_time(first_time)
+    report_manager.add_control_event("back", "move up", "voice")
+    report_manager.add_routine_event("wake", "start")
+    time_source.set_current_time(first_time.add(hours=1))
+    report_manager.add_control_event("back", "move down", "voice")
+    report_manager.add_status_event()
+    report_manager.process()
+
+    second_time = first_time.add(days=1)
+    time_source.set_current_time(second_time)
+    report_manager.add_control_event("back", "move up", "routine")
+    report_manager.add_control_event("legs", "move up", "voice")
+    report_manager.process()
+
+    back_voice = reports.ReportQuery(
+        event_type="control", control="back", source="voice"
+    )
+    assert reports.count_report_events(base_dir, back_voice) == 2
+    assert reports.count_report_events_by_type(base_dir) == {
+        "control": 4,
+        "routine": 1,
+        "status": 1,
+    }
+
+    # Indices are saved next to the reports.
+    assert (reports_path / "sandman2025-09-27.idx").exists() == True
+    assert (reports_path / "sandman2025-09-28.idx").exists() == True
+
+    events = reports.find_report_events(base_dir, back_voice)
+    assert len(events) == 2
+    assert events[0].when == first_time
+    assert events[0].info == {
+        "type": "control",
+        "control": "back",
+        "action": "move up",
+        "source": "voice",
+    }
+    assert events[1].when == first_time.add(hours=1)
+    assert events[1].info["action"] == "move down"
+
+    # Time ranges can cover part of a report.
+    move_up = reports.ReportQuery(
+        action="move up", start=first_time.add(minutes=1)
+    )
+    assert reports.count_report_events(base_dir, move_up) == 2
+
+    first_hour = reports.ReportQuery(
+        start=first_time, end=first_time.add(hours=1)
+    )
+    assert reports.count_report_events(base_dir, first_hour) == 2
+    assert reports.count_report_events_by_type(
+        base_dir, first_time, first_time.add(hours=1)
+    ) == {"control": 1, "routine": 1}
+
+    routine_events = reports.find_report_events(
+        base_dir, reports.ReportQuery(routine="wake")
+    )
+    assert len(routine_events) == 1
+    assert routine_events[0].info["action"] == "start"
+
+    # Reports that grow are indexed incrementally.
+    second_index_path = reports_path / "sandman2025-09-28.idx"
+    second_index_text = second_index_path.read_text()
+    time_source.set_current_time(second_time.add(minutes=1))
+    report_manager.add_control_event("back", "move down", "voice")
+    report_manager.process()
+
+    # Reports that are named for dates outside the time range aren't read.
+    next_week = reports.ReportQuery(start=second_time.add(days=7))
+    assert reports.count_report_events(base_dir, next_week) == 0
+    assert second_index_path.read_text() == second_index_text
+
+    assert reports.count_report_events(base_dir, back_voice) == 3
+
+    # A report that was replaced is indexed again from scratch.
+    second_report_path = reports_path / "sandman2025-09-28.rpt"
+    second_report_path.write_text("")
+    assert reports.count_report_events(base_dir, back_voice) == 2
+
+
+def test_report_archives(tmp_path: pathlib.Path) -> None:
+    """Test archiving closed reports and reading the archives."""
+    base_dir = str(tmp_path) + "/"
+    reports_path = tmp_path / "reports/"
+    reports.bootstrap_reports(base_dir)
+
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(time_source, base_dir)
+
+    # Nothing can be archived without a valid time.
+    assert report_manager.archive_closed_reports() == 0
+
+    first_time = whenever.ZonedDateTime(
+        year=2025,
+        month=9,
+        day=28,
+        hour=12,
+        minute=30,
+        second=15,
+        nanosecond=123,
+        tz="America/Chicago",
+    )
+    time_source.set_current_time(first_time)
+    report_manager.add_control_event("back", "move up", "voice")
+    time_source.set_current_time(first_time.add(seconds=30))
+    report_manager.add_routine_event("wake", "start")
+    time_source.set_current_time(first_time.add(seconds=10))
+    report_manager.add_status_event()
+    report_manager.process()
+
+    first_report_path = reports_path / "sandman2025-09-27.rpt"
+    first_report_size = first_report_path.stat().st_size
+
+    # The current report is never archived.
+    assert report_manager.archive_closed_reports() == 0
+    assert first_report_path.exists() == True
+
+    second_time = first_time.add(days=1)
+    time_source.set_current_time(second_time)
+    report_manager.add_status_event()
+    report_manager.process()
+
+    # Archive the closed report, leaving the current one alone.
+    assert report_manager.archive_closed_reports(compress=False) == 1
+    assert first_report_path.exists() == False
+    assert (reports_path / "sandman2025-09-28.rpt").exists() == True
+
+    archive_path = reports_path / "sandman2025-09-27.rpa"
+    assert archive_path.stat().st_size < first_report_size
+
+    header = reports.read_archived_report_header(str(archive_path))
+    assert header is not None
+    assert header["version"] == reports.ReportManager.REPORT_VERSION
+
+    events = list(reports.read_archived_report(str(archive_path)))
+    assert len(events) == 3
+    assert events[0].when == first_time
+    assert events[0].info == {
+        "type": "control",
+        "control": "back",
+        "action": "move up",
+        "source": "voice",
+    }
+    assert events[1].when == first_time.add(seconds=30)
+    assert events[1].info == {
+        "type": "routine",
+        "routine": "wake",
+        "action": "start",
+    }
+    assert events[2].when == first_time.add(seconds=10)
+    assert events[2].info == {"type": "status"}
+
+    # Compressed archives read back the same way.
+    time_source.set_current_time(second_time.add(days=1))
+    report_manager.process()
+    assert report_manager.archive_closed_reports() == 1
+
+    events = list(
+        reports.read_archived_report(
+            str(reports_path / "sandman2025-09-28.rpa")
+        )
+    )
+    assert len(events) == 1
+    assert events[0].when == second_time
+    assert events[0].info == {"type": "status"}
+
+    # Anything that isn't an archive reads as empty.
+    assert list(reports.read_archived_report(str(first_report_path))) == []
+    assert reports.read_archived_report_header(str(reports_path)) is None
+
+
+def test_report_archive_queries(tmp_path: pathlib.Path) -> None:
+    """Test that archiving on rollover keeps reports queryable."""
+    base_dir = str(tmp_path) + "/"
+    reports_path = tmp_path / "reports/"
+    reports.bootstrap_reports(base_dir)
+
+    time_source = test_time_util.TestTimeSource()
+    first_time = whenever.ZonedDateTime(
+        year=2025, month=9, day=28, hour=12, tz="America/Chicago"
+    )
+    time_source.set_current_time(first_time)
+
+    report_manager = reports.ReportManager(
+        time_source, base_dir, archive_closed=True
+    )
+    report_manager.add_control_event("back", "move up", "voice")
+    report_manager.add_status_event()
+    report_manager.process()
+
+    first_report_path = reports_path / "sandman2025-09-27.rpt"
+    first_archive_path = reports_path / "sandman2025-09-27.rpa"
+    assert first_report_path.exists() == True
+
+    back_voice = reports.ReportQuery(
+        event_type="control", control="back", source="voice"
+    )
+    assert reports.count_report_events(base_dir, back_voice) == 1
+
+    # The report is archived when the next one starts, and its events can
+    # still be queried.
+    second_time = first_time.add(days=1)
+    time_source.set_current_time(second_time)
+    report_manager.add_control_event("back", "move down", "voice")
+    report_manager.process()
+    assert first_report_path.exists() == False
+    assert first_archive_path.exists() == True
+    assert (reports_path / "sandman2025-09-28.rpt").exists() == True
+
+    for _ in range(2):
+        # The second time around, the saved archive index is used.
+        assert reports.count_report_events(base_dir, back_voice) == 2
+        assert reports.count_report_events_by_type(base_dir) == {
+            "control": 2,
+            "status": 1,
+        }
+        assert reports.count_report_events_by_type(
+            base_dir, end=second_time
+        ) == {"control": 1, "status": 1}
+
+        events = reports.find_report_events(base_dir, back_voice)
+        assert [event.when for event in events] == [first_time, second_time]
+        assert events[0].info["action"] == "move up"
+        assert events[1].info["action"] == "move down"
+
+    assert (reports_path / "sandman2025-09-27.idx").exists() == True
+
+    # If archiving was interrupted, the report is used instead of the archive.
+    first_report_path.write_text(
+        '{"version": 5}\n'
+        + '{"when": "2025-09-28T13:00:00-05:00[America/Chicago]", '
+        + '"info": {"type": "status"}}\n'
+    )
+    assert reports.count_report_events_by_type(base_dir) == {
+        "control": 1,
+        "status": 1,
+    }
+    report_manager.close()
+
+
+def test_report_archive_backlog(tmp_path: pathlib.Path) -> None:
+    """Test archiving a backlog of closed reports a little at a time."""
+    base_dir = str(tmp_path) + "/"
+    reports_path = tmp_path / "reports/"
+    reports.bootstrap_reports(base_dir)
+
+    status_line = (
+        '{"when": "2025-09-20T18:00:00-05:00[America/Chicago]", '
+        + '"info": {"type": "status"}}\n'
+    )
+    (reports_path / "sandman2025-09-20.rpt").write_text(
+        '{"version": 5}\n' + status_line
+    )
+    (reports_path / "sandman2025-09-21.rpt").write_text(
+        '{"version": 5}\n' + "not an event\n"
+    )
+    (reports_path / "sandman2025-09-22.rpt").write_text(
+        '{"version": 5}\n' + status_line
+    )
+
+    timer = test_time_util.TestTimer()
+    scheduler = time_util.Scheduler(timer)
+    time_source = test_time_util.TestTimeSource()
+    first_time = whenever.ZonedDateTime(
+        year=2025, month=9, day=28, hour=12, tz="America/Chicago"
+    )
+    time_source.set_current_time(first_time)
+    report_manager = reports.ReportManager(
+        time_source, base_dir, scheduler, archive_closed=True
+    )
+
+    # Only one report is archived per pass.
+    report_manager.process()
+    assert (reports_path / "sandman2025-09-20.rpa").exists() == True
+    assert (reports_path / "sandman2025-09-21.rpt").exists() == True
+    assert (reports_path / "sandman2025-09-22.rpt").exists() == True
+
+    # The next one waits for its deadline.
+    report_manager.process()
+    assert (reports_path / "sandman2025-09-21.rpt").exists() == True
+
+    # A report that can't be archived is left alone.
+    timer.set_current_time_ms(1000)
+    scheduler.process()
+    report_manager.process()
+    assert (reports_path / "sandman2025-09-21.rpt").exists() == True
+    assert (reports_path / "sandman2025-09-21.rpa").exists() == False
+
+    timer.set_current_time_ms(2000)
+    scheduler.process()
+    report_manager.process()
+    assert (reports_path / "sandman2025-09-22.rpa").exists() == True
+
+    # Once everything is archived, nothing else is scheduled for it.
+    report_manager.process()
+    assert scheduler.num_pending == 1
+
+    # The report that couldn't be archived isn't tried again.
+    time_source.set_current_time(first_time.add(days=1))
+    report_manager.process()
+    assert (reports_path / "sandman2025-09-21.rpt").exists() == True
+    assert (reports_path / "sandman2025-09-27.rpa").exists() == True
+    report_manager.close()
+
+
 def test_report_bootstrap(tmp_path: pathlib.Path) -> None:
     """Test report bootstrapping."""
     reports_path = tmp_path / "reports/"
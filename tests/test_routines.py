@@ -9,6 +9,7 @@ import whenever
 import sandman_main.commands as commands
 import sandman_main.reports as reports
 import sandman_main.routines as routines
+import sandman_main.time_util as time_util
 import tests.test_time_util as test_time_util
 
 _default_delay_ms = -1
@@ -139,6 +140,7 @@ def _check_default_routine_desc(desc: routines.RoutineDesc) -> None:
     """Check whether a description is all default values."""
     assert desc.name == _default_name
     assert desc.is_looping == _default_is_looping
+    assert desc.catch_up_policy == routines.RoutineDesc.CatchUpPolicy.FIRE
     assert len(desc.steps) == 0
     assert desc.is_valid() == False
 
@@ -411,9 +413,27 @@ def test_routine_desc_loading() -> None:
     )
     assert desc.name == intended_name
     assert desc.is_looping == intended_is_looping
+    assert desc.catch_up_policy == routines.RoutineDesc.CatchUpPolicy.FIRE
     _check_intended_routine_steps(desc.steps, intended_steps)
     assert desc.is_valid() == True
 
+    desc = routines.RoutineDesc.parse_from_file(
+        path + "routine_test_catch_up_skip.rtn"
+    )
+    assert desc.catch_up_policy == routines.RoutineDesc.CatchUpPolicy.SKIP
+    _check_intended_routine_steps(desc.steps, intended_steps)
+    assert desc.is_valid() == True
+
+    # Invalid catch up policies fall back to the default.
+    desc = routines.RoutineDesc.parse_from_file(
+        path + "routine_test_invalid_catch_up.rtn"
+    )
+    assert desc.catch_up_policy == routines.RoutineDesc.CatchUpPolicy.FIRE
+    assert desc.is_valid() == True
+
+    with pytest.raises(TypeError):
+        desc.catch_up_policy = "skip"
+
 
 def test_routine_desc_saving(tmp_path: pathlib.Path) -> None:
     """Test routine description saving."""
@@ -444,6 +464,12 @@ def test_routine_desc_saving(tmp_path: pathlib.Path) -> None:
     assert written_desc.is_valid() == True
     assert written_desc == original_desc
 
+    # The catch up policy is saved too.
+    original_desc.catch_up_policy = routines.RoutineDesc.CatchUpPolicy.SKIP
+    original_desc.save_to_file(str(filename))
+    written_desc = routines.RoutineDesc.parse_from_file(str(filename))
+    assert written_desc == original_desc
+
     with pytest.raises(OSError):
         original_desc.save_to_file("")
 
@@ -753,6 +779,207 @@ def test_routines() -> None:
     assert steps_non_looping_no_delay.is_finished == True
 
 
+def test_routine_next_deadline() -> None:
+    """Test when a routine next needs processing."""
+    timer = test_time_util.TestTimer()
+
+    steps_desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_valid_steps.rtn"
+    )
+    assert steps_desc.is_looping == True
+
+    no_steps_desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_valid_no_steps.rtn"
+    )
+    assert no_steps_desc.is_looping == True
+
+    # A looping routine without steps never needs processing.
+    no_steps = routines.Routine(no_steps_desc, timer)
+    assert no_steps.next_deadline is None
+
+    # A non-looping routine without steps needs processing to finish.
+    no_steps_desc.is_looping = False
+    no_steps_non_looping = routines.Routine(no_steps_desc, timer)
+    assert no_steps_non_looping.next_deadline == 0
+
+    command_list = []
+    no_steps_non_looping.process(command_list)
+    assert no_steps_non_looping.is_finished == True
+    assert no_steps_non_looping.next_deadline is None
+
+    # Routines with steps are due after each step's delay.
+    steps = routines.Routine(steps_desc, timer)
+    assert steps.next_deadline == 1 * 1000000
+
+    timer.set_current_time_ms(1)
+    steps.process(command_list)
+    assert steps.next_deadline == 3 * 1000000
+
+    timer.set_current_time_ms(3)
+    steps.process(command_list)
+    assert steps.next_deadline == 4 * 1000000
+
+    # Looping routines without any delay still wait between passes.
+    no_delay_desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_valid_no_delay.rtn"
+    )
+    assert no_delay_desc.is_valid() == True
+    no_delay = routines.Routine(no_delay_desc, timer)
+    assert no_delay.next_deadline == 3 * 1000000
+
+    command_list = []
+    no_delay.process(command_list)
+    assert len(command_list) == 2
+    assert no_delay.next_deadline == 13 * 1000000
+
+    no_delay.process(command_list)
+    assert len(command_list) == 2
+
+
+def test_routine_timeline() -> None:
+    """Test compiling routines into timelines and running them on time."""
+    timer = test_time_util.TestTimer()
+
+    steps_desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_valid_steps.rtn"
+    )
+    timeline = routines.RoutineTimeline.compile(steps_desc)
+    assert timeline.name == "test"
+    assert timeline.is_looping == True
+    assert timeline.offsets == (1 * 1000000, 3 * 1000000)
+    assert timeline.duration == 3 * 1000000
+
+    up_command = commands.ControlCommand(
+        "test_control", commands.ControlCommand.Action.MOVE_UP, "routine"
+    )
+    down_command = commands.ControlCommand(
+        "test_control", commands.ControlCommand.Action.MOVE_DOWN, "routine"
+    )
+    assert timeline.commands == (up_command, down_command)
+
+    # A late step doesn't push back the steps after it.
+    steps = routines.Routine(timeline, timer)
+
+    timer.set_current_time_ms(2)
+    command_list = []
+    steps.process(command_list)
+    assert command_list == [up_command]
+    assert steps.next_deadline == 3 * 1000000
+
+    # Every step that is due runs, but only one pass through the routine.
+    timer.set_current_time_ms(100)
+    command_list = []
+    steps.process(command_list)
+    assert command_list == [down_command, up_command]
+    assert steps.next_deadline == 6 * 1000000
+
+    # Each pass gets its own commands.
+    assert command_list[1] is not timeline.commands[0]
+    command_list[1].source = "changed"
+    assert timeline.commands[0] == up_command
+
+    # Looping routines without any delay don't run forever.
+    steps_desc.steps[0].delay_ms = 0
+    steps_desc.steps[1].delay_ms = 0
+    no_delay = routines.Routine(steps_desc, timer)
+
+    command_list = []
+    no_delay.process(command_list)
+    assert command_list == [up_command, down_command]
+    assert no_delay.next_deadline == 110 * 1000000
+
+
+def test_routine_catch_up() -> None:
+    """Test how routines catch up after processing stalls."""
+    timer = test_time_util.TestTimer()
+
+    up_command = commands.ControlCommand(
+        "test_control", commands.ControlCommand.Action.MOVE_UP, "routine"
+    )
+    down_command = commands.ControlCommand(
+        "test_control", commands.ControlCommand.Action.MOVE_DOWN, "routine"
+    )
+
+    fire_desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_valid_steps.rtn"
+    )
+    skip_desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_catch_up_skip.rtn"
+    )
+    fire = routines.Routine(fire_desc, timer)
+    skip = routines.Routine(skip_desc, timer)
+
+    # On time steps don't drift.
+    timer.set_current_time_ms(1)
+
+    for routine in (fire, skip):
+        command_list = []
+        routine.process(command_list)
+        assert command_list == [up_command]
+        assert routine.last_drift_ns == 0
+        assert routine.num_skipped_steps == 0
+
+    # Stall through several passes. Firing executes the rest of the current
+    # pass, while skipping only executes the most recent step.
+    timer.set_current_time_ms(11)
+
+    command_list = []
+    fire.process(command_list)
+    assert command_list == [down_command, up_command]
+    assert fire.last_drift_ns == 7 * 1000000
+    assert fire.max_drift_ns == 8 * 1000000
+    assert fire.num_skipped_steps == 0
+    assert fire.next_deadline == 6 * 1000000
+
+    command_list = []
+    skip.process(command_list)
+    assert command_list == [up_command]
+    assert skip.last_drift_ns == 1 * 1000000
+    assert skip.max_drift_ns == 1 * 1000000
+    assert skip.num_skipped_steps == 5
+    assert skip.next_deadline == 12 * 1000000
+
+    # Skipping stays on schedule afterwards.
+    timer.set_current_time_ms(12)
+    command_list = []
+    skip.process(command_list)
+    assert command_list == [down_command]
+    assert skip.last_drift_ns == 0
+    assert skip.next_deadline == 13 * 1000000
+
+    # Steps that share a deadline aren't missed when a tick lands exactly on
+    # it, or when the tick is late.
+    shared_desc = routines.RoutineDesc()
+    shared_desc.name = "shared"
+    shared_desc.catch_up_policy = routines.RoutineDesc.CatchUpPolicy.SKIP
+
+    for delay_ms, control_name in [(1000, "back"), (0, "legs")]:
+        step = routines.RoutineDesc.Step()
+        step.delay_ms = delay_ms
+        step.control_name = control_name
+        step.control_action = commands.ControlCommand.Action.MOVE_UP
+        shared_desc.append_step(step)
+
+    back_command = commands.ControlCommand(
+        "back", commands.ControlCommand.Action.MOVE_UP, "routine"
+    )
+    legs_command = commands.ControlCommand(
+        "legs", commands.ControlCommand.Action.MOVE_UP, "routine"
+    )
+
+    for late_ms in [0, 5]:
+        timer.set_current_time_ms(0)
+        shared = routines.Routine(shared_desc, timer)
+
+        timer.set_current_time_ms(1000 + late_ms)
+        command_list = []
+        shared.process(command_list)
+        assert command_list == [back_command, legs_command]
+        assert shared.num_skipped_steps == 0
+        assert shared.max_drift_ns == late_ms * 1000000
+        assert shared.is_finished == True
+
+
 def test_routine_manager(tmp_path: pathlib.Path) -> None:
     """Test the routine manager."""
     timer = test_time_util.TestTimer()
@@ -785,6 +1012,7 @@ def test_routine_manager(tmp_path: pathlib.Path) -> None:
     routine_manager.initialize("tests/data/routines/manager_valid/")
     assert routine_manager.num_loaded == num_valid_routines
     assert routine_manager.num_running == 0
+    assert sorted(routine_manager.get_names()) == ["sit", "sleep", "wake"]
 
     # Initializing again doesn't double up.
     routine_manager.initialize("tests/data/routines/manager_valid/")
@@ -1131,6 +1359,152 @@ def test_routine_manager(tmp_path: pathlib.Path) -> None:
     assert expected_command in command_list
 
 
+def test_routine_manager_scheduler(tmp_path: pathlib.Path) -> None:
+    """Test the routine manager when it uses a scheduler."""
+    timer = test_time_util.TestTimer()
+    scheduler = time_util.Scheduler(timer)
+
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(time_source, str(tmp_path) + "/")
+
+    routine_manager = routines.RoutineManager(timer, report_manager, scheduler)
+    routine_manager.initialize("tests/data/routines/manager_valid/")
+
+    start_command = commands.RoutineCommand(
+        "wake", commands.RoutineCommand.Action.START
+    )
+    assert (
+        routine_manager.process_command(start_command)
+        == "Started the wake routine."
+    )
+    assert scheduler.num_pending == 1
+    assert scheduler.get_next_deadline() == 1 * 1000000
+
+    # Nothing is processed until the deadline expires.
+    timer.set_current_time_ms(1)
+    command_list = []
+    notification_list = []
+    routine_manager.process_routines(command_list, notification_list)
+    assert len(command_list) == 0
+
+    assert scheduler.process() == 1
+    routine_manager.process_routines(command_list, notification_list)
+    assert command_list == [
+        commands.ControlCommand(
+            "back", commands.ControlCommand.Action.MOVE_DOWN, "routine"
+        )
+    ]
+    assert scheduler.get_next_deadline() == 3 * 1000000
+
+    # A routine with no initial delay is due immediately.
+    start_command = commands.RoutineCommand(
+        "sit", commands.RoutineCommand.Action.START
+    )
+    routine_manager.process_command(start_command)
+    assert scheduler.num_pending == 2
+    assert scheduler.get_next_deadline() == 1 * 1000000
+
+    command_list = []
+    assert scheduler.process() == 1
+    routine_manager.process_routines(command_list, notification_list)
+    assert command_list == [
+        commands.ControlCommand(
+            "legs", commands.ControlCommand.Action.MOVE_DOWN, "routine"
+        )
+    ]
+
+    # Finished routines no longer have deadlines.
+    timer.set_current_time_ms(3)
+    command_list = []
+    assert scheduler.process() == 2
+    routine_manager.process_routines(command_list, notification_list)
+    assert len(command_list) == 2
+    assert notification_list == ["The sit routine finished."]
+    assert routine_manager.num_running == 1
+    assert scheduler.num_pending == 1
+
+    # Stopping a routine cancels its deadline.
+    stop_command = commands.RoutineCommand(
+        "wake", commands.RoutineCommand.Action.STOP
+    )
+    routine_manager.process_command(stop_command)
+    assert scheduler.num_pending == 0
+    assert scheduler.get_next_deadline() is None
+
+
+def test_routine_manager_reload(tmp_path: pathlib.Path) -> None:
+    """Test applying routine description changes while running."""
+    base_dir = str(tmp_path) + "/"
+    routines_path = tmp_path / "routines"
+    timer = test_time_util.TestTimer()
+
+    time_source = test_time_util.TestTimeSource()
+    report_manager = reports.ReportManager(time_source, base_dir)
+
+    routines.bootstrap_routines(base_dir)
+
+    routine_manager = routines.RoutineManager(timer, report_manager)
+    routine_manager.initialize(base_dir)
+    assert routine_manager.num_loaded == 1
+
+    # New descriptions can be added.
+    wake_file = str(routines_path / "wake.rtn")
+    wake_desc = routines.RoutineDesc.parse_from_file(
+        "tests/data/routines/routine_test_valid_steps.rtn"
+    )
+    wake_desc.name = "wake"
+    wake_desc.save_to_file(wake_file)
+
+    routine_manager.reload_desc_file(wake_file)
+    assert routine_manager.num_loaded == 2
+
+    start = commands.RoutineCommand(
+        "wake", commands.RoutineCommand.Action.START
+    )
+    assert routine_manager.process_command(start) == (
+        "Started the wake routine."
+    )
+
+    # Running routines keep going when their description changes.
+    wake_desc.steps[0].delay_ms = 100
+    wake_desc.save_to_file(wake_file)
+    routine_manager.reload_desc_file(wake_file)
+    assert routine_manager.get_running_names() == ["wake"]
+
+    timer.set_current_time_ms(1)
+    command_list = []
+    routine_manager.process_routines(command_list, [])
+    assert len(command_list) == 1
+
+    # Invalid descriptions are ignored.
+    with open(wake_file, "w") as file:
+        file.write("{}")
+
+    routine_manager.reload_desc_file(wake_file)
+    assert routine_manager.num_loaded == 2
+
+    # Deleting a description stops its routine.
+    pathlib.Path(wake_file).unlink()
+    routine_manager.reload_desc_file(wake_file)
+    assert routine_manager.num_loaded == 1
+    assert routine_manager.num_running == 0
+
+    # Renaming a routine replaces the old name.
+    sleep_file = str(routines_path / "sleep.rtn")
+    sleep_desc = routines.RoutineDesc.parse_from_file(sleep_file)
+    sleep_desc.name = "nap"
+    sleep_desc.save_to_file(sleep_file)
+    routine_manager.reload_desc_file(sleep_file)
+    assert routine_manager.num_loaded == 1
+
+    start = commands.RoutineCommand(
+        "nap", commands.RoutineCommand.Action.START
+    )
+    assert routine_manager.process_command(start) == "Started the nap routine."
+
+    routine_manager.uninitialize()
+
+
 def test_routine_bootstrap(tmp_path: pathlib.Path) -> None:
     """Test routine bootstrapping."""
     routines_path = tmp_path / "routines/"
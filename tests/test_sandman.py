@@ -18,3 +18,21 @@ def test_create(tmp_path: pathlib.Path) -> None:
     testing_app = sandman.create_app({"BASE_DIR": base_dir, "TESTING": True})
     assert testing_app is not None
     assert testing_app.is_testing() == True
+
+
+def test_startup_times(tmp_path: pathlib.Path) -> None:
+    """Test that the time each startup phase takes is measured."""
+    app = sandman.create_app({"BASE_DIR": str(tmp_path) + "/"})
+    assert app is not None
+
+    startup_times_ms = app.get_startup_times_ms()
+    assert list(startup_times_ms) == [
+        "logging",
+        "gpio",
+        "bootstrap",
+        "settings",
+        "managers",
+    ]
+
+    for time_ms in startup_times_ms.values():
+        assert time_ms >= 0
@@ -16,9 +16,16 @@ def _check_default_settings(test_settings: setting.Settings) -> None:
         test_settings.startup_delay_sec
         == setting.Settings.DEFAULT_STARTUP_DELAY_SEC
     )
+    assert test_settings.metrics_host == setting.Settings.DEFAULT_METRICS_HOST
+    assert test_settings.metrics_port == setting.Settings.DEFAULT_METRICS_PORT
     assert test_settings.is_valid() == True
 
 
+def _check_metrics_settings(test_settings: setting.Settings) -> None:
+    assert test_settings.metrics_host == "0.0.0.0"
+    assert test_settings.metrics_port == 9000
+
+
 def test_settings_initialization() -> None:
     """Test settings initialization."""
     test_settings = setting.Settings()
@@ -44,6 +51,26 @@ def test_settings_initialization() -> None:
         test_settings.startup_delay_sec = -2
     _check_default_settings(test_settings)
 
+    with pytest.raises(TypeError):
+        test_settings.metrics_host = 1
+    _check_default_settings(test_settings)
+
+    with pytest.raises(ValueError):
+        test_settings.metrics_host = ""
+    _check_default_settings(test_settings)
+
+    with pytest.raises(TypeError):
+        test_settings.metrics_port = ""
+    _check_default_settings(test_settings)
+
+    with pytest.raises(ValueError):
+        test_settings.metrics_port = 0
+    _check_default_settings(test_settings)
+
+    with pytest.raises(ValueError):
+        test_settings.metrics_port = 65536
+    _check_default_settings(test_settings)
+
     intended_time_zone_name = "America/New_York"
 
     test_settings.time_zone_name = intended_time_zone_name
@@ -61,6 +88,11 @@ def test_settings_initialization() -> None:
     assert test_settings.startup_delay_sec == intended_startup_delay_sec
     assert test_settings.is_valid() == True
 
+    test_settings.metrics_host = "0.0.0.0"
+    test_settings.metrics_port = 9000
+    _check_metrics_settings(test_settings)
+    assert test_settings.is_valid() == True
+
     with pytest.raises(ValueError):
         test_settings.time_zone_name = ""
     assert test_settings.time_zone_name == intended_time_zone_name
@@ -165,11 +197,64 @@ def test_settings_loading() -> None:
     assert test_settings.was_any_invalid_on_load == True
     assert test_settings.is_valid() == True
 
+    test_settings = setting.Settings.parse_from_file(
+        settings_dir + "settings_missing_metrics_host.cfg"
+    )
+    assert test_settings.time_zone_name == intended_time_zone_name
+    assert test_settings.metrics_host == setting.Settings.DEFAULT_METRICS_HOST
+    assert test_settings.metrics_port == 9000
+    assert test_settings.was_any_missing_on_load == True
+    assert test_settings.was_any_invalid_on_load == False
+    assert test_settings.is_valid() == True
+
+    for invalid_name in (
+        "settings_type_metrics_host.cfg",
+        "settings_invalid_metrics_host.cfg",
+    ):
+        test_settings = setting.Settings.parse_from_file(
+            settings_dir + invalid_name
+        )
+        assert test_settings.time_zone_name == intended_time_zone_name
+        assert (
+            test_settings.metrics_host == setting.Settings.DEFAULT_METRICS_HOST
+        )
+        assert test_settings.metrics_port == 9000
+        assert test_settings.was_any_missing_on_load == False
+        assert test_settings.was_any_invalid_on_load == True
+        assert test_settings.is_valid() == True
+
+    test_settings = setting.Settings.parse_from_file(
+        settings_dir + "settings_missing_metrics_port.cfg"
+    )
+    assert test_settings.time_zone_name == intended_time_zone_name
+    assert test_settings.metrics_host == "0.0.0.0"
+    assert test_settings.metrics_port == setting.Settings.DEFAULT_METRICS_PORT
+    assert test_settings.was_any_missing_on_load == True
+    assert test_settings.was_any_invalid_on_load == False
+    assert test_settings.is_valid() == True
+
+    for invalid_name in (
+        "settings_type_metrics_port.cfg",
+        "settings_invalid_metrics_port.cfg",
+    ):
+        test_settings = setting.Settings.parse_from_file(
+            settings_dir + invalid_name
+        )
+        assert test_settings.time_zone_name == intended_time_zone_name
+        assert test_settings.metrics_host == "0.0.0.0"
+        assert (
+            test_settings.metrics_port == setting.Settings.DEFAULT_METRICS_PORT
+        )
+        assert test_settings.was_any_missing_on_load == False
+        assert test_settings.was_any_invalid_on_load == True
+        assert test_settings.is_valid() == True
+
     test_settings = setting.Settings.parse_from_file(
         settings_dir + "settings_valid.cfg"
     )
     assert test_settings.time_zone_name == intended_time_zone_name
     assert test_settings.startup_delay_sec == intended_startup_delay_sec
+    _check_metrics_settings(test_settings)
     assert test_settings.was_any_missing_on_load == False
     assert test_settings.was_any_invalid_on_load == False
     assert test_settings.is_valid() == True
@@ -258,6 +343,8 @@ def test_settings_load_or_create(tmp_path: pathlib.Path) -> None:
     # The startup delay is missing, so should be the default value.
     expected_settings = setting.Settings()
     expected_settings.time_zone_name = "America/New_York"
+    expected_settings.metrics_host = "0.0.0.0"
+    expected_settings.metrics_port = 9000
 
     loaded_settings = setting.load_or_create_settings(str(repair_path) + "/")
     assert loaded_settings == expected_settings
@@ -289,6 +376,8 @@ def test_settings_load_or_create(tmp_path: pathlib.Path) -> None:
     # The time zone is invalid, so should be the default value.
     expected_settings = setting.Settings()
     expected_settings.startup_delay_sec = 2
+    expected_settings.metrics_host = "0.0.0.0"
+    expected_settings.metrics_port = 9000
 
     loaded_settings = setting.load_or_create_settings(str(repair_path) + "/")
     assert loaded_settings == expected_settings
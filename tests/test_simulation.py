@@ -0,0 +1,120 @@
+"""Tests simulating Sandman."""
+
+import json
+import pathlib
+
+import pytest
+import whenever
+
+import sandman_main.simulation as simulation
+
+_ROUTINE_JSON = {
+    "name": "soak",
+    "isLooping": True,
+    "steps": [
+        {"delayMS": 600000, "controlName": "back", "moveDirection": "up"},
+        {"delayMS": 600000, "controlName": "back", "moveDirection": "down"},
+    ],
+}
+
+
+def test_scripted_intent() -> None:
+    """Test loading scripted intents."""
+    intent = simulation.ScriptedIntent.load_from_json(
+        {
+            "timeMs": 1000,
+            "intent": "MovePart",
+            "slots": {"name": "back", "direction": "up"},
+            "repeatIntervalMs": 60000,
+        }
+    )
+    assert intent == simulation.ScriptedIntent(
+        1000, "MovePart", {"name": "back", "direction": "up"}, 60000
+    )
+
+    intent = simulation.ScriptedIntent.load_from_json(
+        {"timeMs": 0, "intent": "GetStatus"}
+    )
+    assert intent == simulation.ScriptedIntent(0, "GetStatus")
+
+    for invalid_json in [
+        {"intent": "GetStatus"},
+        {"timeMs": -1, "intent": "GetStatus"},
+        {"timeMs": "1", "intent": "GetStatus"},
+        {"timeMs": 0, "intent": 3},
+        {"timeMs": 0, "intent": "GetStatus", "slots": []},
+        {"timeMs": 0, "intent": "GetStatus", "repeatIntervalMs": -5},
+    ]:
+        with pytest.raises(ValueError):
+            simulation.ScriptedIntent.load_from_json(invalid_json)
+
+
+def test_soak_harness(tmp_path: pathlib.Path) -> None:
+    """Test running Sandman against a simulated clock."""
+    base_dir = str(tmp_path) + "/"
+
+    routines_path = tmp_path / "routines"
+    routines_path.mkdir()
+
+    with open(routines_path / "soak.rtn", "w") as file:
+        json.dump(_ROUTINE_JSON, file)
+
+    # Start an hour before the report rolls over.
+    start_time = whenever.ZonedDateTime(
+        year=2025, month=9, day=28, hour=16, tz="America/Chicago"
+    )
+    harness = simulation.SoakHarness(base_dir, start_time)
+
+    # The harness needs to be started to run.
+    with pytest.raises(RuntimeError):
+        harness.run_for_ms(1000)
+
+    harness.add_intent(
+        simulation.ScriptedIntent(
+            1000, "ControlRoutine", {"name": "soak", "action": "start"}
+        )
+    )
+    harness.add_intent(
+        simulation.ScriptedIntent(
+            2000, "GetStatus", repeat_interval_ms=3600000
+        )
+    )
+
+    assert harness.start() == True
+
+    try:
+        results = harness.run_for_ms(3 * 60 * 60 * 1000)
+
+    finally:
+        harness.stop()
+
+    assert harness.clock.elapsed_ns == 3 * 60 * 60 * 1000000000
+    assert results.simulated_ms == 3 * 60 * 60 * 1000
+
+    # The status intent repeats each hour, so it's delivered three times.
+    assert results.num_intents == 4
+    assert results.num_ticks == results.tick_cpu.count
+    assert results.num_ticks > 0
+
+    # The routine alternates moving the back up and down every ten minutes,
+    # and the last move down is due just after the simulation ends.
+    spoken_texts = harness.loopback_client.spoken_texts
+    assert spoken_texts[0] == "Started the soak routine."
+    assert (
+        spoken_texts[1] == "Sandman is running. The soak routine is running."
+    )
+    assert spoken_texts.count("Raising the back.") == 9
+    assert spoken_texts.count("Lowering the back.") == 8
+    assert results.num_notifications == len(spoken_texts)
+
+    # Events were written to the report before and after it rolled over, and
+    # the report was archived once it closed.
+    assert results.num_report_files == 2
+    assert results.num_report_events > 0
+    assert (tmp_path / "reports/sandman2025-09-27.rpa").exists() == True
+
+    # The routine is still running, so its drift is served.
+    assert (
+        'sandman_routine_drift_seconds{routine="soak"} 0'
+        in harness.app.metrics.render().splitlines()
+    )
@@ -108,3 +108,98 @@ def test_time_source() -> None:
     time_source.set_current_time(new_time)
     assert time_source.get_time_zone_name() == new_time.tz
     assert time_source.get_current_time() == new_time
+
+
+def test_scheduler() -> None:
+    """Test the deadline scheduler."""
+    timer = TestTimer()
+    scheduler = time_util.Scheduler(timer)
+    assert scheduler.num_pending == 0
+    assert scheduler.get_next_deadline() is None
+
+    expired: list[str] = []
+
+    # Processing with nothing scheduled does nothing.
+    assert scheduler.process() == 0
+
+    scheduler.schedule(20 * 1000000, lambda: expired.append("second"))
+    first_handle = scheduler.schedule(
+        10 * 1000000, lambda: expired.append("first")
+    )
+    scheduler.schedule_after_ms(30, lambda: expired.append("third"))
+    assert scheduler.num_pending == 3
+    assert scheduler.get_next_deadline() == 10 * 1000000
+
+    # Nothing expires before the deadlines.
+    timer.set_current_time_ms(9)
+    assert scheduler.process() == 0
+    assert len(expired) == 0
+
+    # Deadlines expire in order and only once.
+    timer.set_current_time_ms(20)
+    assert scheduler.process() == 2
+    assert expired == ["first", "second"]
+    assert scheduler.num_pending == 1
+    assert scheduler.get_next_deadline() == 30 * 1000000
+
+    assert scheduler.process() == 0
+    assert expired == ["first", "second"]
+
+    # Cancelling an expired deadline does nothing.
+    scheduler.cancel(first_handle)
+    assert scheduler.num_pending == 1
+
+    # Cancelled deadlines never expire.
+    fourth_handle = scheduler.schedule_after_ms(
+        5, lambda: expired.append("fourth")
+    )
+    assert scheduler.num_pending == 2
+    assert scheduler.get_next_deadline() == 25 * 1000000
+
+    scheduler.cancel(fourth_handle)
+    assert scheduler.num_pending == 1
+    assert scheduler.get_next_deadline() == 30 * 1000000
+
+    timer.set_current_time_ms(100)
+    assert scheduler.process() == 1
+    assert expired == ["first", "second", "third"]
+    assert scheduler.num_pending == 0
+    assert scheduler.get_next_deadline() is None
+
+
+def test_simulated_clock() -> None:
+    """Test a timer and time source driven by a simulated clock."""
+    clock = time_util.SimulatedClock(_default_time.to_instant())
+    timer = time_util.SimulatedTimer(clock)
+    time_source = time_util.SimulatedTimeSource(clock)
+    time_source.set_time_zone_name("America/Chicago")
+
+    assert timer.get_current_time() == 0
+    assert time_source.get_current_time() == _default_time
+
+    # Both move together, only when the clock does.
+    clock.advance_ns(1500000)
+    assert timer.get_current_time() == 1500000
+    assert timer.get_time_since_ms(0) == 1
+
+    clock.advance_to(2 * 24 * 60 * 60 * 1000000000)
+    assert clock.elapsed_ns == 2 * 24 * 60 * 60 * 1000000000
+    assert time_source.get_current_time() == _default_time.add(
+        hours=48, disambiguate="raise"
+    )
+
+    with pytest.raises(ValueError):
+        clock.advance_ns(-1)
+
+    with pytest.raises(ValueError):
+        clock.advance_to(0)
+
+    # A scheduler using the timer sees deadlines expire as the clock moves.
+    scheduler = time_util.Scheduler(timer)
+    expired: list[str] = []
+    scheduler.schedule_after_ms(10, lambda: expired.append("first"))
+    assert scheduler.process() == 0
+
+    clock.advance_ns(10 * 1000000)
+    assert scheduler.process() == 1
+    assert expired == ["first"]